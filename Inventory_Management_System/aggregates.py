@@ -0,0 +1,130 @@
+import heapq
+from datetime import datetime
+
+
+class SalesAggregates:
+    """
+    Running sales totals, updated as each sale is recorded.
+
+    Keeps order count, item quantity and revenue overall, per day, per product
+    and per customer. Every total is a plain dict row with an "id", so the rows
+    can be saved with any list storage (JSONStorage, JournalStorage).
+    """
+
+    def __init__(self, rows=()):
+        self.total = self._new_row("total", "total")
+        self.by_day = {}       # "YYYY-MM-DD" -> row
+        self.by_product = {}   # (product_id, product_name) -> row
+        self.by_customer = {}  # customer name -> row
+        for row in rows:
+            kind = row.get("kind")
+            if kind == "total":
+                self.total = row
+            elif kind == "day":
+                self.by_day[row["day"]] = row
+            elif kind == "product":
+                self.by_product[(row["product_id"], row["product_name"])] = row
+            elif kind == "customer":
+                self.by_customer[row["customer_name"]] = row
+
+    @classmethod
+    def from_sales(cls, sales):
+        aggregates = cls()
+        for sale in sales:
+            aggregates.record(sale)
+        return aggregates
+
+    def _new_row(self, kind, row_id, **fields):
+        row = {"id": row_id, "kind": kind}
+        row.update(fields)
+        row.update({"orders": 0, "quantity": 0, "revenue": 0.0})
+        return row
+
+    def _add(self, row, quantity, revenue):
+        row["orders"] += 1
+        row["quantity"] += quantity
+        row["revenue"] += revenue
+
+    def record(self, sale):
+        """
+        Add one sale to the totals.
+
+        Returns the rows that changed, so callers can persist just those.
+        """
+        changed = [self.total]
+        self._add(self.total, sale["total_quantity"], sale["total_amount"])
+
+        day = sale_day(sale)
+        if day is not None:
+            row = self.by_day.get(day)
+            if row is None:
+                row = self.by_day[day] = self._new_row("day", f"day:{day}", day=day)
+            self._add(row, sale["total_quantity"], sale["total_amount"])
+            changed.append(row)
+
+        cname = sale["customer_name"]
+        row = self.by_customer.get(cname)
+        if row is None:
+            row = self.by_customer[cname] = self._new_row(
+                "customer", f"customer:{cname}", customer_name=cname
+            )
+        self._add(row, sale["total_quantity"], sale["total_amount"])
+        changed.append(row)
+
+        # A product listed on several lines of one sale still counts as one order.
+        product_lines = {}
+        for item in sale["items"]:
+            key = (item["product_id"], item["product_name"])
+            quantity, revenue = product_lines.get(key, (0, 0.0))
+            product_lines[key] = (quantity + item["quantity"], revenue + item["line_total"])
+        for (pid, pname), (quantity, revenue) in product_lines.items():
+            row = self.by_product.get((pid, pname))
+            if row is None:
+                row = self.by_product[(pid, pname)] = self._new_row(
+                    "product", f"product:{pid}:{pname}",
+                    product_id=pid, product_name=pname,
+                )
+            self._add(row, quantity, revenue)
+            changed.append(row)
+        return changed
+
+    def top_products(self, top_n, rank_by="quantity", keep=None):
+        """
+        The `top_n` product rows with the highest `rank_by` ("quantity" or
+        "revenue"), using a bounded heap rather than sorting every product.
+
+        keep: optional function row -> bool to filter rows first.
+        Ties keep the order in which products were first sold.
+        """
+        if rank_by not in ("quantity", "revenue"):
+            raise ValueError(f"Cannot rank products by {rank_by!r}.")
+        rows = self.by_product.values()
+        if keep is not None:
+            rows = filter(keep, rows)
+        return heapq.nlargest(top_n, rows, key=lambda row: row[rank_by])
+
+    def rows(self):
+        """All rows, for saving the aggregates as a list."""
+        return (
+            [self.total]
+            + list(self.by_day.values())
+            + list(self.by_product.values())
+            + list(self.by_customer.values())
+        )
+
+
+def sale_time(sale):
+    """Return the sale's timestamp as a naive local datetime, or None if unreadable."""
+    try:
+        ts = datetime.fromisoformat(sale["timestamp"])
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts
+
+
+def sale_day(sale):
+    """Return the sale's date as "YYYY-MM-DD", or None if its timestamp is unreadable."""
+    ts = sale_time(sale)
+    return ts.date().isoformat() if ts is not None else None
@@ -0,0 +1,74 @@
+"""
+Benchmark: JSONStorage save and load throughput per snapshot codec.
+
+Writes the same list of product records with each codec into a temporary
+folder and reports save time, load time and file size. "json indent=2" is
+the pretty-printed format the storage used to write.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_codecs.py [record_count]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import Product
+from storage import JSONCodec, JSONStorage, MarshalCodec, OrjsonCodec, orjson
+
+
+def make_products(count):
+    rng = random.Random(42)
+    return [
+        Product(
+            id=f"{i:08x}",
+            name=f"Product {i}",
+            category=f"category {rng.randrange(50)}",
+            buying_price=round(rng.uniform(1, 100), 2),
+            selling_price=round(rng.uniform(1, 150), 2),
+            quantity=rng.randrange(0, 500),
+        )
+        for i in range(count)
+    ]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    products = make_products(count)
+    codecs = [
+        ("json indent=2", JSONCodec(indent=2)),
+        ("json compact", JSONCodec()),
+        ("marshal", MarshalCodec()),
+    ]
+    if orjson is not None:
+        codecs.insert(2, ("orjson", OrjsonCodec()))
+    else:
+        print("orjson is not installed: skipping it.")
+
+    print(f"{count} records")
+    print(f"{'codec':>14} | {'save s':>7} | {'load s':>7} | {'save rec/s':>10} | {'load rec/s':>10} | {'MB':>6}")
+    print("-" * 70)
+    with tempfile.TemporaryDirectory() as folder:
+        for name, codec in codecs:
+            storage = JSONStorage(os.path.join(folder, "products.dat"), codec=codec)
+            save_time, _ = timed(lambda: storage.save(products))
+            load_time, loaded = timed(storage.load)
+            assert len(loaded) == count
+            size = os.path.getsize(storage.filename) / 1e6
+            print(
+                f"{name:>14} | {save_time:7.2f} | {load_time:7.2f} | "
+                f"{count / save_time:10.0f} | {count / load_time:10.0f} | {size:6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
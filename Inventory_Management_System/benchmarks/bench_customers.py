@@ -0,0 +1,61 @@
+"""
+Benchmark: CustomerManager.find_or_create_customer against growing customer lists.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_customers.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from customers import CustomerManager
+
+
+class MemoryStorage:
+    """Keeps the benchmark off the disk: load() returns prepared data, save() does nothing."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return self.data
+
+    def save(self, data):
+        pass
+
+
+def make_customers(count):
+    return [
+        {"id": f"C{i:08d}", "name": f"Customer {i}", "phone": f"555-{i:07d}", "email": ""}
+        for i in range(count)
+    ]
+
+
+def main():
+    lookups = 10000
+    print(f"{'customers':>10} | {'name+phone (us)':>16} | {'name only (us)':>15}")
+    print("-" * 48)
+    for count in (1000, 10000, 100000, 1000000):
+        manager = CustomerManager(MemoryStorage(make_customers(count)))
+        # The customers load on first use; keep that out of the timings.
+        manager.customers
+        # Look up the last customer added: the worst case for a linear scan.
+        name = f"CUSTOMER {count - 1}"
+        phone = f"555-{count - 1:07d}"
+        with_phone = timeit.timeit(
+            lambda: manager.find_or_create_customer(name, phone), number=lookups
+        )
+        name_only = timeit.timeit(
+            lambda: manager.find_or_create_customer(name), number=lookups
+        )
+        assert len(manager.customers) == count, "lookup created a duplicate customer"
+        print(
+            f"{count:>10} | {with_phone / lookups * 1e6:>16.2f} | "
+            f"{name_only / lookups * 1e6:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
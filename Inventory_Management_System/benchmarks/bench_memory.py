@@ -0,0 +1,86 @@
+"""
+Benchmark: memory used by products and sales as plain dicts versus records.
+
+Both representations are built from the same JSON text, the way they are
+loaded from storage, and measured with tracemalloc.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_memory.py [sale_count]
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import Product, Sale
+
+
+def product_lines(count):
+    return [
+        json.dumps({
+            "id": f"{i:08x}",
+            "name": f"Product {i}",
+            "category": f"Category {i % 20}",
+            "buying_price": 3.5,
+            "selling_price": 5.25,
+            "quantity": 40,
+        })
+        for i in range(count)
+    ]
+
+
+def sale_lines(count, products=500, items_per_sale=3):
+    lines = []
+    for i in range(count):
+        items = [
+            {
+                "product_id": f"{(i + k) % products:08x}",
+                "product_name": f"Product {(i + k) % products}",
+                "quantity": 2,
+                "unit_price": 5.25,
+                "line_total": 10.5,
+            }
+            for k in range(items_per_sale)
+        ]
+        lines.append(json.dumps({
+            "id": f"SALE-{i + 1}",
+            "customer_id": f"{i % 1000:08x}",
+            "customer_name": f"Customer {i % 1000}",
+            "items": items,
+            "total_quantity": 2 * items_per_sale,
+            "total_amount": 10.5 * items_per_sale,
+            "timestamp": f"2026-01-01T00:{i % 60:02d}:00",
+        }))
+    return lines
+
+
+def measure(lines, build):
+    tracemalloc.start()
+    data = [build(json.loads(line)) for line in lines]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main():
+    sale_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    cases = (
+        ("products", product_lines(sale_count), Product.from_dict),
+        ("sales (3 items each)", sale_lines(sale_count), Sale.from_dict),
+    )
+    print(f"{'records':>22} | {'count':>8} | {'dicts (MB)':>10} | {'records (MB)':>12} | {'saved':>6}")
+    print("-" * 72)
+    for label, lines, from_dict in cases:
+        as_dicts = measure(lines, lambda data: data)
+        as_records = measure(lines, from_dict)
+        print(
+            f"{label:>22} | {len(lines):>8} | {as_dicts / 1e6:>10.1f} | "
+            f"{as_records / 1e6:>12.1f} | {1 - as_records / as_dicts:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: rebuilding the all-time sales totals in this process against
+worker processes, one monthly partition per task.
+
+Writes a partitioned sales history into a temporary folder, then times
+SalesAggregates.from_sales() over the streamed history and
+parallel.aggregate_partitions() with 2, 4, ... worker processes (up to the
+CPU count). Orders and quantities must match exactly; revenue may differ
+from the running float sum in the last bits, since the worker totals are
+exact sums.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_parallel.py [sale_count] [months]
+"""
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import SalesAggregates
+from parallel import aggregate_partitions
+from partitioned_storage import PartitionedSalesStorage
+
+
+def write_history(storage, sale_count, months):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    step = timedelta(days=30 * months) / sale_count
+    for first in range(0, sale_count, 10000):
+        chunk = []
+        for i in range(first, min(sale_count, first + 10000)):
+            items = []
+            for _ in range(rng.randrange(1, 4)):
+                product = rng.randrange(5000)
+                quantity = rng.randrange(1, 5)
+                price = round(rng.uniform(1, 100), 2)
+                items.append(
+                    {
+                        "product_id": f"P{product}",
+                        "product_name": f"Product {product}",
+                        "quantity": quantity,
+                        "unit_price": price,
+                        "line_total": quantity * price,
+                    }
+                )
+            chunk.append(
+                {
+                    "id": f"SALE-{i + 1}",
+                    "customer_id": None,
+                    "customer_name": f"Customer {rng.randrange(2000)}",
+                    "items": items,
+                    "total_quantity": sum(item["quantity"] for item in items),
+                    "total_amount": sum(item["line_total"] for item in items),
+                    "timestamp": (start + step * i).isoformat(timespec="seconds"),
+                }
+            )
+        storage.extend(chunk)
+    storage.wait()
+
+
+def same_totals(serial, parallel):
+    serial_rows, parallel_rows = serial.rows(), parallel.rows()
+    if [row["id"] for row in serial_rows] != [row["id"] for row in parallel_rows]:
+        return False
+    return all(
+        a["orders"] == b["orders"]
+        and a["quantity"] == b["quantity"]
+        and math.isclose(a["revenue"], b["revenue"], rel_tol=1e-12)
+        for a, b in zip(serial_rows, parallel_rows)
+    )
+
+
+def timed(function):
+    started = timeit.default_timer()
+    result = function()
+    return timeit.default_timer() - started, result
+
+
+def main():
+    sale_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    with tempfile.TemporaryDirectory() as folder:
+        storage = PartitionedSalesStorage(os.path.join(folder, "sales"))
+        write_history(storage, sale_count, months)
+        print(f"{sale_count} sales in {len(storage.partitions())} partitions")
+        print(f"{'processes':>9} | {'seconds':>7} | {'speed-up':>8} | totals")
+        print("-" * 40)
+        serial_time, serial = timed(
+            lambda: SalesAggregates.from_sales(
+                sale for chunk in storage.iter_chunks() for sale in chunk
+            )
+        )
+        print(f"{'serial':>9} | {serial_time:7.2f} | {1:8.2f} |")
+        processes, exact = 1, None
+        while processes <= max(2, multiprocessing.cpu_count()):
+            seconds, parallel = timed(
+                lambda: aggregate_partitions(storage, processes=processes)
+            )
+            # However the work is split, the exact totals are the same.
+            check = "same" if same_totals(serial, parallel) else "DIFFERENT"
+            if exact is not None and parallel.rows() != exact.rows():
+                check = "NOT REPRODUCIBLE"
+            exact = parallel
+            print(f"{processes:>9} | {seconds:7.2f} | {serial_time / seconds:8.2f} | {check}")
+            processes *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: refreshing the same reports with and without the report cache.
+
+Loads a catalogue and a sales history into in-memory managers, then
+refreshes a dashboard of reports (all-time and this month's top products,
+sales by customer, stock by category) repeatedly, recording a sale every
+`sale_every` refreshes, as happens during a shift. Only the refresh after a
+sale recomputes the sales reports; the cached output must match.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_report_cache.py [sale_count] [refreshes] [sale_every]
+"""
+import io
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import Inventory
+from reports import ReportManager
+from sales import SalesManager
+
+
+class MemoryStorage:
+    """Keeps the benchmark off the disk: load() returns prepared data, save() does nothing."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return self.data
+
+    def save(self, data):
+        pass
+
+
+def make_data(product_count, sale_count):
+    rng = random.Random(42)
+    products = [
+        {
+            "id": f"P{i}",
+            "name": f"Product {i}",
+            "category": f"category {i % 40}",
+            "buying_price": round(rng.uniform(1, 50), 2),
+            "selling_price": round(rng.uniform(50, 100), 2),
+            "quantity": 10 ** 6,
+        }
+        for i in range(product_count)
+    ]
+    start = datetime.now() - timedelta(minutes=sale_count)
+    sales = []
+    for i in range(sale_count):
+        product = products[rng.randrange(product_count)]
+        quantity = rng.randrange(1, 5)
+        item = {
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": quantity,
+            "unit_price": product["selling_price"],
+            "line_total": quantity * product["selling_price"],
+        }
+        sales.append(
+            {
+                "id": f"SALE-{i + 1}",
+                "customer_id": None,
+                "customer_name": f"Customer {i % 500}",
+                "items": [item],
+                "total_quantity": quantity,
+                "total_amount": item["line_total"],
+                "timestamp": (start + timedelta(minutes=i)).isoformat(timespec="seconds"),
+            }
+        )
+    return products, sales
+
+
+def refresh(report_manager):
+    out = io.StringIO()
+    report_manager.print_top_selling_products("all", top_n=10, out=out)
+    report_manager.print_top_selling_products("month", top_n=10, rank_by="revenue", out=out)
+    report_manager.print_sales_by_customer("month", out=out)
+    report_manager.print_stock_by_category(out=out)
+    return out.getvalue()
+
+
+def shift(cache_size, products, sales, refreshes, sale_every):
+    inventory = Inventory(MemoryStorage([dict(p) for p in products]))
+    sales_manager = SalesManager(inventory, MemoryStorage(list(sales)), customer_manager=None)
+    report_manager = ReportManager(inventory, sales_manager, cache_size=cache_size)
+    rng = random.Random(7)
+    outputs = []
+    started = timeit.default_timer()
+    for n in range(refreshes):
+        if n and n % sale_every == 0:
+            sale = sales_manager.create_sale()
+            sales_manager.add_item_to_sale(sale, products[rng.randrange(len(products))]["id"], 1)
+            sales_manager.finalize_sale(sale)
+        outputs.append(refresh(report_manager))
+    return timeit.default_timer() - started, outputs, report_manager.cache
+
+
+def main():
+    sale_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    refreshes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    sale_every = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    products, sales = make_data(2000, sale_count)
+
+    plain_time, plain, _ = shift(0, products, sales, refreshes, sale_every)
+    cached_time, cached, cache = shift(128, products, sales, refreshes, sale_every)
+    print(f"{sale_count} sales, {refreshes} refreshes, a sale every {sale_every}")
+    print(f"{'cache':>9} | {'seconds':>7} | {'per refresh (ms)':>16}")
+    print("-" * 40)
+    print(f"{'off':>9} | {plain_time:7.2f} | {plain_time / refreshes * 1000:16.1f}")
+    print(f"{'on':>9} | {cached_time:7.2f} | {cached_time / refreshes * 1000:16.1f}")
+    print(cache.stats())
+    print("same reports" if plain == cached else "REPORTS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
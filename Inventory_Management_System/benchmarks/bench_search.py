@@ -0,0 +1,81 @@
+"""
+Benchmark: Inventory.search_products with partial keywords on a large catalogue,
+including the one- and two-letter keywords of a cashier's first keystrokes.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_search.py [product_count]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import Inventory
+
+WORDS = [
+    "red", "blue", "green", "cotton", "shirt", "laptop", "phone", "charger",
+    "cable", "steel", "bottle", "desk", "lamp", "wireless", "mouse", "keyboard",
+    "organic", "coffee", "tea", "notebook", "pencil", "backpack", "shoe", "jacket",
+]
+CATEGORIES = ["clothing", "electronics", "kitchen", "office", "grocery", "outdoor"]
+
+
+class MemoryStorage:
+    """Keeps the benchmark off the disk: load() returns prepared data, save() does nothing."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return self.data
+
+    def save(self, data):
+        pass
+
+
+def make_products(count):
+    rng = random.Random(42)
+    return [
+        {
+            "id": f"{i:08x}",
+            "name": " ".join(rng.sample(WORDS, 3)) + f" {i}",
+            "category": rng.choice(CATEGORIES),
+            "buying_price": 1.0,
+            "selling_price": 2.0,
+            "quantity": 10,
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    build = timeit.default_timer()
+    inventory = Inventory(MemoryStorage(make_products(count)))
+    inventory.search_index
+    build = timeit.default_timer() - build
+    print(f"Indexed {count} products in {build:.1f}s")
+
+    searches = 1000
+    print(f"{'keyword':>18} | {'limit':>5} | {'results':>7} | {'per search (us)':>15}")
+    print("-" * 56)
+    for keyword, limit in (
+        ("lap", 20), ("wireless mo", 20), ("keyb", 20),
+        ("co", 20), (f"{count - 1:08x}", 20), ("organic coffee", 20),
+        # First keystrokes: shorter than a trigram.
+        ("e", 20), ("b", 20), ("ki", 20), ("zq", 20),
+    ):
+        results = inventory.search_products(keyword, limit=limit)
+        seconds = timeit.timeit(
+            lambda: inventory.search_products(keyword, limit=limit), number=searches
+        )
+        print(
+            f"{keyword:>18} | {limit:>5} | {len(results):>7} | "
+            f"{seconds / searches * 1e6:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
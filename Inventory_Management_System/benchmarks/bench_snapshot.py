@@ -0,0 +1,125 @@
+"""
+Benchmark: a report process reading the live data files against one
+reading a memory-mapped snapshot.
+
+Builds a catalogue and a monthly-partitioned sales history in a temporary
+folder, writes a snapshot of it, then times each way of starting up and
+running the reports a separate report process would run: inventory
+valuation, low stock, this month's summary, top products and customers.
+Both must print the same reports.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_snapshot.py [product_count] [sale_count]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from partitioned_storage import PartitionedSalesStorage
+from snapshot import open_report_manager, write_snapshot
+from storage import JournalStorage
+
+
+def write_data(product_count, sale_count):
+    rng = random.Random(42)
+    products = [
+        {
+            "id": f"P{i}",
+            "name": f"Product {i}",
+            "category": f"category {i % 40}",
+            "buying_price": round(rng.uniform(1, 50), 2),
+            "selling_price": round(rng.uniform(50, 100), 2),
+            "quantity": rng.randrange(0, 300),
+        }
+        for i in range(product_count)
+    ]
+    JournalStorage("products.json").save(products)
+    storage = PartitionedSalesStorage("sales")
+    start = datetime.now() - timedelta(minutes=sale_count)
+    for first in range(0, sale_count, 10000):
+        chunk = []
+        for i in range(first, min(sale_count, first + 10000)):
+            product = products[rng.randrange(product_count)]
+            quantity = rng.randrange(1, 5)
+            item = {
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "quantity": quantity,
+                "unit_price": product["selling_price"],
+                "line_total": quantity * product["selling_price"],
+            }
+            chunk.append(
+                {
+                    "id": f"SALE-{i + 1}",
+                    "customer_id": None,
+                    "customer_name": f"Customer {i % 500}",
+                    "items": [item],
+                    "total_quantity": quantity,
+                    "total_amount": item["line_total"],
+                    "timestamp": (start + timedelta(minutes=i)).isoformat(timespec="seconds"),
+                }
+            )
+        storage.extend(chunk)
+    storage.wait()
+
+
+def run_reports(report_manager):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        report_manager.print_current_inventory(limit=0)
+        report_manager.print_low_stock(0, limit=20)
+        report_manager.print_sales_summary("month")
+        report_manager.print_top_selling_products("month", top_n=10)
+        report_manager.print_sales_by_customer("week")
+    return out.getvalue()
+
+
+def timed(function):
+    started = timeit.default_timer()
+    result = function()
+    return timeit.default_timer() - started, result
+
+
+def main():
+    product_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sale_count = int(sys.argv[2]) if len(sys.argv) > 2 else 300000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            write_data(product_count, sale_count)
+            inventory, _, sales_manager, _ = main.create_managers(load_in_background=False)
+            write_time, _ = timed(
+                lambda: write_snapshot(
+                    "inventory.snap", inventory.get_all_products(), sales_manager.iter_sales()
+                )
+            )
+            del inventory, sales_manager
+            size = os.path.getsize("inventory.snap") / 1e6
+
+            open_live, live = timed(lambda: main.create_managers(load_in_background=False)[3])
+            report_live, live_output = timed(lambda: run_reports(live))
+            open_mapped, (mapped, _) = timed(lambda: open_report_manager("inventory.snap"))
+            report_mapped, mapped_output = timed(lambda: run_reports(mapped))
+        finally:
+            os.chdir(cwd)
+
+    print(f"{product_count} products, {sale_count} sales")
+    print(f"snapshot written in {write_time:.2f} s ({size:.1f} MB)")
+    print(f"{'source':>10} | {'open (s)':>8} | {'reports (s)':>11}")
+    print("-" * 36)
+    print(f"{'live data':>10} | {open_live:8.2f} | {report_live:11.2f}")
+    print(f"{'snapshot':>10} | {open_mapped:8.2f} | {report_mapped:11.2f}")
+    print("same reports" if live_output == mapped_output else "REPORTS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
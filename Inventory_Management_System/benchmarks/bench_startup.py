@@ -0,0 +1,74 @@
+"""
+Benchmark: time from start to the first menu, for growing sales histories.
+
+Builds monthly-partitioned sales histories of increasing size in a temporary
+folder and times main.create_managers() (everything run() does before the first prompt)
+against loading the full sales history.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/bench_startup.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from partitioned_storage import PartitionedSalesStorage
+
+
+def write_history(folder, count):
+    start = datetime(2020, 1, 1)
+    storage = PartitionedSalesStorage(os.path.join(folder, "sales"))
+    for first in range(0, count, 10000):
+        chunk = []
+        for i in range(first, min(count, first + 10000)):
+            item = {
+                "product_id": f"P{i % 500}",
+                "product_name": f"Product {i % 500}",
+                "quantity": 2,
+                "unit_price": 5.0,
+                "line_total": 10.0,
+            }
+            sale = {
+                "id": f"SALE-{i + 1}",
+                "customer_id": None,
+                "customer_name": "Walk-in",
+                "items": [item],
+                "total_quantity": 2,
+                "total_amount": 10.0,
+                "timestamp": (start + timedelta(minutes=i)).isoformat(timespec="seconds"),
+            }
+            chunk.append(sale)
+        storage.extend(chunk)
+    storage.wait()
+
+
+def main():
+    print(f"{'sales':>8} | {'first prompt (ms)':>17} | {'full history load (ms)':>22}")
+    print("-" * 54)
+    cwd = os.getcwd()
+    for count in (1000, 10000, 100000, 500000):
+        with tempfile.TemporaryDirectory() as folder:
+            write_history(folder, count)
+            os.chdir(folder)
+            try:
+                started = timeit.default_timer()
+                managers = main.create_managers(load_in_background=False)
+                first_prompt = timeit.default_timer() - started
+
+                started = timeit.default_timer()
+                managers[2].sales
+                history = timeit.default_timer() - started
+                # Free this history now rather than inside the next timing.
+                del managers
+            finally:
+                os.chdir(cwd)
+        print(f"{count:>8} | {first_prompt * 1000:>17.2f} | {history * 1000:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: stock valuation, per-category rollup and low-stock filter on a
+large catalogue, plain Python loops against the NumPy columns.
+
+Also times building the columns once, and bringing them up to date after
+a batch of stock changes (the usual state between two reports).
+
+Run from the Inventory_Management_System folder (NumPy must be installed
+for the columnar timings):
+    python benchmarks/bench_valuation.py [product_count]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+from inventory import Inventory
+from reports import ReportManager
+
+CATEGORIES = [f"category {i}" for i in range(50)]
+
+
+class MemoryStorage:
+    """Keeps the benchmark off the disk: load() returns prepared data, save() does nothing."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def load(self):
+        return self.data
+
+    def save(self, data):
+        pass
+
+
+def make_products(count):
+    rng = random.Random(42)
+    return [
+        {
+            "id": f"{i:08x}",
+            "name": f"Product {i}",
+            "category": rng.choice(CATEGORIES),
+            "buying_price": round(rng.uniform(1, 100), 2),
+            "selling_price": round(rng.uniform(1, 150), 2),
+            "quantity": rng.randrange(0, 500),
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(function, repeat=5):
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    inventory = Inventory(MemoryStorage(make_products(count)))
+    reports = ReportManager(inventory, sales_manager=None)
+    print(f"{count} products")
+
+    timings = {}
+    numpy = columnar.np
+    columnar.np = None
+    timings["python"] = (
+        best_of(reports.inventory_value),
+        best_of(reports.inventory_value_by_category),
+        best_of(lambda: reports.low_stock(5)),
+    )
+    columnar.np = numpy
+    if numpy is None:
+        print("NumPy is not installed: only the Python timings are shown.")
+    else:
+        build = best_of(lambda: columnar.InventoryColumns(inventory.products.values()), 3)
+        print(f"build columns:              {build:9.1f} ms")
+        inventory.columns()
+        ids = list(inventory.products)
+        rng = random.Random(1)
+
+        def sell_and_sync():
+            for product_id in rng.sample(ids, 1000):
+                inventory.reserve_stock(product_id, 1)
+                inventory.release_stock(product_id, 1)
+            inventory.columns()
+
+        print(f"sync after 1000 changes:    {best_of(sell_and_sync):9.1f} ms")
+        timings["numpy"] = (
+            best_of(reports.inventory_value),
+            best_of(reports.inventory_value_by_category),
+            best_of(lambda: reports.low_stock(5)),
+        )
+
+    print(f"{'report (ms)':>20} | " + " | ".join(f"{name:>8}" for name in timings))
+    print("-" * (23 + 11 * len(timings)))
+    for index, report in enumerate(("valuation", "by category", "low stock (<= 5)")):
+        print(f"{report:>20} | " + " | ".join(f"{t[index]:8.1f}" for t in timings.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Load generator: checkout traffic against the HTTP API.
+
+Each simulated terminal keeps one connection open and runs checkouts in a
+loop: create a sale, add 1-3 items, finalize it. Every request's latency
+is recorded; at the end the script prints requests per second, checkouts
+per second and latency percentiles.
+
+Without --url it starts `main.py serve` in a temporary folder with a set of
+well-stocked products and stops it afterwards.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/load_checkout.py [--terminals 16] [--seconds 10] [--url http://host:port]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTS = 200
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection sending JSON requests."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+            + body
+        )
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def terminal(number, host, port, product_ids, deadline, latencies, counts):
+    rng = random.Random(number)
+    client = Client(host, port)
+
+    async def timed(method, path, payload=None):
+        started = time.perf_counter()
+        status, data = await client.request(method, path, payload)
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            counts["errors"] += 1
+        return status, data
+
+    try:
+        while time.perf_counter() < deadline:
+            customer = rng.choice([None, f"Customer {rng.randrange(100)}"])
+            status, sale = await timed("POST", "/sales", {"customer_name": customer})
+            if status != 201:
+                continue
+            for _ in range(rng.randint(1, 3)):
+                await timed(
+                    "POST",
+                    f"/sales/{sale['id']}/items",
+                    {"product_id": rng.choice(product_ids), "quantity": rng.randint(1, 3)},
+                )
+            status, _ = await timed("POST", f"/sales/{sale['id']}/finalize")
+            if status == 200:
+                counts["checkouts"] += 1
+    finally:
+        client.close()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def generate_load(host, port, terminals, seconds):
+    client = Client(host, port)
+    _, listing = await client.request("GET", "/products")
+    client.close()
+    product_ids = [p["id"] for p in listing["products"]]
+
+    latencies = []
+    counts = {"checkouts": 0, "errors": 0}
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(
+        *(
+            terminal(n, host, port, product_ids, deadline, latencies, counts)
+            for n in range(terminals)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{terminals} terminals for {elapsed:.1f} s")
+    print(f"requests:  {len(latencies)} ({len(latencies) / elapsed:.0f}/s), {counts['errors']} errors")
+    print(f"checkouts: {counts['checkouts']} ({counts['checkouts'] / elapsed:.0f}/s)")
+    if latencies:
+        print(
+            "latency ms: "
+            f"p50 {percentile(latencies, 0.50) * 1000:.2f}  "
+            f"p90 {percentile(latencies, 0.90) * 1000:.2f}  "
+            f"p99 {percentile(latencies, 0.99) * 1000:.2f}  "
+            f"max {latencies[-1] * 1000:.2f}"
+        )
+
+
+def write_products(folder):
+    products = [
+        {
+            "id": f"P{i}",
+            "name": f"Product {i}",
+            "category": f"Category {i % 10}",
+            "buying_price": 1.0,
+            "selling_price": 2.5,
+            "quantity": 1000000,
+        }
+        for i in range(PRODUCTS)
+    ]
+    with open(os.path.join(folder, "products.json"), "w", encoding="utf-8") as f:
+        json.dump(products, f)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host, port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on {host}:{port}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--terminals", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--url", help="an already running server (default: start one)")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        url = urlsplit(args.url)
+        asyncio.run(generate_load(url.hostname, url.port or 80, args.terminals, args.seconds))
+        return 0
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_products(folder)
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(HERE, "main.py"),
+                "--backend",
+                args.backend,
+                "serve",
+                "--port",
+                str(port),
+            ],
+            cwd=folder,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port("127.0.0.1", port)
+            asyncio.run(generate_load("127.0.0.1", port, args.terminals, args.seconds))
+        finally:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
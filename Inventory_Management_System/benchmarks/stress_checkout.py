@@ -0,0 +1,180 @@
+"""
+Stress test: many checkout terminals selling from one process at once.
+
+Runs several threads that each record sales in parallel against a small
+stock of a few products, so most threads compete for the same items. Some
+sales are cancelled half-way. Afterwards it checks that:
+
+- stock never went below zero (sampled while the threads run, and at the end),
+- every finalized sale is in the history, with a unique id,
+- units sold plus units left equal the starting stock for every product,
+- the same holds for the data read back from disk.
+
+Exits with status 1 if any check fails.
+
+Run from the Inventory_Management_System folder:
+    python benchmarks/stress_checkout.py [--threads 16] [--sales 200] [--backend json]
+        [--write-behind MS]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+PRODUCTS = 8
+START_STOCK = 500
+
+
+def terminal(number, sales_manager, product_ids, attempts, finalized, errors):
+    rng = random.Random(number)
+    for _ in range(attempts):
+        try:
+            customer = rng.choice([None, f"Customer {rng.randrange(20)}"])
+            sale = sales_manager.create_sale(customer, phone=None)
+            for _ in range(rng.randint(1, 3)):
+                sales_manager.add_item_to_sale(sale, rng.choice(product_ids), rng.randint(1, 4))
+            if rng.random() < 0.1:
+                sales_manager.cancel_sale(sale)
+                continue
+            success, _ = sales_manager.finalize_sale(sale)
+            if success:
+                finalized.append(sale)
+        except Exception as e:  # report, but keep the other terminals going
+            errors.append(f"terminal {number}: {e!r}")
+
+
+def watch_stock(inventory, product_ids, stop, lowest):
+    while not stop.is_set():
+        for product_id in product_ids:
+            quantity = inventory.get_product_by_id(product_id)["quantity"]
+            if quantity < lowest[0]:
+                lowest[0] = quantity
+
+
+def check(label, products, sales, expected_sales):
+    problems = []
+    sold = {}
+    for sale in sales:
+        for item in sale["items"]:
+            sold[item["product_id"]] = sold.get(item["product_id"], 0) + item["quantity"]
+    for product in products:
+        if product["quantity"] < 0:
+            problems.append(f"{label}: {product['id']} has negative stock {product['quantity']}")
+        if product["quantity"] + sold.get(product["id"], 0) != START_STOCK:
+            problems.append(
+                f"{label}: {product['id']} sold {sold.get(product['id'], 0)} "
+                f"+ left {product['quantity']} != {START_STOCK}"
+            )
+    ids = [sale["id"] for sale in sales]
+    if len(set(ids)) != len(ids):
+        problems.append(f"{label}: {len(ids) - len(set(ids))} duplicate sale ids")
+    missing = {sale["id"] for sale in expected_sales} - set(ids)
+    if missing:
+        problems.append(f"{label}: {len(missing)} finalized sales missing")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sales", type=int, default=200, help="sale attempts per thread")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument(
+        "--write-behind", type=int, default=0, metavar="MS", help="batch writes (see main.py)"
+    )
+    args = parser.parse_args(argv)
+    # Switch threads far more often than usual so races show up quickly.
+    sys.setswitchinterval(1e-6)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            inventory, customer_manager, sales_manager, _ = main.create_managers(
+                load_in_background=False, backend=args.backend, write_behind=args.write_behind
+            )
+            for i in range(PRODUCTS):
+                inventory.add_product(f"Product {i}", "stress", 1.0, 2.5, START_STOCK)
+            product_ids = [p["id"] for p in inventory.get_all_products()]
+
+            finalized, errors = [], []
+            stop = threading.Event()
+            lowest = [START_STOCK]
+            watcher = threading.Thread(
+                target=watch_stock, args=(inventory, product_ids, stop, lowest)
+            )
+            terminals = [
+                threading.Thread(
+                    target=terminal,
+                    args=(n, sales_manager, product_ids, args.sales, finalized, errors),
+                )
+                for n in range(args.threads)
+            ]
+
+            started = timeit.default_timer()
+            watcher.start()
+            for t in terminals:
+                t.start()
+            for t in terminals:
+                t.join()
+            elapsed = timeit.default_timer() - started
+            stop.set()
+            watcher.join()
+
+            problems = list(errors)
+            if lowest[0] < 0:
+                problems.append(f"stock was seen at {lowest[0]} while running")
+            problems += check(
+                "memory", inventory.get_all_products(), sales_manager.get_all_sales(), finalized
+            )
+            if args.write_behind:
+                # Shut down as the program does on exit: write what is queued.
+                storages = (
+                    inventory.storage,
+                    customer_manager.storage,
+                    sales_manager.storage,
+                    sales_manager.aggregate_storage,
+                )
+                for storage in storages:
+                    storage.close()
+            if args.backend == "json":
+                storages = (
+                    inventory.storage,
+                    customer_manager.storage,
+                    sales_manager.aggregate_storage,
+                )
+                for storage in storages:
+                    storage.wait()
+            fresh = main.create_managers(load_in_background=False, backend=args.backend)
+            problems += check(
+                "disk", fresh[0].get_all_products(), fresh[2].get_all_sales(), finalized
+            )
+            if args.backend == "sqlite":
+                # (unwrapping a WriteBehindStorage)
+                getattr(inventory.storage, "storage", inventory.storage).database.close()
+                fresh[0].storage.database.close()
+        finally:
+            os.chdir(cwd)
+
+    print(
+        f"{args.threads} terminals, {len(finalized)} sales recorded in {elapsed:.2f} s "
+        f"({len(finalized) / elapsed:.0f} sales/s), lowest stock seen {lowest[0]}"
+    )
+    if problems:
+        print("FAILED:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("OK: stock never went negative and no sale was lost.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import csv
+import json
+import os
+
+from storage import to_json_value
+
+PRODUCT_FIELDS = ("id", "name", "category", "buying_price", "selling_price", "quantity")
+_RESERVED_ERROR = "stock of {} would drop below the {} units reserved by open sales"
+
+
+def detect_format(path, fmt=None):
+    """Return "csv" or "jsonl", from `fmt` or the file extension."""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    return "jsonl" if ext in (".jsonl", ".ndjson") else "csv"
+
+
+def read_rows(path, fmt=None):
+    """
+    Yield (line_number, row dict) from a CSV file with a header line or a
+    JSON Lines file, one row at a time.
+    """
+    fmt = detect_format(path, fmt)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                row.pop(None, None)  # values beyond the header columns
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_number, row
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def _number(row, field, convert, errors):
+    value = row.get(field)
+    if _blank(value):
+        return None
+    try:
+        number = convert(value)
+    except (TypeError, ValueError):
+        errors.append(f"{field} must be a number")
+        return None
+    if number < 0:
+        errors.append(f"{field} cannot be negative")
+    return number
+
+
+def validate_product_row(inventory, row):
+    """
+    Check one product row.
+
+    Returns (fields, errors): the fields to set (only the ones given in the
+    row) and a list of error messages.
+    """
+    if not isinstance(row, dict):
+        return None, ["not a JSON object"]
+
+    errors = []
+    fields = {}
+    product_id = row.get("id")
+    product_id = str(product_id).strip() if not _blank(product_id) else None
+    existing = inventory.get_product_by_id(product_id) if product_id else None
+
+    for field in ("name", "category"):
+        if not _blank(row.get(field)):
+            fields[field] = str(row[field]).strip()
+    for field, convert in (
+        ("buying_price", float),
+        ("selling_price", float),
+        ("quantity", int),
+    ):
+        number = _number(row, field, convert, errors)
+        if number is not None:
+            fields[field] = number
+
+    if existing is None:
+        missing = [f for f in PRODUCT_FIELDS[1:] if f not in fields]
+        if missing:
+            errors.append(f"new product is missing {', '.join(missing)}")
+    elif fields.get("quantity", existing["quantity"]) < inventory.reserved(product_id):
+        errors.append(_RESERVED_ERROR.format(product_id, inventory.reserved(product_id)))
+    if product_id:
+        fields["id"] = product_id
+    return fields, errors
+
+
+def validate_stock_row(inventory, row, pending):
+    """
+    Check one stock adjustment row ({"id": ..., "delta": ...}).
+
+    pending: product id -> quantity after the earlier rows of this batch, so
+    several rows for one product are checked together.
+    Returns ((product_id, delta), errors).
+    """
+    if not isinstance(row, dict):
+        return None, ["not a JSON object"]
+
+    product_id = row.get("id")
+    product = None
+    if not _blank(product_id):
+        product = inventory.get_product_by_id(str(product_id).strip())
+    if product is None:
+        return None, [f"unknown product id {product_id!r}"]
+    try:
+        delta = int(row.get("delta"))
+    except (TypeError, ValueError):
+        return None, ["delta must be a whole number"]
+
+    quantity = pending.get(product["id"], product["quantity"]) + delta
+    if quantity < 0:
+        return None, [f"stock of {product['id']} would drop below zero"]
+    reserved = inventory.reserved(product["id"])
+    if quantity < reserved:
+        return None, [_RESERVED_ERROR.format(product["id"], reserved)]
+    pending[product["id"]] = quantity
+    return (product["id"], delta), []
+
+
+def import_products(inventory, path, fmt=None, batch_size=1000):
+    """
+    Add or update products from a CSV or JSON Lines file.
+
+    Rows with a known id update the fields they give; other rows add a product
+    and must give every field. Rows are validated and applied a batch at a
+    time and the inventory is saved once at the end.
+
+    Returns (rows applied, list of "line N: message" errors).
+    """
+    applied = 0
+    errors = []
+    for batch in _batches(read_rows(path, fmt), batch_size):
+        valid = []
+        lines = []
+        for line_number, row in batch:
+            fields, row_errors = validate_product_row(inventory, row)
+            if row_errors:
+                errors.append(f"line {line_number}: {'; '.join(row_errors)}")
+            else:
+                valid.append(fields)
+                lines.append(line_number)
+        # Open sales may have reserved more since the rows were checked.
+        rejected = inventory.upsert_products(valid)
+        for position in rejected:
+            product_id = valid[position]["id"]
+            errors.append(
+                f"line {lines[position]}: "
+                + _RESERVED_ERROR.format(product_id, inventory.reserved(product_id))
+            )
+        applied += len(valid) - len(rejected)
+    if applied:
+        inventory.save_all()
+    return applied, errors
+
+
+def import_stock(inventory, path, fmt=None, batch_size=1000):
+    """
+    Apply stock deltas ("id" and "delta" columns) from a CSV or JSON Lines file.
+
+    Rows that would take a product below zero, or below the stock open
+    sales have reserved, are rejected. The inventory is
+    saved once at the end.
+
+    Returns (rows applied, list of "line N: message" errors).
+    """
+    applied = 0
+    errors = []
+    for batch in _batches(read_rows(path, fmt), batch_size):
+        pending = {}
+        valid = []
+        lines = []
+        for line_number, row in batch:
+            change, row_errors = validate_stock_row(inventory, row, pending)
+            if row_errors:
+                errors.append(f"line {line_number}: {'; '.join(row_errors)}")
+            else:
+                valid.append(change)
+                lines.append(line_number)
+        # Open sales may have reserved more since the rows were checked.
+        rejected = inventory.adjust_stock(valid)
+        for position in rejected:
+            product_id = valid[position][0]
+            errors.append(
+                f"line {lines[position]}: "
+                + _RESERVED_ERROR.format(product_id, inventory.reserved(product_id))
+            )
+        applied += len(valid) - len(rejected)
+    if applied:
+        inventory.save_all()
+    return applied, errors
+
+
+def export_products(inventory, path, fmt=None):
+    """Write every product to a CSV or JSON Lines file, one row at a time. Returns the row count."""
+    fmt = detect_format(path, fmt)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(PRODUCT_FIELDS)
+            for product in inventory.get_all_products():
+                writer.writerow([product[field] for field in PRODUCT_FIELDS])
+                count += 1
+        else:
+            for product in inventory.get_all_products():
+                f.write(json.dumps(product, default=to_json_value) + "\n")
+                count += 1
+    return count
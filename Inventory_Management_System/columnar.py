@@ -0,0 +1,125 @@
+try:
+    import numpy as np
+except ImportError:  # optional: reports fall back to plain Python loops
+    np = None
+
+
+def columns_available():
+    """True when NumPy is installed, so InventoryColumns can be used."""
+    return np is not None
+
+
+class InventoryColumns:
+    """
+    Columnar copy of the inventory for vectorized reports (needs NumPy).
+
+    Quantity, buying price and selling price are arrays with one row per
+    product, and categories are integer codes into `categories`, so stock
+    value, per-category rollups and threshold filters are each a single
+    array operation instead of a Python loop over a million records.
+
+    Rows follow `ids`. patch() updates changed rows in place; when products
+    were added or removed a new InventoryColumns is built instead, so an
+    instance never changes length under a reader. Columns made with
+    from_arrays() (e.g. over a read-only snapshot file) are never patched.
+    """
+
+    def __init__(self, products):
+        products = list(products)
+        count = len(products)
+        self.ids = [p["id"] for p in products]
+        self.rows = {product_id: row for row, product_id in enumerate(self.ids)}
+        self.categories = []
+        self._category_codes = {}
+        self.quantity = np.fromiter((p["quantity"] for p in products), np.int64, count)
+        self.buying_price = np.fromiter((p["buying_price"] for p in products), np.float64, count)
+        self.selling_price = np.fromiter((p["selling_price"] for p in products), np.float64, count)
+        self.category = np.fromiter(
+            (self._code(p["category"]) for p in products), np.int32, count
+        )
+
+    @classmethod
+    def from_arrays(cls, ids, quantity, buying_price, selling_price, category, categories):
+        """
+        Use existing arrays as the columns, without copying them.
+
+        ids: any sequence of product ids (only indexed when needed).
+        category: codes into `categories`.
+        """
+        columns = cls.__new__(cls)
+        columns.ids = ids
+        columns.rows = None
+        columns.categories = list(categories)
+        columns._category_codes = {name: code for code, name in enumerate(columns.categories)}
+        columns.quantity = quantity
+        columns.buying_price = buying_price
+        columns.selling_price = selling_price
+        columns.category = category
+        return columns
+
+    def _code(self, category):
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def patch(self, products, changed):
+        """
+        Copy the current values of the `changed` product ids into their rows.
+
+        products: id -> product (Inventory.products).
+        Returns False (changing nothing) if a product was added or removed;
+        build a new InventoryColumns then.
+        """
+        if self.rows is None or len(products) != len(self.ids):
+            return False
+        updates = []
+        for product_id in changed:
+            row = self.rows.get(product_id)
+            product = products.get(product_id)
+            if row is None or product is None:
+                return False
+            updates.append((row, product))
+        for row, product in updates:
+            self.quantity[row] = product["quantity"]
+            self.buying_price[row] = product["buying_price"]
+            self.selling_price[row] = product["selling_price"]
+            self.category[row] = self._code(product["category"])
+        return True
+
+    def totals(self):
+        """Stock value: {"products", "quantity", "buying", "selling"}."""
+        return {
+            "products": len(self.ids),
+            "quantity": int(self.quantity.sum()),
+            "buying": float(self.quantity @ self.buying_price),
+            "selling": float(self.quantity @ self.selling_price),
+        }
+
+    def category_totals(self):
+        """One totals row per category (with a "category" field), in first-seen order."""
+        size = len(self.categories)
+        counts = np.bincount(self.category, minlength=size)
+        quantity = np.bincount(self.category, weights=self.quantity, minlength=size)
+        buying = np.bincount(
+            self.category, weights=self.quantity * self.buying_price, minlength=size
+        )
+        selling = np.bincount(
+            self.category, weights=self.quantity * self.selling_price, minlength=size
+        )
+        return [
+            {
+                "category": category,
+                "products": int(counts[code]),
+                "quantity": int(quantity[code]),
+                "buying": float(buying[code]),
+                "selling": float(selling[code]),
+            }
+            for code, category in enumerate(self.categories)
+            if counts[code]
+        ]
+
+    def ids_at_or_below(self, threshold):
+        """Ids of the products with quantity <= threshold, in row order."""
+        return [self.ids[row] for row in np.flatnonzero(self.quantity <= threshold).tolist()]
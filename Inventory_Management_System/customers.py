@@ -1,5 +1,8 @@
+import threading
 import uuid
 
+from records import Customer
+
 
 class CustomerManager:
     """
@@ -9,39 +12,94 @@ class CustomerManager:
     def __init__(self, storage):
         """
         storage: JSONStorage for customers.
+
+        Customers are read from storage on first use (or call load_in_background()).
         """
         self.storage = storage
-        self.customers = self.storage.load()
+        self._customers = None
+        self._load_lock = threading.Lock()
+        # Matching indexes for find_or_create_customer; each key maps to the
+        # first customer added with it.
+        self._by_name = {}
+        self._by_name_phone = {}
+        # Held while a customer is looked up and possibly added, so two
+        # terminals cannot create the same customer twice.
+        self._lock = threading.RLock()
+
+    @property
+    def customers(self):
+        """id -> customer, in insertion order. Loaded on first access."""
+        if self._customers is None:
+            self._load()
+        return self._customers
+
+    def _load(self):
+        with self._load_lock:
+            if self._customers is None:
+                customers = {c["id"]: Customer.from_dict(c) for c in self.storage.load()}
+                for c in customers.values():
+                    self._index_customer(c)
+                self._customers = customers
+
+    def load_in_background(self):
+        """Start loading customers on a daemon thread."""
+        thread = threading.Thread(
+            target=lambda: self.customers, name="customer-loader", daemon=True
+        )
+        thread.start()
+        return thread
 
     def _save(self):
-        self.storage.save(self.customers)
+        self.storage.save(list(self.customers.values()))
+
+    def _save_new_customer(self, customer):
+        # Storages with record-level writes only need the new customer.
+        if hasattr(self.storage, "append"):
+            self.storage.append(customer)
+        else:
+            self._save()
+
+    def _name_key(self, name):
+        return name.lower()
+
+    def _index_customer(self, customer):
+        name_key = self._name_key(customer["name"])
+        self._by_name.setdefault(name_key, customer)
+        self._by_name_phone.setdefault((name_key, customer["phone"]), customer)
 
     def _generate_id(self):
         return str(uuid.uuid4())[:8]
 
     def add_customer(self, name, phone=None, email=None):
-        customer = {
-            "id": self._generate_id(),
-            "name": name,
-            "phone": phone or "",
-            "email": email or "",
-        }
-        self.customers.append(customer)
-        self._save()
+        customer = Customer(
+            id=self._generate_id(),
+            name=name,
+            phone=phone or "",
+            email=email or "",
+        )
+        with self._lock:
+            self.customers[customer["id"]] = customer
+            self._index_customer(customer)
+            self._save_new_customer(customer)
         return customer
 
     def get_customer_by_id(self, customer_id):
-        for c in self.customers:
-            if c["id"] == customer_id:
-                return c
-        return None
+        return self.customers.get(customer_id)
 
     def find_or_create_customer(self, name, phone=None, email=None):
-        # Very simple logic: if there is a customer with same name and phone, reuse
-        for c in self.customers:
-            if c["name"].lower() == name.lower() and (phone is None or c["phone"] == phone):
-                return c
-        return self.add_customer(name, phone, email)
+        # Very simple logic: if there is a customer with same name and phone, reuse.
+        # Without a phone, any customer with the same name matches.
+        if self._customers is None:
+            self._load()
+        name_key = self._name_key(name)
+        with self._lock:
+            if phone is None:
+                customer = self._by_name.get(name_key)
+            else:
+                customer = self._by_name_phone.get((name_key, phone))
+            if customer:
+                return customer
+            return self.add_customer(name, phone, email)
 
     def get_all_customers(self):
-        return list(self.customers)
+        return list(self.customers.values())
@@ -0,0 +1,98 @@
+import re
+import threading
+
+from storage import write_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SALE_ID = re.compile(r"SALE-(\d+)")
+
+
+def last_sale_number(chunks):
+    """Highest n among "SALE-n" ids in an iterable of sale chunks (0 if none)."""
+    highest = 0
+    for chunk in chunks:
+        for sale in chunk:
+            match = SALE_ID.fullmatch(str(sale.get("id", "")))
+            if match:
+                highest = max(highest, int(match.group(1)))
+    return highest
+
+
+class Sequence:
+    """
+    Thread-safe counter handing out 1, 2, 3, ... in memory.
+
+    seed: optional callable returning the last number already used; it is
+    called once, on the first next().
+    """
+
+    def __init__(self, seed=None):
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._last = None
+
+    def next(self):
+        """Return the next number."""
+        with self._lock:
+            if self._last is None:
+                self._last = self.seed() if self.seed else 0
+            self._last += 1
+            return self._last
+
+
+class FileSequence(Sequence):
+    """
+    Counter persisted in a small text file and shared between processes.
+
+    Every next() takes an exclusive lock on `filename`.lock, reads the last
+    number, and atomically writes the new one, so threads and processes
+    using the same file never get the same number and numbers never go
+    backwards. When the file does not exist yet, `seed` supplies the
+    starting point (e.g. the highest sale id in the history).
+    """
+
+    def __init__(self, filename, seed=None):
+        super().__init__(seed)
+        self.filename = filename
+        self.lock_filename = filename + ".lock"
+
+    def next(self):
+        with self._lock:
+            with open(self.lock_filename, "a+b") as lock_file:
+                self._lock_file(lock_file)
+                try:
+                    number = self._read() + 1
+                    write_atomic(self.filename, lambda f: f.write(f"{number}\n"))
+                    return number
+                finally:
+                    self._unlock_file(lock_file)
+
+    def _read(self):
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return self.seed() if self.seed else 0
+        except ValueError:
+            # Unreadable counter: start again above everything in the history.
+            print(f"Warning: Could not read {self.filename}. Restarting from the history.")
+            return self.seed() if self.seed else 0
+
+    def _lock_file(self, lock_file):
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(self, lock_file):
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -1,9 +1,20 @@
+import threading
 import uuid
 
+import metrics
+from columnar import InventoryColumns, columns_available
+from records import Product
+from search import SearchIndex
+
 
 class Inventory:
     """
     Manages product inventory: add, update, delete, search.
+
+    Safe to share between threads (e.g. several checkout terminals served by
+    one process). Stock changes take a lock per product, so sales of
+    different products never wait for each other; adding, deleting and
+    renaming products take one inventory-wide lock.
     """
 
     def __init__(self, storage):
@@ -11,35 +22,149 @@ class Inventory:
         storage: an object with load() and save(data) methods (JSONStorage).
         """
         self.storage = storage
-        self.products = self.storage.load()
+        # Guards self.products and the search index against concurrent changes.
+        self._lock = threading.RLock()
+        # Columnar snapshot for reports, and the products changed since it
+        # was last brought up to date.
+        # Storages that already keep the products in columns (a snapshot
+        # file) hand them over as they are; their product records are then
+        # only built when something needs them.
+        self._columns = self.storage.columns() if hasattr(self.storage, "columns") else None
+        self._changed = set()
+        # id -> product, in insertion order, so lookups and deletes are O(1).
+        self._products = None if self._columns is not None else self._load_products()
+        # Built on the first search (report-only processes never search).
+        self._search_index = None
+        # product id -> lock held while checking and changing its stock.
+        self._stock_locks = {}
+        # product id -> units reserved by open sales. A product's "quantity"
+        # is only ever its committed stock, the number that is saved, so a
+        # save never includes another sale's reservation.
+        self._reserved = {}
+        # Held from taking a full snapshot until it is written, so an older
+        # snapshot can never overwrite a newer one.
+        self._save_lock = threading.Lock()
+        # Bumped after every change to a product, so cached reports
+        # (ReportCache) know when they are out of date. Reserving and
+        # releasing stock leave it alone: no report reads reservations.
+        self.version = 0
+        self._version_lock = threading.Lock()
+
+    def _load_products(self):
+        return {p["id"]: Product.from_dict(p) for p in self.storage.load()}
+
+    @property
+    def products(self):
+        """id -> product, loaded on first access if the storage handed over columns."""
+        if self._products is None:
+            with self._lock:
+                if self._products is None:
+                    self._products = self._load_products()
+        return self._products
+
+    @property
+    def search_index(self):
+        """The SearchIndex, built on first access."""
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = SearchIndex(self.products.values())
+            return self._search_index
+
+    def index_in_background(self):
+        """Start building the search index on a daemon thread."""
+        thread = threading.Thread(
+            target=lambda: self.search_index,
+            name="search-indexer",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _touch(self, product_id):
+        # Call after the change itself, so a snapshot never misses it.
+        self._changed.add(product_id)
+        with self._version_lock:
+            self.version += 1
+
+    def columns(self):
+        """
+        Up-to-date InventoryColumns for vectorized reports, or None when
+        NumPy is not installed.
+
+        Built on first use; later calls only patch the products changed
+        since (or rebuild after products were added or deleted).
+        """
+        if not columns_available():
+            return None
+        with self._lock:
+            # Take the ids out of the set (rather than swapping in a new set)
+            # so a concurrent _touch() is never lost; rows are read after.
+            changed = list(self._changed)
+            self._changed.difference_update(changed)
+            if self._columns is None or (
+                changed and not self._columns.patch(self.products, changed)
+            ):
+                # Stock changes do not take self._lock, so one may land while
+                # the products are read; it is then in self._changed again
+                # and the next call patches it.
+                self._columns = InventoryColumns(self.products.values())
+            return self._columns
+
+    def _stock_lock(self, product_id):
+        lock = self._stock_locks.get(product_id)
+        if lock is None:
+            with self._lock:
+                lock = self._stock_locks.setdefault(product_id, threading.Lock())
+        return lock
 
     def _save(self):
-        self.storage.save(self.products)
+        with self._save_lock:
+            self.storage.save(list(self.products.values()))
+
+    def _save_product(self, product):
+        # Storages with record-level writes only need the changed product.
+        if hasattr(self.storage, "upsert"):
+            self.storage.upsert(product)
+        else:
+            self._save()
+
+    def _save_deleted(self, product_id):
+        if hasattr(self.storage, "delete"):
+            self.storage.delete(product_id)
+        else:
+            self._save()
+
+    def save_all(self):
+        """Write every product, e.g. once after a bulk change."""
+        self._save()
 
     def _generate_id(self):
         # Short unique ID for a product
         return str(uuid.uuid4())[:8]
 
     def add_product(self, name, category, buying_price, selling_price, quantity):
-        product = {
-            "id": self._generate_id(),
-            "name": name,
-            "category": category,
-            "buying_price": float(buying_price),
-            "selling_price": float(selling_price),
-            "quantity": int(quantity),
-        }
-        self.products.append(product)
-        self._save()
+        product = Product(
+            id=self._generate_id(),
+            name=name,
+            category=category,
+            buying_price=float(buying_price),
+            selling_price=float(selling_price),
+            quantity=int(quantity),
+        )
+        with self._lock:
+            self.products[product["id"]] = product
+            if self._search_index is not None:
+                self._search_index.add(product)
+            self._touch(product["id"])
+        self._save_product(product)
+        return product
 
     def get_all_products(self):
-        return list(self.products)
+        return list(self.products.values())
 
+    @metrics.timed("inventory.lookup")
     def get_product_by_id(self, product_id):
-        for p in self.products:
-            if p["id"] == product_id:
-                return p
-        return None
+        return self.products.get(product_id)
 
     def update_product(
         self,
@@ -50,46 +175,160 @@ class Inventory:
         selling_price=None,
         quantity=None,
     ):
+        """
+        Change the given fields of a product and save it. Returns False for
+        an unknown product.
+
+        Raises ValueError, changing nothing, if the new quantity is below
+        the stock open sales have reserved.
+        """
         product = self.get_product_by_id(product_id)
         if not product:
             return False
 
-        if name is not None:
-            product["name"] = name
-        if category is not None:
-            product["category"] = category
+        if quantity is not None:
+            with self._stock_lock(product_id):
+                reserved = self._reserved.get(product_id, 0)
+                if int(quantity) < reserved:
+                    raise ValueError(
+                        f"Open sales have reserved {reserved} of {product_id}; "
+                        "the stock cannot be set below that."
+                    )
+                product["quantity"] = int(quantity)
+        if name is not None or category is not None:
+            with self._lock:
+                if name is not None:
+                    product["name"] = name
+                if category is not None:
+                    product["category"] = category
+                if self._search_index is not None:
+                    self._search_index.update(product)
         if buying_price is not None:
             product["buying_price"] = float(buying_price)
         if selling_price is not None:
             product["selling_price"] = float(selling_price)
-        if quantity is not None:
-            product["quantity"] = int(quantity)
+        self._touch(product_id)
 
-        self._save()
+        self._save_product(product)
         return True
 
     def delete_product(self, product_id):
-        product = self.get_product_by_id(product_id)
-        if not product:
-            return False
-        self.products.remove(product)
-        self._save()
+        with self._lock:
+            if self.products.pop(product_id, None) is None:
+                return False
+            if self._search_index is not None:
+                self._search_index.remove(product_id)
+            self._stock_locks.pop(product_id, None)
+            self._reserved.pop(product_id, None)
+            self._touch(product_id)
+        self._save_deleted(product_id)
         return True
 
-    def search_products(self, keyword):
-        keyword_lower = keyword.lower()
-        results = []
-        for p in self.products:
-            if (
-                keyword_lower in p["name"].lower()
-                or keyword_lower == p["id"].lower()
-            ):
-                results.append(p)
-        return results
+    def upsert_products(self, rows):
+        """
+        Add or update many products in memory, without saving (see save_all()).
 
+        rows: validated field dicts. A row whose id is a known product updates
+        the fields it has; any other row is a complete new product, added with
+        its id if it has one.
+
+        Returns the positions (in rows) of the updates not applied because
+        they would set the stock below what open sales have reserved.
+        """
+        rejected = []
+        with self._lock:
+            for position, fields in enumerate(rows):
+                product = self.products.get(fields.get("id"))
+                if product is None:
+                    product = Product(
+                        id=fields.get("id") or self._generate_id(),
+                        name=fields["name"],
+                        category=fields["category"],
+                        buying_price=float(fields["buying_price"]),
+                        selling_price=float(fields["selling_price"]),
+                        quantity=int(fields["quantity"]),
+                    )
+                    self.products[product["id"]] = product
+                    if self._search_index is not None:
+                        self._search_index.add(product)
+                    self._touch(product["id"])
+                    continue
+
+                with self._stock_lock(product["id"]):
+                    if fields.get("quantity", product["quantity"]) < self.reserved(product["id"]):
+                        rejected.append(position)
+                        continue
+                    for field, value in fields.items():
+                        if field != "id":
+                            product[field] = value
+                if self._search_index is not None and ("name" in fields or "category" in fields):
+                    self._search_index.update(product)
+                self._touch(product["id"])
+        return rejected
+
+    def adjust_stock(self, changes):
+        """
+        Apply validated (product_id, delta) pairs in memory, without saving.
+
+        Returns the positions (in changes) of the pairs not applied because
+        they would take the stock below what open sales have reserved.
+        """
+        rejected = []
+        for position, (product_id, delta) in enumerate(changes):
+            with self._stock_lock(product_id):
+                product = self.products[product_id]
+                if product["quantity"] + delta < self.reserved(product_id):
+                    rejected.append(position)
+                    continue
+                product["quantity"] += delta
+            self._touch(product_id)
+        return rejected
+
+    @metrics.timed("inventory.search")
+    def search_products(self, keyword, limit=None):
+        """
+        Find products by name, category or id, best match first.
+
+        limit: maximum number of results (None for all).
+        """
+        with self._lock:
+            ids = self.search_index.search(keyword, limit)
+            return [self.products[product_id] for product_id in ids]
+
+    @metrics.timed("inventory.reduce_stock")
     def reduce_stock(self, product_id, quantity):
         """
-        Decrease stock for a given product.
+        Decrease stock for a given product and save it.
+
+        Returns:
+            (success: bool, message: str)
+        """
+        success, msg = self.reserve_stock(product_id, quantity)
+        if success:
+            self.commit_stock({product_id: quantity})
+            msg = "Stock updated."
+        return success, msg
+
+    def reserved(self, product_id):
+        """Stock of a product reserved by open sales."""
+        return self._reserved.get(product_id, 0)
+
+    def available(self, product_id):
+        """Stock not yet reserved by an open sale (0 for an unknown product)."""
+        product = self.get_product_by_id(product_id)
+        if not product:
+            return 0
+        return product["quantity"] - self._reserved.get(product_id, 0)
+
+    @metrics.timed("inventory.reserve_stock")
+    def reserve_stock(self, product_id, quantity):
+        """
+        Set stock aside for a sale that is still open (in memory only).
+
+        The check and the reservation happen under the product's lock, so
+        concurrent sales can never reserve more than is in stock. The stock
+        itself only goes down in commit_stock() when the sale is finalized;
+        release_stock() gives the reservation back if it is abandoned.
 
         Returns:
             (success: bool, message: str)
@@ -101,9 +340,64 @@ class Inventory:
         if quantity <= 0:
             return False, "Quantity must be positive."
 
-        if product["quantity"] < quantity:
-            return False, "Not enough stock for this sale."
+        with self._stock_lock(product_id):
+            reserved = self._reserved.get(product_id, 0)
+            if product["quantity"] - reserved < quantity:
+                return False, "Not enough stock for this sale."
+            self._reserved[product_id] = reserved + quantity
+        return True, "Stock reserved."
 
-        product["quantity"] -= quantity
-        self._save()
-        return True, "Stock updated."
+    def release_stock(self, product_id, quantity):
+        """Give back stock set aside by reserve_stock(). The saved stock never included it."""
+        with self._stock_lock(product_id):
+            self._unreserve(product_id, quantity)
+
+    def _unreserve(self, product_id, quantity):
+        # Call with the product's stock lock held.
+        reserved = self._reserved.get(product_id, 0) - quantity
+        if reserved > 0:
+            self._reserved[product_id] = reserved
+        else:
+            self._reserved.pop(product_id, None)
+
+    def commit_stock(self, quantities):
+        """
+        Take reserved stock out of the inventory and save the products.
+
+        quantities: product id -> units reserved with reserve_stock().
+        """
+        for product_id, quantity in quantities.items():
+            product = self.products.get(product_id)
+            if product is None:
+                # Deleted while the sale was open; its reservation went with it.
+                continue
+            with self._stock_lock(product_id):
+                self._unreserve(product_id, quantity)
+                product["quantity"] -= quantity
+            self._touch(product_id)
+        self.save_products(quantities)
+
+    def restore_stock(self, quantities):
+        """
+        Undo commit_stock() after its save was rolled back: the stock is
+        back in the inventory and reserved again for the still open sale.
+        """
+        for product_id, quantity in quantities.items():
+            product = self.products.get(product_id)
+            if product is None:
+                continue
+            with self._stock_lock(product_id):
+                product["quantity"] += quantity
+                self._reserved[product_id] = self._reserved.get(product_id, 0) + quantity
+            self._touch(product_id)
+
+    @metrics.timed("inventory.save_products")
+    def save_products(self, product_ids):
+        """Persist the given products in one write."""
+        if hasattr(self.storage, "upsert"):
+            for product_id in product_ids:
+                product = self.products.get(product_id)
+                if product:
+                    self.storage.upsert(product)
+        else:
+            self._save()
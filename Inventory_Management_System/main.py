@@ -1,8 +1,63 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
 from inventory import Inventory
 from sales import SalesManager
-from reports import ReportManager
-from storage import JSONStorage
+from reports import (
+    CATEGORY_COLUMNS,
+    CUSTOMER_COLUMNS,
+    INVENTORY_COLUMNS,
+    LOW_STOCK_COLUMNS,
+    PERIODS,
+    SALE_COLUMNS,
+    SUMMARY_COLUMNS,
+    TOP_PRODUCT_COLUMNS,
+    ReportManager,
+)
+from output import PAGE_SIZE, paginate, table_lines, write_csv, write_json, write_lines
+from storage import CODECS, JournalStorage, JSONLinesStorage, get_codec
+from write_behind import WriteBehindStorage
+from partitioned_storage import PartitionedSalesStorage
 from customers import CustomerManager
+from ids import FileSequence, last_sale_number
+from migrate import migrate_json_to_sqlite, migrate_sales_to_partitions
+from server import InventoryAPI, InventoryServer
+from snapshot import open_report_manager, write_snapshot
+from sqlite_storage import (
+    SQLiteDatabase,
+    SQLiteDocumentStorage,
+    SQLiteSalesStorage,
+    SQLiteTableStorage,
+)
+import bulk
+import metrics
+
+PRODUCT_LIST_COLUMNS = (
+    ("id", "ID", ""),
+    ("name", "Name", ""),
+    ("category", "Category", ""),
+    ("buying_price", "Buy", ""),
+    ("selling_price", "Sell", ""),
+    ("quantity", "Qty", ""),
+)
+CUSTOMER_LIST_COLUMNS = (
+    ("id", "ID", ""),
+    ("name", "Name", ""),
+    ("phone", "Phone", ""),
+    ("email", "Email", ""),
+)
+METRIC_COLUMNS = (
+    ("name", "Timer", ""),
+    ("calls", "Calls", ""),
+    ("total_ms", "Total ms", ".1f"),
+    ("mean_ms", "Mean ms", ".3f"),
+    ("max_ms", "Max ms", ".3f"),
+)
+REPORTS = ("inventory", "low-stock", "categories", "summary", "top-products", "customers", "sales")
 
 
 def main_menu():
@@ -31,7 +86,8 @@ def reports_menu():
     print("3. Sales Summary")
     print("4. Top Selling Products")
     print("5. Sales by Customer")
-    print("6. Back to Main Menu")
+    print("6. Stock Value by Category")
+    print("7. Back to Main Menu")
 
 
 def customers_menu():
@@ -63,17 +119,152 @@ def get_float_input(prompt, allow_blank=False):
             print("Please enter a valid number.")
 
 
-def run():
-    # Storage and managers
-    product_storage = JSONStorage("products.json")
-    sales_storage = JSONStorage("sales.json")
-    customer_storage = JSONStorage("customers.json")
+def get_datetime_input(prompt, allow_blank=False):
+    while True:
+        value = input(prompt).strip()
+        if allow_blank and value == "":
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            print("Please enter a date as YYYY-MM-DD or YYYY-MM-DD HH:MM.")
+
+
+def get_period_input(title):
+    """
+    Ask for a report period.
+
+    Returns (period, start, end) for the report methods, or None for an
+    invalid choice.
+    """
+    print(f"{title} options:")
+    print("1. All time")
+    print("2. Today only")
+    print("3. This week")
+    print("4. This month")
+    print("5. This year")
+    print("6. Custom range")
+    period_choice = input("Enter your choice: ").strip()
+    periods = {"1": "all", "2": "today", "3": "week", "4": "month", "5": "year"}
+    if period_choice in periods:
+        return periods[period_choice], None, None
+    if period_choice == "6":
+        start = get_datetime_input("From (YYYY-MM-DD [HH:MM]): ")
+        end = get_datetime_input("To, exclusive (blank for now): ", allow_blank=True)
+        return "custom", start, end
+    return None
+
+
+def create_json_storages(codec=None):
+    """codec: name of the format snapshots are written in (see storage.get_codec)."""
+    codec = get_codec(codec)
+    product_storage = JournalStorage("products.json", codec=codec)
+    if os.path.isdir("sales"):
+        sales_storage = PartitionedSalesStorage("sales")
+    else:
+        # Sales are kept as monthly JSON Lines partitions; split an older
+        # single-file history once, keeping the file as a backup.
+        source = None
+        if os.path.exists("sales.jsonl"):
+            source = "sales.jsonl"
+            source_storage = JSONLinesStorage(source)
+        elif os.path.exists("sales.json"):
+            source = "sales.json"
+            source_storage = JournalStorage(source)
+        if source:
+            print(
+                f"Splitting {source} into monthly files in sales/ "
+                f"({source} is kept as a backup)..."
+            )
+            # Split into a scratch folder that only becomes sales/ once it is
+            # complete, so an interrupted split starts over on the next run.
+            shutil.rmtree("sales.tmp", ignore_errors=True)
+            staging = PartitionedSalesStorage("sales.tmp")
+            migrate_sales_to_partitions(source_storage, staging)
+            staging.wait()
+            os.replace("sales.tmp", "sales")
+        sales_storage = PartitionedSalesStorage("sales")
+    customer_storage = JournalStorage("customers.json", codec=codec)
+    aggregate_storage = JournalStorage("sales_aggregates.json", codec=codec)
+    return product_storage, customer_storage, sales_storage, aggregate_storage
+
+
+def create_sqlite_storages(path="inventory.db"):
+    is_new = not os.path.exists(path)
+    database = SQLiteDatabase(path)
+    storages = (
+        SQLiteTableStorage(database, "products"),
+        SQLiteTableStorage(database, "customers"),
+        SQLiteSalesStorage(database),
+        SQLiteDocumentStorage(database, "sales_aggregates"),
+    )
+    if is_new:
+        count = migrate_json_to_sqlite(*storages)
+        if count:
+            print(f"Copied {count} records from the JSON files into {path}.")
+    return storages
+
+
+def create_managers(
+    load_in_background=True, backend="json", codec=None, write_behind=0, processes=1
+):
+    """
+    Build the storage objects and managers used by the CLI.
+
+    backend: "json" (files next to the program) or "sqlite" (inventory.db,
+        filled from the JSON files the first time).
+    codec: for the json backend, the format product, customer and totals
+        snapshots are written in ("json", "orjson", "marshal"; default:
+        orjson if installed, else compact json). Any format is read.
+    write_behind: milliseconds; when above 0, changes are queued and
+        written in batches at most this long after they are made
+        (WriteBehindStorage) instead of before each call returns. json
+        backend only: SQLite commits a sale, its stock and its totals in
+        one transaction, which queued writes would split.
+    processes: worker processes for adding up a partitioned sales history
+        (rebuilding the totals, reports over a period); 1 keeps it in
+        this process.
+
+    Sales and customers are not read here, nor is the product search index
+    built; they load on first use, or on background threads when
+    load_in_background is True, so the first menu appears without waiting
+    for the sales history.
+    """
+    if write_behind > 0 and backend == "sqlite":
+        raise ValueError("write-behind works with the json backend only")
+    if backend == "sqlite":
+        storages = create_sqlite_storages()
+    else:
+        storages = create_json_storages(codec)
+    if write_behind > 0:
+        storages = [WriteBehindStorage(storage, write_behind / 1000) for storage in storages]
+    product_storage, customer_storage, sales_storage, aggregate_storage = storages
 
     inventory = Inventory(product_storage)
     customer_manager = CustomerManager(customer_storage)
-    sales_manager = SalesManager(inventory, sales_storage, customer_manager)
+    # Sale numbers come from a counter file, so new sales need neither the
+    # history nor coordination with other processes using the same folder.
+    sale_ids = FileSequence(
+        "sale_ids.seq", seed=lambda: last_sale_number(sales_storage.iter_chunks())
+    )
+    sales_manager = SalesManager(
+        inventory, sales_storage, customer_manager, aggregate_storage, sale_ids, processes
+    )
     report_manager = ReportManager(inventory, sales_manager)
 
+    if load_in_background:
+        inventory.index_in_background()
+        customer_manager.load_in_background()
+        sales_manager.load_in_background()
+    return inventory, customer_manager, sales_manager, report_manager
+
+
+def run(backend="json", codec=None, write_behind=0, processes=1):
+    # Storage and managers
+    inventory, customer_manager, sales_manager, report_manager = create_managers(
+        backend=backend, codec=codec, write_behind=write_behind, processes=processes
+    )
+
     print("Welcome to the Inventory Management System!")
 
     while True:
@@ -123,14 +314,18 @@ def run():
                         f"Quantity [{product['quantity']}]: ", allow_blank=True
                     )
 
-                    inventory.update_product(
-                        product_id,
-                        name=new_name or None,
-                        category=new_category or None,
-                        buying_price=new_buying_price,
-                        selling_price=new_selling_price,
-                        quantity=new_quantity,
-                    )
+                    try:
+                        inventory.update_product(
+                            product_id,
+                            name=new_name or None,
+                            category=new_category or None,
+                            buying_price=new_buying_price,
+                            selling_price=new_selling_price,
+                            quantity=new_quantity,
+                        )
+                    except ValueError as e:
+                        print(e)
+                        continue
                     print("Product updated successfully.")
 
                 elif p_choice == "3":
@@ -145,13 +340,10 @@ def run():
                     if not products:
                         print("No products in inventory.")
                     else:
-                        print("\nID | Name | Category | Buy | Sell | Qty")
-                        print("-" * 60)
-                        for p in products:
-                            print(
-                                f"{p['id']} | {p['name']} | {p['category']} | "
-                                f"{p['buying_price']} | {p['selling_price']} | {p['quantity']}"
-                            )
+                        print()
+                        write_lines(
+                            table_lines(products, PRODUCT_LIST_COLUMNS, 60), page_size=PAGE_SIZE
+                        )
 
                 elif p_choice == "5":
                     keyword = input("Enter product name or ID to search: ").strip()
@@ -159,13 +351,10 @@ def run():
                     if not results:
                         print("No matching products found.")
                     else:
-                        print("\nID | Name | Category | Buy | Sell | Qty")
-                        print("-" * 60)
-                        for p in results:
-                            print(
-                                f"{p['id']} | {p['name']} | {p['category']} | "
-                                f"{p['buying_price']} | {p['selling_price']} | {p['quantity']}"
-                            )
+                        print()
+                        write_lines(
+                            table_lines(results, PRODUCT_LIST_COLUMNS, 60), page_size=PAGE_SIZE
+                        )
 
                 elif p_choice == "6":
                     break
@@ -188,12 +377,10 @@ def run():
                     if not customers:
                         print("No customers yet.")
                     else:
-                        print("ID | Name | Phone | Email")
-                        print("-" * 50)
-                        for c in customers:
-                            print(
-                                f"{c['id']} | {c['name']} | {c['phone']} | {c['email']}"
-                            )
+                        write_lines(
+                            table_lines(customers, CUSTOMER_LIST_COLUMNS, 50),
+                            page_size=PAGE_SIZE,
+                        )
                 customer_name = input("Enter customer name (existing or new): ").strip()
                 phone = input("Phone (optional): ").strip() or None
                 email = input("Email (optional): ").strip() or None
@@ -204,10 +391,16 @@ def run():
                 customer_name=customer_name, phone=phone, email=email
             )
 
+            cancelled = False
             while True:
-                product_id = input("Enter product ID to add (or 'done' to finish): ").strip()
+                product_id = input(
+                    "Enter product ID to add (or 'done' to finish, 'cancel' to abandon): "
+                ).strip()
                 if product_id.lower() == "done":
                     break
+                if product_id.lower() == "cancel":
+                    cancelled = True
+                    break
 
                 quantity = get_int_input("Quantity to sell: ")
                 success, message = sales_manager.add_item_to_sale(
@@ -215,7 +408,13 @@ def run():
                 )
                 print(message)
 
-            success, message = sales_manager.finalize_sale(sale)
+            if cancelled:
+                success, message = sales_manager.cancel_sale(sale)
+            else:
+                success, message = sales_manager.finalize_sale(sale)
+                if not success and sale["items"]:
+                    # Not saved: give the reserved stock back.
+                    sales_manager.cancel_sale(sale)
             print(message)
 
         elif choice == "3":
@@ -225,52 +424,51 @@ def run():
                 r_choice = input("Enter your choice: ").strip()
 
                 if r_choice == "1":
-                    report_manager.print_current_inventory()
+                    report_manager.print_current_inventory(page_size=PAGE_SIZE)
 
                 elif r_choice == "2":
                     threshold = get_int_input("Enter low stock threshold (e.g., 5): ")
-                    report_manager.print_low_stock(threshold)
+                    report_manager.print_low_stock(threshold, page_size=PAGE_SIZE)
 
                 elif r_choice == "3":
-                    print("Sales summary options:")
-                    print("1. All time")
-                    print("2. Today only")
-                    period_choice = input("Enter your choice: ").strip()
-                    if period_choice == "1":
-                        report_manager.print_sales_summary(period="all")
-                    elif period_choice == "2":
-                        report_manager.print_sales_summary(period="today")
+                    period = get_period_input("Sales summary")
+                    if period:
+                        name, start, end = period
+                        report_manager.print_sales_summary(period=name, start=start, end=end)
                     else:
                         print("Invalid choice. Showing all-time summary.")
                         report_manager.print_sales_summary(period="all")
 
                 elif r_choice == "4":
-                    print("Top selling products options:")
-                    print("1. All time")
-                    print("2. Today only")
-                    period_choice = input("Enter your choice: ").strip()
-                    if period_choice == "1":
-                        report_manager.print_top_selling_products(period="all")
-                    elif period_choice == "2":
-                        report_manager.print_top_selling_products(period="today")
+                    period = get_period_input("Top selling products")
+                    if period:
+                        name, start, end = period
+                        by_revenue = input("Rank by revenue instead of quantity? (y/n): ")
+                        category = input("Category (blank for all): ").strip()
+                        report_manager.print_top_selling_products(
+                            period=name,
+                            start=start,
+                            end=end,
+                            rank_by="revenue" if by_revenue.strip().lower() == "y" else "quantity",
+                            category=category or None,
+                        )
                     else:
                         print("Invalid choice. Showing all-time top sellers.")
                         report_manager.print_top_selling_products(period="all")
 
                 elif r_choice == "5":
-                    print("Sales by customer options:")
-                    print("1. All time")
-                    print("2. Today only")
-                    period_choice = input("Enter your choice: ").strip()
-                    if period_choice == "1":
-                        report_manager.print_sales_by_customer(period="all")
-                    elif period_choice == "2":
-                        report_manager.print_sales_by_customer(period="today")
+                    period = get_period_input("Sales by customer")
+                    if period:
+                        name, start, end = period
+                        report_manager.print_sales_by_customer(period=name, start=start, end=end)
                     else:
                         print("Invalid choice. Showing all-time customer stats.")
                         report_manager.print_sales_by_customer(period="all")
 
                 elif r_choice == "6":
+                    report_manager.print_stock_by_category()
+
+                elif r_choice == "7":
                     break
                 else:
                     print("Invalid choice. Please select from the menu.")
@@ -293,12 +491,10 @@ def run():
                     if not customers:
                         print("No customers yet.")
                     else:
-                        print("ID | Name | Phone | Email")
-                        print("-" * 50)
-                        for c in customers:
-                            print(
-                                f"{c['id']} | {c['name']} | {c['phone']} | {c['email']}"
-                            )
+                        write_lines(
+                            table_lines(customers, CUSTOMER_LIST_COLUMNS, 50),
+                            page_size=PAGE_SIZE,
+                        )
 
                 elif c_choice == "3":
                     break
@@ -312,5 +508,273 @@ def run():
             print("Invalid choice. Please select from the menu.")
 
 
+def print_import_result(applied, errors):
+    print(f"Applied {applied} rows, skipped {len(errors)}.")
+    for error in errors[:20]:
+        print(f"  {error}")
+    if len(errors) > 20:
+        print(f"  ... and {len(errors) - 20} more")
+
+
+def report_rows(report_manager, args):
+    """(columns, rows) of a report, for the CSV and JSON formats."""
+    period = dict(period=args.period, start=args.start, end=args.end)
+    if args.name == "inventory":
+        return INVENTORY_COLUMNS, report_manager.inventory_rows()
+    if args.name == "low-stock":
+        return LOW_STOCK_COLUMNS, report_manager.low_stock_rows(args.threshold)
+    if args.name == "categories":
+        return CATEGORY_COLUMNS, report_manager.inventory_value_by_category()
+    if args.name == "summary":
+        summary = report_manager.sales_summary(recent=0, **period)
+        return SUMMARY_COLUMNS, [summary]
+    if args.name == "top-products":
+        report = report_manager.top_selling_products(
+            top_n=args.top, rank_by=args.rank_by, category=args.category, **period
+        )
+        return TOP_PRODUCT_COLUMNS, report["products"]
+    if args.name == "customers":
+        return CUSTOMER_COLUMNS, report_manager.sales_by_customer(**period)["customers"]
+    return SALE_COLUMNS, report_manager.sales_rows(**period)
+
+
+def print_report(report_manager, args, out):
+    period = dict(period=args.period, start=args.start, end=args.end)
+    listing = dict(limit=args.limit, offset=args.offset, out=out)
+    if args.name == "inventory":
+        report_manager.print_current_inventory(**listing)
+    elif args.name == "low-stock":
+        report_manager.print_low_stock(args.threshold, **listing)
+    elif args.name == "categories":
+        report_manager.print_stock_by_category(out=out)
+    elif args.name == "summary":
+        report_manager.print_sales_summary(out=out, **period)
+    elif args.name == "top-products":
+        report_manager.print_top_selling_products(
+            top_n=args.top, rank_by=args.rank_by, category=args.category, out=out, **period
+        )
+    elif args.name == "customers":
+        report_manager.print_sales_by_customer(out=out, **period)
+    else:
+        report_manager.print_sales(**period, **listing)
+
+
+def write_report(report_manager, args):
+    """Run the `report` command: print it, or write it as CSV or JSON."""
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "table":
+            print_report(report_manager, args, out)
+            return 0
+        columns, rows = report_rows(report_manager, args)
+        rows = paginate(iter(rows), args.offset, args.limit)
+        write = write_csv if args.format == "csv" else write_json
+        count = write(rows, columns, out)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {count} rows to {args.output}.")
+    return 0
+
+
+def print_metrics(filename=None, fmt="table"):
+    """Show the totals saved by the last run with IMS_METRICS=1."""
+    saved = metrics.load(filename)
+    if saved is None:
+        print(
+            f"No metrics in {filename or metrics.METRICS_FILE}. "
+            "Run a command with IMS_METRICS=1 to collect them."
+        )
+        return 1
+    if fmt == "json":
+        print(json.dumps(saved, indent=2))
+        return 0
+    rows = [dict(timer, name=name) for name, timer in saved["timers"].items()]
+    write_lines(table_lines(rows, METRIC_COLUMNS, 70))
+    for name, value in saved["counters"].items():
+        print(f"{name}: {value}")
+    return 0
+
+
+def archive_sales(backend, before):
+    if backend != "json":
+        print("archive-sales works with the JSON backend only.")
+        return 1
+    try:
+        datetime.strptime(before, "%Y-%m")
+    except ValueError:
+        print("Give the month as YYYY-MM.")
+        return 1
+    this_month = datetime.now().strftime("%Y-%m")
+    if before > this_month:
+        print(f"Only past months can be archived: give {this_month} or earlier.")
+        return 1
+    sales_storage = create_json_storages()[2]
+    archived = sales_storage.archive(before)
+    if not archived:
+        print(f"No sales partitions before {before} to archive.")
+    else:
+        print(
+            f"Archived {len(archived)} partitions ({archived[0]} to {archived[-1]}) "
+            f"to {sales_storage.archive_folder}."
+        )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inventory Management System. Without a command, starts the interactive menu."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("json", "sqlite"),
+        default="json",
+        help="where data is kept (default: json files)",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=("auto",) + tuple(CODECS),
+        default="auto",
+        help="format of the json backend's snapshot files (default: orjson if installed, "
+        "else compact json; marshal is a binary format that reloads fastest)",
+    )
+    parser.add_argument(
+        "--write-behind",
+        type=int,
+        default=0,
+        metavar="MS",
+        help="queue changes and write them in batches at most MS milliseconds later "
+        "(default: 0, every change is written before it returns)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        metavar="N",
+        help="worker processes for adding up a sales history of several months "
+        "(default: 1, no worker processes)",
+    )
+    commands = parser.add_subparsers(dest="command")
+    for name, help_text in (
+        ("import-products", "add or update products from a CSV or JSON Lines file"),
+        ("import-stock", "apply stock deltas (id, delta) from a CSV or JSON Lines file"),
+        ("export-products", "write all products to a CSV or JSON Lines file"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("path")
+        command.add_argument(
+            "--format", choices=("csv", "jsonl"), help="default: from the file extension"
+        )
+    archive = commands.add_parser(
+        "archive-sales",
+        help="compress sales partitions before a month and move them to sales/archive",
+    )
+    archive.add_argument("before", help="YYYY-MM: archive the months before this one")
+    serve = commands.add_parser("serve", help="serve the HTTP/JSON API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument(
+        "--workers", type=int, default=8, help="threads for storage and report work (default: 8)"
+    )
+    dump = commands.add_parser(
+        "metrics", help="show the timings saved by the last run with IMS_METRICS=1"
+    )
+    dump.add_argument("--file", help=f"default: {metrics.METRICS_FILE}")
+    dump.add_argument("--format", choices=("table", "json"), default="table")
+    report = commands.add_parser(
+        "report", help="print a report, or write it to a CSV or JSON file"
+    )
+    report.add_argument("name", choices=REPORTS)
+    report.add_argument("--period", choices=PERIODS, default="all")
+    report.add_argument(
+        "--start", type=datetime.fromisoformat, help="YYYY-MM-DD[THH:MM]; overrides --period"
+    )
+    report.add_argument("--end", type=datetime.fromisoformat, help="exclusive, default: now")
+    report.add_argument("--threshold", type=int, default=5, help="low-stock quantity (default: 5)")
+    report.add_argument("--top", type=int, default=5, help="top-products count (default: 5)")
+    report.add_argument("--rank-by", choices=("quantity", "revenue"), default="quantity")
+    report.add_argument("--category", help="top-products: only this category")
+    report.add_argument("--limit", type=int, help="listings: at most this many rows")
+    report.add_argument("--offset", type=int, default=0, help="listings: skip this many rows")
+    report.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    report.add_argument("--output", help="write to this file instead of the terminal")
+    report.add_argument(
+        "--snapshot",
+        metavar="FILE",
+        help="report from a file written by the snapshot command instead of the live data",
+    )
+    snapshot = commands.add_parser(
+        "snapshot",
+        help="write products and sales to a memory-mapped file for report processes",
+    )
+    snapshot.add_argument("--output", default="inventory.snap", help="default: inventory.snap")
+    args = parser.parse_args(argv)
+    if args.write_behind > 0 and args.backend == "sqlite":
+        parser.error(
+            "--write-behind works with the json backend only "
+            "(SQLite commits each sale and its stock in one transaction)"
+        )
+
+    if args.command is None:
+        run(args.backend, args.codec, args.write_behind, args.processes)
+        return 0
+    if args.command == "metrics":
+        return print_metrics(args.file, args.format)
+    if args.command == "archive-sales":
+        return archive_sales(args.backend, args.before)
+    if args.command == "serve":
+        api = InventoryAPI(
+            *create_managers(
+                backend=args.backend,
+                codec=args.codec,
+                write_behind=args.write_behind,
+                processes=args.processes,
+            )
+        )
+        InventoryServer(api, args.host, args.port, args.workers).run()
+        return 0
+
+    if args.command == "report" and args.snapshot:
+        try:
+            report_manager = open_report_manager(args.snapshot)[0]
+        except (OSError, ValueError) as e:
+            print(f"Could not open snapshot {args.snapshot}: {e}")
+            return 1
+        return write_report(report_manager, args)
+    if args.command in ("report", "snapshot"):
+        _, _, sales_manager, report_manager = create_managers(
+            load_in_background=False,
+            backend=args.backend,
+            codec=args.codec,
+            processes=args.processes,
+        )
+        if args.command == "report":
+            return write_report(report_manager, args)
+        products, sales = write_snapshot(
+            args.output, report_manager.inventory.get_all_products(), sales_manager.iter_sales()
+        )
+        print(f"Wrote {products} products and {sales} sales to {args.output}.")
+        return 0
+
+    inventory = create_managers(
+        load_in_background=False, backend=args.backend, codec=args.codec
+    )[0]
+    if args.command == "export-products":
+        count = bulk.export_products(inventory, args.path, args.format)
+        print(f"Exported {count} products to {args.path}.")
+        return 0
+
+    if not os.path.exists(args.path):
+        print(f"{args.path} does not exist.")
+        return 1
+    if args.command == "import-products":
+        applied, errors = bulk.import_products(inventory, args.path, args.format)
+    else:
+        applied, errors = bulk.import_stock(inventory, args.path, args.format)
+    print_import_result(applied, errors)
+    return 1 if errors else 0
+
+
 if __name__ == "__main__":
-    run()
+    sys.exit(metrics.run(main))
@@ -0,0 +1,153 @@
+"""
+Optional timing and counting instrumentation.
+
+Switched on with environment variables, read once at import:
+
+    IMS_METRICS=1            time the instrumented calls and count bytes
+                             written; the totals are saved to IMS_METRICS_FILE
+                             (default: metrics.json) when the process exits,
+                             and `python main.py metrics` prints them.
+    IMS_PROFILE=run.prof     run the whole command under cProfile and save
+                             the stats there (read with `python -m pstats`).
+
+With IMS_METRICS unset, @timed returns the function itself, so the
+instrumented methods cost exactly what they did before.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("IMS_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("IMS_METRICS_FILE", "metrics.json")
+PROFILE_FILE = os.environ.get("IMS_PROFILE") or None
+
+_lock = threading.Lock()
+# name -> [calls, total seconds, longest call in seconds]
+_timers = {}
+# name -> running total
+_counters = {}
+
+
+def timed(name):
+    """Decorator: record the call count and duration of a function under `name`."""
+
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def record(name, seconds):
+    """Add one call of `seconds` to the timer `name`."""
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+
+def count(name, amount=1):
+    """Add `amount` to the counter `name` (e.g. bytes written). No-op when disabled."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot():
+    """
+    The current totals: {"timers": {name: {"calls", "total_ms", "mean_ms",
+    "max_ms"}}, "counters": {name: value}}, sorted by name.
+    """
+    with _lock:
+        timers = {name: list(timer) for name, timer in _timers.items()}
+        counters = dict(_counters)
+    return {
+        "timers": {
+            name: {
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / calls, 3),
+                "max_ms": round(longest * 1000, 3),
+            }
+            for name, (calls, total, longest) in sorted(timers.items())
+        },
+        "counters": dict(sorted(counters.items())),
+    }
+
+
+def reset():
+    """Forget all totals."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def save(filename=None):
+    """Write snapshot() to `filename` (default: IMS_METRICS_FILE) as JSON."""
+    filename = filename or METRICS_FILE
+    try:
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(snapshot(), f, indent=2)
+    except OSError as e:
+        print(f"Error saving to {filename}: {e}")
+
+
+def load(filename=None):
+    """Read totals saved by save(). Returns None if there are none."""
+    filename = filename or METRICS_FILE
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError):
+        print(f"Warning: Could not read {filename}.")
+        return None
+
+
+def run(function, *args):
+    """
+    Call function(*args), under cProfile when IMS_PROFILE is set.
+
+    Only the calling thread is profiled; time spent in worker threads shows
+    up as waiting.
+    """
+    if PROFILE_FILE is None:
+        return function(*args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(PROFILE_FILE)
+        print(f"Profile saved to {PROFILE_FILE} (python -m pstats {PROFILE_FILE}).")
+
+
+def _save_at_exit():
+    # A process that recorded nothing (e.g. `main.py metrics` itself) keeps
+    # the totals of the last real run.
+    if _timers or _counters:
+        save()
+
+
+if ENABLED:
+    atexit.register(_save_at_exit)
@@ -0,0 +1,91 @@
+"""
+Convert a JSON array data file (e.g. sales.json) to JSON Lines.
+
+Usage, from the Inventory_Management_System folder:
+    python migrate.py sales.json sales.jsonl
+
+main.py also uses migrate_json_to_sqlite() to fill a new SQLite database
+from the JSON files.
+"""
+import json
+import os
+import sys
+
+from partitioned_storage import PartitionedSalesStorage
+from storage import JournalStorage, JSONLinesStorage, to_json_value
+
+
+def migrate_json_to_jsonl(source, target, chunk_size=1000):
+    """
+    Stream the records of `source` into a new JSON Lines file `target`.
+
+    Pending journal entries next to `source` are included. Returns the
+    number of records written; `source` is left untouched.
+    """
+    count = 0
+    tmp_filename = target + ".tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        for chunk in JournalStorage(source).iter_chunks(chunk_size):
+            for record in chunk:
+                f.write(json.dumps(record, default=to_json_value) + "\n")
+            count += len(chunk)
+    os.replace(tmp_filename, target)
+    return count
+
+
+def migrate_sales_to_partitions(source_storage, target):
+    """
+    Copy every sale from `source_storage` into a PartitionedSalesStorage,
+    a chunk at a time. Returns the number of sales copied.
+    """
+    count = 0
+    for chunk in source_storage.iter_chunks():
+        target.extend(chunk)
+        count += len(chunk)
+    return count
+
+
+def migrate_json_to_sqlite(product_storage, customer_storage, sales_storage, aggregate_storage):
+    """
+    Copy the JSON data files in the current folder into the given SQLite storages.
+
+    Each storage is filled a chunk at a time. Returns the number of records copied.
+    """
+    if os.path.isdir("sales"):
+        sales_source = PartitionedSalesStorage("sales")
+    elif os.path.exists("sales.jsonl"):
+        sales_source = JSONLinesStorage("sales.jsonl")
+    else:
+        sales_source = JournalStorage("sales.json")
+    count = 0
+    for source, target in (
+        (JournalStorage("products.json"), product_storage),
+        (JournalStorage("customers.json"), customer_storage),
+        (sales_source, sales_storage),
+        (JournalStorage("sales_aggregates.json"), aggregate_storage),
+    ):
+        for chunk in source.iter_chunks():
+            target.extend(chunk)
+            count += len(chunk)
+    return count
+
+
+def main(argv):
+    if len(argv) != 3:
+        print(__doc__.strip())
+        return 1
+    source, target = argv[1], argv[2]
+    if not os.path.exists(source):
+        print(f"{source} does not exist.")
+        return 1
+    if os.path.exists(target):
+        print(f"{target} already exists. Remove it first to convert again.")
+        return 1
+
+    count = migrate_json_to_jsonl(source, target)
+    print(f"Wrote {count} records to {target}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
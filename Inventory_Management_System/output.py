@@ -0,0 +1,79 @@
+import csv
+import json
+import sys
+from itertools import islice
+
+from storage import to_json_value
+
+PAGE_SIZE = 20
+
+
+def paginate(rows, offset=0, limit=None):
+    """Skip `offset` rows and stop after `limit` (None for all), lazily."""
+    return islice(rows, offset or 0, None if limit is None else (offset or 0) + limit)
+
+
+def table_lines(rows, columns, rule_width):
+    """
+    Yield a " | " separated table: header, rule, then one line per row.
+
+    columns: (key, title, format spec) triples; the spec is used with
+    format(), so "" prints a value as-is and ".2f" as money.
+    """
+    yield " | ".join(title for _, title, _ in columns)
+    yield "-" * rule_width
+    for row in rows:
+        yield " | ".join(format(row[key], spec) for key, _, spec in columns)
+
+
+def write_lines(lines, out=None, page_size=None, ask=input, batch_size=1000):
+    """
+    Write lines to `out` (default: stdout), `batch_size` lines per write call.
+
+    With page_size, stops after each page to ask whether to go on; answering
+    "q" stops, and the rest of `lines` is never produced (pass a generator
+    so a long listing costs nothing past the last page shown).
+    Returns the number of lines written.
+    """
+    out = out or sys.stdout
+    batch = []
+    written = 0
+    for line in lines:
+        batch.append(line)
+        written += 1
+        if page_size and written % page_size == 0:
+            out.write("\n".join(batch) + "\n")
+            out.flush()
+            batch = []
+            if ask("-- Enter for more, q to stop -- ").strip().lower() == "q":
+                return written
+        elif len(batch) >= batch_size:
+            out.write("\n".join(batch) + "\n")
+            batch = []
+    if batch:
+        out.write("\n".join(batch) + "\n")
+    out.flush()
+    return written
+
+
+def write_csv(rows, columns, f):
+    """Stream rows to an open text file as CSV, with the column keys as header. Returns the row count."""
+    writer = csv.writer(f)
+    writer.writerow([key for key, _, _ in columns])
+    count = 0
+    for row in rows:
+        writer.writerow([row[key] for key, _, _ in columns])
+        count += 1
+    return count
+
+
+def write_json(rows, columns, f):
+    """Stream rows to an open text file as a JSON array of objects. Returns the row count."""
+    count = 0
+    f.write("[")
+    for row in rows:
+        item = {key: row[key] for key, _, _ in columns}
+        f.write(("," if count else "") + "\n  " + json.dumps(item, default=to_json_value))
+        count += 1
+    f.write("\n]\n" if count else "]\n")
+    return count
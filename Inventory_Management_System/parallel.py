@@ -0,0 +1,140 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from aggregates import SalesAggregates, sale_day
+
+KINDS = ("day", "customer", "product")
+
+
+def _add_exact(partials, x):
+    """
+    Add x to the exact sum kept in `partials` (non-overlapping floats, the
+    representation math.fsum uses), so no rounding error builds up.
+    """
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+class ExactTotals:
+    """
+    Sales totals for merging, with the rows of SalesAggregates.
+
+    Revenue is kept as an exact sum rather than a running float, so the
+    totals of separate parts of the history merge without rounding error:
+    the result is the same however the history was split.
+    """
+
+    def __init__(self, kinds=KINDS):
+        self.kinds = kinds
+        # row id -> [kind, fields, orders, quantity, revenue partials]
+        self.rows = {}
+
+    def _row(self, row_id, kind, fields):
+        row = self.rows.get(row_id)
+        if row is None:
+            row = self.rows[row_id] = [kind, fields, 0, 0, []]
+        return row
+
+    def _add(self, row, quantity, revenues):
+        row[2] += 1
+        row[3] += quantity
+        for revenue in revenues:
+            _add_exact(row[4], revenue)
+
+    def record(self, sale):
+        """Add one sale, counting it as SalesAggregates.record() does."""
+        quantity, amount = sale["total_quantity"], (sale["total_amount"],)
+        self._add(self._row("total", "total", {}), quantity, amount)
+        if "day" in self.kinds:
+            day = sale_day(sale)
+            if day is not None:
+                self._add(self._row(f"day:{day}", "day", {"day": day}), quantity, amount)
+        if "customer" in self.kinds:
+            cname = sale["customer_name"]
+            row = self._row(f"customer:{cname}", "customer", {"customer_name": cname})
+            self._add(row, quantity, amount)
+        if "product" in self.kinds:
+            # A product listed on several lines of one sale still counts as one order.
+            product_lines = {}
+            for item in sale["items"]:
+                key = (item["product_id"], item["product_name"])
+                line_quantity, revenues = product_lines.get(key, (0, ()))
+                product_lines[key] = (
+                    line_quantity + item["quantity"],
+                    revenues + (item["line_total"],),
+                )
+            for (pid, pname), (line_quantity, revenues) in product_lines.items():
+                row = self._row(
+                    f"product:{pid}:{pname}",
+                    "product",
+                    {"product_id": pid, "product_name": pname},
+                )
+                self._add(row, line_quantity, revenues)
+
+    def merge(self, other):
+        """Add the totals of a later part of the history."""
+        for row_id, (kind, fields, orders, quantity, partials) in other.rows.items():
+            row = self._row(row_id, kind, fields)
+            row[2] += orders
+            row[3] += quantity
+            for x in partials:
+                _add_exact(row[4], x)
+
+    def aggregates(self):
+        """The totals as SalesAggregates, each revenue rounded once."""
+        rows = []
+        for row_id, (kind, fields, orders, quantity, partials) in self.rows.items():
+            row = {"id": row_id, "kind": kind}
+            row.update(fields)
+            row.update({"orders": orders, "quantity": quantity, "revenue": math.fsum(partials)})
+            rows.append(row)
+        return SalesAggregates(rows)
+
+
+def _partition_totals(storage, key, start, end, kinds):
+    # Runs in a worker process: reads the partition itself, so only the
+    # (small) totals travel back.
+    totals = ExactTotals(kinds)
+    for record in storage.iter_partition(key, start, end):
+        totals.record(record)
+    return totals
+
+
+def aggregate_partitions(storage, start=None, end=None, kinds=KINDS, processes=None):
+    """
+    SalesAggregates for start <= timestamp < end (every sale when both are
+    None), computed one partition per task in up to `processes` worker
+    processes (default: one per CPU) and merged in history order.
+
+    storage: a PartitionedSalesStorage (anything with partitions_between()
+        and iter_partition() that can be pickled).
+
+    Workers are started with "spawn", so they never inherit the locks of
+    the calling process's threads; starting them costs a fraction of a
+    second, which pays off once the history is large.
+    """
+    # Background closing of partitions moves sales between files.
+    storage.wait()
+    keys = storage.partitions_between(start, end)
+    totals = ExactTotals(kinds)
+    if not keys:
+        return totals.aggregates()
+    workers = min(processes or multiprocessing.cpu_count(), len(keys))
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        parts = pool.map(
+            _partition_totals, repeat(storage), keys, repeat(start), repeat(end), repeat(kinds)
+        )
+        for part in parts:
+            totals.merge(part)
+    return totals.aggregates()
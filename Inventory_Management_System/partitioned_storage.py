@@ -0,0 +1,429 @@
+import gzip
+import json
+import lzma
+import os
+import threading
+from datetime import datetime, timedelta
+
+import metrics
+from aggregates import sale_time
+from storage import to_json_value
+
+# compression name -> (file suffix, open function)
+COMPRESSIONS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open)}
+# Partition for sales whose timestamp cannot be read; it is never closed.
+UNDATED = "undated"
+READ_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+
+def _sort_key(key):
+    return (key != UNDATED, key)
+
+
+class PartitionedSalesStorage:
+    """
+    Sales kept as one JSON Lines file per month (or per day).
+
+    A new sale is appended to the partition of its timestamp, so recording a
+    sale only ever touches one small file. When a new period starts, the
+    older partitions are closed on a background thread: compressed (gzip or
+    lzma) into a single file that is never modified again. Range reads only
+    open the partitions that overlap the range.
+
+    archive() moves closed partitions to `archive_folder` (cold storage, e.g.
+    a mounted slower disk); archived partitions are still read.
+
+    Files in `folder`: 2024-05.jsonl (open), 2024-05.jsonl.gz (closed).
+    """
+
+    def __init__(self, folder, by="month", compression="gzip", archive_folder=None):
+        """
+        by: "month" or "day".
+        compression: "gzip", "lzma" or None (closed partitions stay plain JSON Lines).
+        archive_folder: where archive() moves partitions (default: <folder>/archive).
+        """
+        if by not in ("month", "day"):
+            raise ValueError(f"by must be 'month' or 'day', not {by!r}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression {compression!r}")
+        self.folder = folder
+        self.by = by
+        self.compression = compression
+        self.archive_folder = archive_folder or os.path.join(folder, "archive")
+        self._key_format = "%Y-%m" if by == "month" else "%Y-%m-%d"
+        # Held while files are added, replaced, moved or opened for reading,
+        # so a reader always sees each sale in exactly one file.
+        self._lock = threading.RLock()
+        self._closer = None
+        self._current_key = None
+        os.makedirs(folder, exist_ok=True)
+
+    def __getstate__(self):
+        # Pickled for worker processes (parallel.aggregate_partitions): the
+        # lock and closing thread belong to this process.
+        state = self.__dict__.copy()
+        del state["_lock"], state["_closer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._closer = None
+
+    # Partitions and their files
+
+    def partition_key(self, sale):
+        """The partition a sale belongs to: "YYYY-MM" (or "YYYY-MM-DD")."""
+        ts = sale_time(sale)
+        return ts.strftime(self._key_format) if ts is not None else UNDATED
+
+    def partitions(self):
+        """Keys of all partitions, current and archived, oldest first."""
+        keys = set()
+        for folder in (self.archive_folder, self.folder):
+            try:
+                names = os.listdir(folder)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                key, _, suffix = name.partition(".")
+                if suffix in self._suffixes():
+                    keys.add(key)
+        return sorted(keys, key=_sort_key)
+
+    def _suffixes(self):
+        return ("jsonl",) + tuple("jsonl" + suffix for suffix, _ in COMPRESSIONS.values())
+
+    def _open_path(self, key):
+        return os.path.join(self.folder, f"{key}.jsonl")
+
+    def _closed_path(self, folder, key):
+        if self.compression is None:
+            return os.path.join(folder, f"{key}.jsonl")
+        return os.path.join(folder, f"{key}.jsonl{COMPRESSIONS[self.compression][0]}")
+
+    def _files(self, key):
+        """Existing (path, open function) pairs of a partition, in reading order."""
+        files = []
+        for folder in (self.archive_folder, self.folder):
+            for suffix, opener in COMPRESSIONS.values():
+                path = os.path.join(folder, f"{key}.jsonl{suffix}")
+                if os.path.exists(path):
+                    files.append((path, opener))
+        for path in (os.path.join(self.archive_folder, f"{key}.jsonl"), self._open_path(key)):
+            if os.path.exists(path):
+                files.append((path, open))
+        return files
+
+    # Reading
+
+    def _read_partition(self, key):
+        """Yield the records of one partition, in file order."""
+        sources = []
+        with self._lock:
+            for path, opener in self._files(key):
+                try:
+                    f = opener(path, "rb")
+                except OSError as e:
+                    print(f"Warning: Could not read {path}: {e}")
+                    continue
+                # Stop at the current end of an open file: a sale being
+                # appended right now is not complete yet.
+                limit = os.fstat(f.fileno()).st_size if opener is open else None
+                sources.append((path, f, limit))
+        for path, f, limit in sources:
+            with f:
+                yield from self._read_lines(path, f, limit)
+
+    def _read_lines(self, path, f, limit):
+        read = 0
+        try:
+            for line_number, line in enumerate(f, 1):
+                if limit is not None:
+                    read += len(line)
+                    if read > limit:
+                        break
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Warning: Skipping unreadable line {line_number} in {path}.")
+        except READ_ERRORS as e:
+            print(f"Warning: Could not read {path}: {e}")
+
+    def _chunks(self, records, chunk_size):
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def load(self):
+        """Load all records. Returns a list."""
+        data = []
+        for chunk in self.iter_chunks():
+            data.extend(chunk)
+        return data
+
+    def iter_chunks(self, chunk_size=1000):
+        """Yield lists of up to `chunk_size` records, partition by partition."""
+        for key in self.partitions():
+            yield from self._chunks(self._read_partition(key), chunk_size)
+
+    def count(self):
+        """
+        Number of sales, counted from the line breaks of every partition
+        without parsing a record.
+        """
+        total = 0
+        for key in self.partitions():
+            with self._lock:
+                sources = []
+                for path, opener in self._files(key):
+                    try:
+                        sources.append((path, opener(path, "rb")))
+                    except OSError as e:
+                        print(f"Warning: Could not read {path}: {e}")
+            for path, f in sources:
+                with f:
+                    try:
+                        # A line still being written has no line break yet.
+                        total += sum(1 for line in f if line.endswith(b"\n") and line.strip())
+                    except READ_ERRORS as e:
+                        print(f"Warning: Could not read {path}: {e}")
+        return total
+
+    def _keys_between(self, start, end):
+        first = start.strftime(self._key_format) if start is not None else None
+        last = (end - timedelta(microseconds=1)).strftime(self._key_format) if end else None
+        return [
+            key
+            for key in self.partitions()
+            if key != UNDATED
+            and (first is None or key >= first)
+            and (last is None or key <= last)
+        ]
+
+    def _records_between(self, key, start, end):
+        for record in self._read_partition(key):
+            ts = sale_time(record)
+            if ts is not None and (start is None or ts >= start) and (end is None or ts < end):
+                yield record
+
+    def partitions_between(self, start=None, end=None):
+        """Keys of the partitions holding the sales with start <= timestamp < end, oldest first."""
+        if start is None and end is None:
+            return self.partitions()
+        return self._keys_between(start, end)
+
+    def iter_partition(self, key, start=None, end=None):
+        """
+        Yield the sales of one partition with start <= timestamp < end
+        (all of them, unreadable timestamps included, when both are None).
+        """
+        if start is None and end is None:
+            return self._read_partition(key)
+        return self._records_between(key, start, end)
+
+    def iter_chunks_between(self, start=None, end=None, chunk_size=1000):
+        """
+        Yield chunks of the sales with start <= timestamp < end.
+
+        Only the partitions overlapping the range are read.
+        """
+        for key in self._keys_between(start, end):
+            yield from self._chunks(self._records_between(key, start, end), chunk_size)
+
+    def recent_sales(self, count, start=None, end=None):
+        """The last `count` sales with start <= timestamp < end, oldest first."""
+        if count <= 0:
+            return []
+        found = []
+        for key in reversed(self._keys_between(start, end)):
+            records = sorted(self._records_between(key, start, end), key=sale_time)
+            found[:0] = records[-(count - len(found)):]
+            if len(found) >= count:
+                break
+        return found
+
+    # Writing
+
+    @metrics.timed("storage.partitions.append")
+    def append(self, record):
+        """Add one sale to the partition of its timestamp."""
+        key = self.partition_key(record)
+        line = json.dumps(record, default=to_json_value) + "\n"
+        with self._lock:
+            self._append_lines(key, [line])
+        self._check_period()
+
+    @metrics.timed("storage.partitions.extend")
+    def extend(self, records):
+        """Add many sales, e.g. when importing a history."""
+        lines = {}
+        for record in records:
+            key = self.partition_key(record)
+            lines.setdefault(key, []).append(json.dumps(record, default=to_json_value) + "\n")
+        with self._lock:
+            for key, key_lines in lines.items():
+                self._append_lines(key, key_lines)
+        self._check_period()
+
+    def _append_lines(self, key, lines):
+        path = self._open_path(key)
+        data = "".join(lines)
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Error saving to {path}: {e}")
+            return
+        if metrics.ENABLED:
+            metrics.count("storage.bytes_written", len(data.encode("utf-8")))
+
+    def save(self, data):
+        """Replace the whole history, archived partitions included."""
+        self.wait()
+        with self._lock:
+            for key in self.partitions():
+                for path, _ in self._files(key):
+                    os.remove(path)
+            self.extend(data)
+
+    def _check_period(self):
+        # On the first write of a process, and whenever a new period has
+        # started since, close the partitions of earlier periods.
+        key = datetime.now().strftime(self._key_format)
+        if key == self._current_key:
+            return
+        with self._lock:
+            if key == self._current_key:
+                return
+            self._current_key = key
+            if self.compression is not None and not self._closing():
+                self._closer = threading.Thread(
+                    target=self.close_partitions,
+                    args=(key,),
+                    name="sales-partition-closer",
+                    daemon=True,
+                )
+                self._closer.start()
+
+    def _closing(self):
+        return self._closer is not None and self._closer.is_alive()
+
+    def wait(self):
+        """Block until background closing of partitions has finished."""
+        closer = self._closer
+        if closer is not None and closer is not threading.current_thread():
+            closer.join()
+
+    # Closing and archiving
+
+    def close_partitions(self, before):
+        """Compress the open partitions with keys before `before`. Returns the closed keys."""
+        if self.compression is None:
+            return []
+        closed = []
+        for key in self.partitions():
+            if key == UNDATED or key >= before:
+                continue
+            if os.path.exists(self._open_path(key)) and self._close(key):
+                closed.append(key)
+        return closed
+
+    def _close(self, key):
+        return self._replace_from(self._open_path(key), self._closed_path(self.folder, key))
+
+    def _replace_from(self, source, target):
+        """
+        Move the lines of `source` into `target` (appending to what `target`
+        already holds), converting the compression to match `target`.
+
+        The new `target` is written aside first and swapped in under the
+        lock, together with removing `source`, so readers see every sale
+        exactly once. Returns True on success.
+        """
+        with self._lock:
+            size = os.path.getsize(source)
+            # Read a plain file only up to its current end (see _read_partition).
+            sources = [(source, size if _opener(source) is open else None)]
+            if os.path.exists(target):
+                # e.g. late sales for a closed period: fold them into its file.
+                sources.insert(0, (target, None))
+        tmp_path = self._write_tmp(target, sources)
+        if tmp_path is None:
+            return False
+        with self._lock:
+            if os.path.getsize(source) != size:
+                # More sales arrived meanwhile; try again next time.
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, target)
+            os.remove(source)
+        return True
+
+    def _write_tmp(self, target, sources):
+        """
+        Copy the lines of `sources` ((path, byte limit or None)) into a
+        temporary file next to `target`, compressed like `target`.
+        Returns its path, or None on failure.
+        """
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with _opener(target)(tmp_path, "wb") as out:
+                for path, limit in sources:
+                    with _opener(path)(path, "rb") as f:
+                        read = 0
+                        for line in f:
+                            read += len(line)
+                            if limit is not None and read > limit:
+                                break
+                            out.write(line)
+            return tmp_path
+        except READ_ERRORS as e:
+            print(f"Error writing {target}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+
+    def archive(self, before):
+        """
+        Move the partitions with keys before `before` ("YYYY-MM" or
+        "YYYY-MM-DD") to the archive folder, closing them first.
+
+        Only closed (compressed) partitions of past periods move: a `before`
+        later than the current period is treated as the current period, and
+        without compression nothing is archived.
+
+        Returns the archived keys.
+        """
+        if self.compression is None:
+            return []
+        before = min(before, datetime.now().strftime(self._key_format))
+        self.wait()
+        self.close_partitions(before)
+        os.makedirs(self.archive_folder, exist_ok=True)
+        archived = []
+        for key in self.partitions():
+            if key == UNDATED or key >= before:
+                continue
+            source = self._closed_path(self.folder, key)
+            if not os.path.exists(source):
+                continue
+            if self._replace_from(source, self._closed_path(self.archive_folder, key)):
+                archived.append(key)
+        return archived
+
+
+def _opener(path):
+    for suffix, opener in COMPRESSIONS.values():
+        if path.endswith(suffix):
+            return opener
+    return open
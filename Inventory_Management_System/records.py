@@ -0,0 +1,121 @@
+import sys
+
+
+class Record:
+    """
+    Base class for compact records.
+
+    Fields live in __slots__ instead of a per-record dict, which saves most of
+    the memory of a dict with repeated string keys. Records still support
+    dict-style access (record["name"], record.get("name")) so existing callers
+    work unchanged, and to_dict()/from_dict() convert to and from the JSON
+    layout, which is unchanged.
+
+    Keys a record type does not know (e.g. fields added to the data files by
+    other tools) are kept in `_extra` and written back by to_dict(), so
+    loading and saving never loses them.
+    """
+
+    __slots__ = ("_extra",)
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        unknown = fields.keys() - self.__slots__
+        self._extra = {key: fields[key] for key in fields if key in unknown} if unknown else None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ or bool(self._extra) and key in self._extra
+
+    def get(self, key, default=None):
+        if key in self.__slots__:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra else default
+
+    def keys(self):
+        return self.__slots__ + tuple(self._extra) if self._extra else self.__slots__
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Product(Record):
+    __slots__ = ("id", "name", "category", "buying_price", "selling_price", "quantity")
+
+
+class Customer(Record):
+    __slots__ = ("id", "name", "phone", "email")
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        self.phone = self.phone or ""
+        self.email = self.email or ""
+
+
+class LineItem(Record):
+    __slots__ = ("product_id", "product_name", "quantity", "unit_price", "line_total")
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        # Every line item repeats its product's id and name; share one string.
+        if isinstance(self.product_id, str):
+            self.product_id = sys.intern(self.product_id)
+        if isinstance(self.product_name, str):
+            self.product_name = sys.intern(self.product_name)
+
+
+class Sale(Record):
+    __slots__ = (
+        "id",
+        "customer_id",
+        "customer_name",
+        "items",
+        "total_quantity",
+        "total_amount",
+        "timestamp",
+    )
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        self.items = [
+            item if isinstance(item, LineItem) else LineItem.from_dict(item)
+            for item in self.items or ()
+        ]
+        if isinstance(self.customer_id, str):
+            self.customer_id = sys.intern(self.customer_id)
+        if isinstance(self.customer_name, str):
+            self.customer_name = sys.intern(self.customer_name)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["items"] = [item.to_dict() for item in self.items]
+        return data
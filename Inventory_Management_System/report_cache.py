@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+class ReportCache:
+    """
+    Bounded cache of report results, least recently used evicted first.
+
+    Each entry remembers the versions of the data it was computed from
+    (Inventory.version, SalesManager.version); a lookup with different
+    versions is a miss and the result is computed again, so an entry is
+    reused exactly as long as none of its sources changed. Versions only
+    count changes made through this process's managers.
+
+    Cached results are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        # key -> (versions, result), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0       # misses that replaced an out-of-date entry
+        self.evictions = 0
+
+    def get(self, key, versions, compute):
+        """
+        The cached result for `key` if it was computed at `versions`,
+        otherwise compute() (called without holding the lock), cached.
+
+        Read the versions before computing, so a change made meanwhile
+        leaves an entry that the next lookup sees as out of date.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.count("reports.cache.hits")
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self.stale += 1
+        metrics.count("reports.cache.misses")
+
+        result = compute()
+        with self._lock:
+            self._entries[key] = (versions, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        """Drop every entry (the statistics are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """{"entries", "max_entries", "hits", "misses", "stale", "evictions", "hit_rate"}."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -1,151 +1,422 @@
-from datetime import datetime, date
-from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+import metrics
+from output import paginate, table_lines, write_lines
+from report_cache import ReportCache
+
+PERIODS = ("all", "today", "week", "month", "year")
+
+# Report columns: (row key, title, format spec), shared by the terminal
+# tables and the CSV/JSON exports.
+INVENTORY_COLUMNS = (
+    ("id", "ID", ""),
+    ("name", "Name", ""),
+    ("category", "Category", ""),
+    ("quantity", "Qty", ""),
+    ("buying_price", "Buy", ""),
+    ("selling_price", "Sell", ""),
+    ("stock_value_buy", "Stock Value (Buy)", ".2f"),
+    ("stock_value_sell", "Stock Value (Sell)", ".2f"),
+)
+LOW_STOCK_COLUMNS = (
+    ("id", "ID", ""),
+    ("name", "Name", ""),
+    ("category", "Category", ""),
+    ("quantity", "Qty", ""),
+)
+CATEGORY_COLUMNS = (
+    ("category", "Category", ""),
+    ("products", "Products", ""),
+    ("quantity", "Qty", ""),
+    ("buying", "Stock Value (Buy)", ".2f"),
+    ("selling", "Stock Value (Sell)", ".2f"),
+)
+SALE_COLUMNS = (
+    ("id", "ID", ""),
+    ("timestamp", "Time", ""),
+    ("customer_name", "Customer", ""),
+    ("total_quantity", "Items", ""),
+    ("total_amount", "Amount", ".2f"),
+)
+SUMMARY_COLUMNS = (
+    ("period", "Period", ""),
+    ("orders", "Orders", ""),
+    ("quantity", "Items", ""),
+    ("revenue", "Revenue", ".2f"),
+)
+TOP_PRODUCT_COLUMNS = (
+    ("product_id", "Product ID", ""),
+    ("product_name", "Name", ""),
+    ("quantity", "Qty Sold", ""),
+    ("revenue", "Revenue", ".2f"),
+)
+CUSTOMER_COLUMNS = (
+    ("customer_name", "Customer", ""),
+    ("orders", "Orders", ""),
+    ("quantity", "Items", ""),
+    ("revenue", "Revenue", ".2f"),
+)
+
+
+def period_range(period, now=None):
+    """
+    Return the (start, end) datetimes of a named period, end exclusive.
+
+    "week", "month" and "year" are calendar periods containing `now`
+    (weeks start on Monday). "all" and unknown periods give (None, None).
+    """
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date(), time.min)
+    if period == "today":
+        return midnight, midnight + timedelta(days=1)
+    if period == "week":
+        start = midnight - timedelta(days=midnight.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = midnight.replace(day=1)
+        if start.month == 12:
+            return start, start.replace(year=start.year + 1, month=1)
+        return start, start.replace(month=start.month + 1)
+    if period == "year":
+        start = midnight.replace(month=1, day=1)
+        return start, start.replace(year=start.year + 1)
+    return None, None
+
+
+def _is_midnight(value):
+    return value is not None and value.time() == time.min
 
 
 class ReportManager:
     """
     Generates and prints various reports based on inventory and sales.
+
+    The print_* methods format for the terminal, writing their lines in
+    batches (to `out`, default stdout; long listings can be paged and take
+    limit/offset). The methods without the prefix return the same report as
+    plain data (e.g. for the HTTP API or CSV/JSON files); the *_rows methods
+    are generators, so a large listing is never built in memory.
+
+    Report results (not the streamed listings) are kept in a ReportCache
+    keyed by report, period range and parameters, and computed again only
+    once the inventory or sales they come from have changed. Results hold
+    copies of the product and totals rows, which later changes update in
+    place, so a result never changes after it is returned.
     """
 
-    def __init__(self, inventory, sales_manager):
+    def __init__(self, inventory, sales_manager, cache_size=128):
+        """cache_size: reports to keep (least recently used dropped first); 0 for no cache."""
         self.inventory = inventory
         self.sales_manager = sales_manager
+        self.cache = ReportCache(cache_size) if cache_size else None
 
-    def print_current_inventory(self):
-        products = self.inventory.get_all_products()
-        if not products:
-            print("No products in inventory.")
-            return
+    def _cached(self, key, sources, compute):
+        """compute(), or its cached result if none of the `sources` managers changed since."""
+        if self.cache is None:
+            return compute()
+        return self.cache.get(key, tuple(source.version for source in sources), compute)
 
-        print("\n=== Current Inventory ===")
-        print("ID | Name | Category | Qty | Buy | Sell | Stock Value (Buy) | Stock Value (Sell)")
-        print("-" * 90)
+    @metrics.timed("reports.inventory_value")
+    def inventory_value(self):
+        """
+        Total stock value: {"products", "quantity", "buying", "selling"}.
 
-        total_buy_value = 0.0
-        total_sell_value = 0.0
+        Computed on the inventory's NumPy columns when available.
+        """
+        return self._cached(("inventory_value",), (self.inventory,), self._inventory_value)
 
+    def _inventory_value(self):
+        columns = self.inventory.columns()
+        if columns is not None:
+            return columns.totals()
+        products = self.inventory.get_all_products()
+        quantity = 0
+        buying = 0.0
+        selling = 0.0
         for p in products:
             qty = p["quantity"]
-            buy_val = qty * p["buying_price"]
-            sell_val = qty * p["selling_price"]
-            total_buy_value += buy_val
-            total_sell_value += sell_val
-
-            print(
-                f"{p['id']} | {p['name']} | {p['category']} | {qty} | "
-                f"{p['buying_price']} | {p['selling_price']} | "
-                f"{buy_val:.2f} | {sell_val:.2f}"
-            )
+            quantity += qty
+            buying += qty * p["buying_price"]
+            selling += qty * p["selling_price"]
+        return {"products": len(products), "quantity": quantity, "buying": buying, "selling": selling}
 
-        print("-" * 90)
-        print(f"Total stock value (buying): {total_buy_value:.2f}")
-        print(f"Total stock value (selling): {total_sell_value:.2f}")
+    @metrics.timed("reports.inventory_value_by_category")
+    def inventory_value_by_category(self):
+        """Stock value per category: rows of {"category", "products", "quantity", "buying", "selling"}."""
+        return self._cached(
+            ("inventory_value_by_category",), (self.inventory,), self._inventory_value_by_category
+        )
 
-    def print_low_stock(self, threshold):
-        products = self.inventory.get_all_products()
-        low_stock_items = [p for p in products if p["quantity"] <= threshold]
+    def _inventory_value_by_category(self):
+        columns = self.inventory.columns()
+        if columns is not None:
+            return columns.category_totals()
+        by_category = {}
+        for p in self.inventory.get_all_products():
+            totals = by_category.get(p["category"])
+            if totals is None:
+                totals = by_category[p["category"]] = {
+                    "category": p["category"],
+                    "products": 0,
+                    "quantity": 0,
+                    "buying": 0.0,
+                    "selling": 0.0,
+                }
+            qty = p["quantity"]
+            totals["products"] += 1
+            totals["quantity"] += qty
+            totals["buying"] += qty * p["buying_price"]
+            totals["selling"] += qty * p["selling_price"]
+        return list(by_category.values())
 
-        print(f"\n=== Low Stock (<= {threshold}) ===")
-        if not low_stock_items:
-            print("No low-stock items.")
+    def low_stock_rows(self, threshold):
+        """Yield the products with quantity <= threshold."""
+        columns = self.inventory.columns()
+        if columns is None:
+            for p in self.inventory.get_all_products():
+                if p["quantity"] <= threshold:
+                    yield p
             return
+        for product_id in columns.ids_at_or_below(threshold):
+            product = self.inventory.get_product_by_id(product_id)
+            # A product deleted since the columns were read is skipped.
+            if product is not None:
+                yield product
 
-        print("ID | Name | Category | Qty")
-        print("-" * 40)
-        for p in low_stock_items:
-            print(f"{p['id']} | {p['name']} | {p['category']} | {p['quantity']}")
-
-    def _filter_sales_by_period(self, period):
-        sales = self.sales_manager.get_all_sales()
-        if period == "today":
-            today_str = date.today().isoformat()
-            filtered = []
-            for s in sales:
-                try:
-                    ts = datetime.fromisoformat(s["timestamp"])
-                    if ts.date().isoformat() == today_str:
-                        filtered.append(s)
-                except ValueError:
-                    continue
-            return filtered
-        return sales
-
-    def print_sales_summary(self, period="all"):
-        sales = self._filter_sales_by_period(period)
-        if not sales:
-            print("\nNo sales for the selected period.")
+    @metrics.timed("reports.low_stock")
+    def low_stock(self, threshold):
+        """Products with quantity <= threshold."""
+        return self._cached(
+            ("low_stock", threshold),
+            (self.inventory,),
+            lambda: [dict(product) for product in self.low_stock_rows(threshold)],
+        )
+
+    def inventory_rows(self):
+        """Yield each product with its stock value (INVENTORY_COLUMNS)."""
+        for p in self.inventory.get_all_products():
+            qty = p["quantity"]
+            yield {
+                "id": p["id"],
+                "name": p["name"],
+                "category": p["category"],
+                "quantity": qty,
+                "buying_price": p["buying_price"],
+                "selling_price": p["selling_price"],
+                "stock_value_buy": qty * p["buying_price"],
+                "stock_value_sell": qty * p["selling_price"],
+            }
+
+    @metrics.timed("reports.print_current_inventory")
+    def print_current_inventory(self, limit=None, offset=0, out=None, page_size=None):
+        if not self.inventory.products:
+            print("No products in inventory.", file=out)
             return
 
-        print(f"\n=== Sales Summary ({period}) ===")
-        total_revenue = sum(s["total_amount"] for s in sales)
-        total_items = sum(s["total_quantity"] for s in sales)
-
-        print(f"Total sales (orders): {len(sales)}")
-        print(f"Total items sold: {total_items}")
-        print(f"Total revenue: {total_revenue:.2f}")
-
-        print("\nRecent sales (up to 5):")
-        print("ID | Time | Customer | Items | Amount")
-        print("-" * 70)
-        for s in sales[-5:]:
-            print(
-                f"{s['id']} | {s['timestamp']} | {s['customer_name']} | "
-                f"{s['total_quantity']} | {s['total_amount']:.2f}"
+        def lines():
+            yield "\n=== Current Inventory ==="
+            rows = paginate(self.inventory_rows(), offset, limit)
+            yield from table_lines(rows, INVENTORY_COLUMNS, 90)
+            totals = self.inventory_value()
+            yield "-" * 90
+            yield f"Total stock value (buying): {totals['buying']:.2f}"
+            yield f"Total stock value (selling): {totals['selling']:.2f}"
+
+        write_lines(lines(), out, page_size)
+
+    @metrics.timed("reports.print_stock_by_category")
+    def print_stock_by_category(self, out=None):
+        rows = self.inventory_value_by_category()
+        if not rows:
+            print("No products in inventory.", file=out)
+            return
+
+        write_lines(
+            chain(["\n=== Stock Value by Category ==="], table_lines(rows, CATEGORY_COLUMNS, 70)),
+            out,
+        )
+
+    @metrics.timed("reports.print_low_stock")
+    def print_low_stock(self, threshold, limit=None, offset=0, out=None, page_size=None):
+        rows = paginate(self.low_stock_rows(threshold), offset, limit)
+        first = next(rows, None)
+
+        print(f"\n=== Low Stock (<= {threshold}) ===", file=out)
+        if first is None:
+            print("No low-stock items.", file=out)
+            return
+
+        write_lines(table_lines(chain([first], rows), LOW_STOCK_COLUMNS, 40), out, page_size)
+
+    def _resolve_period(self, period, start, end):
+        """Return (label, start, end) for a named period or a custom range."""
+        if start is not None or end is not None:
+            label = (
+                f"{f'{start:%Y-%m-%d %H:%M}' if start else 'beginning'} to "
+                f"{f'{end:%Y-%m-%d %H:%M}' if end else 'now'}"
             )
+            return label, start, end
+        start, end = period_range(period)
+        return period, start, end
+
+    def _totals_for_range(self, start, end):
+        aggregates = self.sales_manager.aggregates
+        if start is None and end is None:
+            return aggregates.total
+        if _is_midnight(start) and _is_midnight(end):
+            # Whole days: add up the per-day totals instead of visiting sales.
+            totals = {"orders": 0, "quantity": 0, "revenue": 0.0}
+            day = start.date()
+            while day < end.date():
+                row = aggregates.by_day.get(day.isoformat())
+                if row:
+                    for field in totals:
+                        totals[field] += row[field]
+                day += timedelta(days=1)
+            return totals
+        return self.sales_manager.get_aggregates_between(start, end, kinds=()).total
+
+    @metrics.timed("reports.sales_summary")
+    def sales_summary(self, period="all", start=None, end=None, recent=5):
+        """
+        Totals and the last `recent` sales of a period.
+
+        Returns {"period", "orders", "quantity", "revenue", "recent_sales"}.
+        """
+        period, start, end = self._resolve_period(period, start, end)
+        return self._cached(
+            ("sales_summary", period, start, end, recent),
+            (self.sales_manager,),
+            lambda: self._sales_summary(period, start, end, recent),
+        )
 
-    def print_top_selling_products(self, period="all", top_n=5):
-        sales = self._filter_sales_by_period(period)
-        print(f"\n=== Top Selling Products ({period}) ===")
-        if not sales:
-            print("No sales for the selected period.")
+    def _sales_summary(self, period, start, end, recent):
+        summary = {"period": period}
+        summary.update(self._totals_for_range(start, end))
+        summary["recent_sales"] = (
+            self.sales_manager.get_recent_sales(recent, start, end) if summary["orders"] else []
+        )
+        return summary
+
+    @metrics.timed("reports.print_sales_summary")
+    def print_sales_summary(self, period="all", start=None, end=None, out=None):
+        """
+        period: "all", "today", "week", "month" or "year".
+        start, end: optional datetimes for a custom [start, end) range instead.
+        """
+        summary = self.sales_summary(period, start, end)
+        if not summary["orders"]:
+            print("\nNo sales for the selected period.", file=out)
+            return
+
+        lines = [
+            f"\n=== Sales Summary ({summary['period']}) ===",
+            f"Total sales (orders): {summary['orders']}",
+            f"Total items sold: {summary['quantity']}",
+            f"Total revenue: {summary['revenue']:.2f}",
+            "\nRecent sales (up to 5):",
+        ]
+        lines.extend(table_lines(summary["recent_sales"], SALE_COLUMNS, 70))
+        write_lines(lines, out)
+
+    def sales_rows(self, period="all", start=None, end=None):
+        """Yield every sale of a period (SALE_COLUMNS), oldest first."""
+        _, start, end = self._resolve_period(period, start, end)
+        for chunk in self.sales_manager.iter_sales_between(start, end):
+            yield from chunk
+
+    @metrics.timed("reports.print_sales")
+    def print_sales(
+        self, period="all", start=None, end=None, limit=None, offset=0, out=None, page_size=None
+    ):
+        """List the sales of a period, one line each."""
+        label = self._resolve_period(period, start, end)[0]
+        rows = paginate(self.sales_rows(period, start, end), offset, limit)
+        first = next(rows, None)
+
+        print(f"\n=== Sales ({label}) ===", file=out)
+        if first is None:
+            print("No sales for the selected period.", file=out)
             return
 
-        product_totals = defaultdict(int)
-        revenue_totals = defaultdict(float)
-
-        for s in sales:
-            for item in s["items"]:
-                pid = item["product_id"]
-                pname = item["product_name"]
-                key = (pid, pname)
-                product_totals[key] += item["quantity"]
-                revenue_totals[key] += item["line_total"]
-
-        # Sort by total quantity sold
-        ranked = sorted(
-            product_totals.items(),
-            key=lambda kv: kv[1],
-            reverse=True,
+        write_lines(table_lines(chain([first], rows), SALE_COLUMNS, 70), out, page_size)
+
+    @metrics.timed("reports.top_selling_products")
+    def top_selling_products(
+        self,
+        period="all",
+        top_n=5,
+        start=None,
+        end=None,
+        rank_by="quantity",
+        category=None,
+    ):
+        """Returns {"period", "products": product rows, best first}."""
+        period, start, end = self._resolve_period(period, start, end)
+        # The category filter looks at the products' current categories.
+        sources = (self.sales_manager, self.inventory) if category else (self.sales_manager,)
+        return self._cached(
+            ("top_selling_products", period, start, end, top_n, rank_by, category),
+            sources,
+            lambda: {
+                "period": period,
+                "products": [
+                    dict(row)
+                    for row in self.sales_manager.get_top_products(
+                        top_n, rank_by, start, end, category
+                    )
+                ],
+            },
         )
 
-        print("Product ID | Name | Qty Sold | Revenue")
-        print("-" * 60)
-        for (pid, pname), qty in ranked[:top_n]:
-            rev = revenue_totals[(pid, pname)]
-            print(f"{pid} | {pname} | {qty} | {rev:.2f}")
-
-    def print_sales_by_customer(self, period="all"):
-        sales = self._filter_sales_by_period(period)
-        print(f"\n=== Sales by Customer ({period}) ===")
-        if not sales:
-            print("No sales for the selected period.")
+    @metrics.timed("reports.print_top_selling_products")
+    def print_top_selling_products(
+        self,
+        period="all",
+        top_n=5,
+        start=None,
+        end=None,
+        rank_by="quantity",
+        category=None,
+        out=None,
+    ):
+        """
+        rank_by: "quantity" or "revenue".
+        category: only rank products currently in this category.
+        """
+        report = self.top_selling_products(period, top_n, start, end, rank_by, category)
+        ranked = report["products"]
+        print(f"\n=== Top Selling Products ({report['period']}) ===", file=out)
+        if not ranked:
+            print("No sales for the selected period.", file=out)
             return
 
-        customer_revenue = defaultdict(float)
-        customer_items = defaultdict(int)
+        write_lines(table_lines(ranked, TOP_PRODUCT_COLUMNS, 60), out)
+
+    @metrics.timed("reports.sales_by_customer")
+    def sales_by_customer(self, period="all", start=None, end=None):
+        """Returns {"period", "customers": customer rows}."""
+        period, start, end = self._resolve_period(period, start, end)
+        return self._cached(
+            ("sales_by_customer", period, start, end),
+            (self.sales_manager,),
+            lambda: self._sales_by_customer(period, start, end),
+        )
 
-        for s in sales:
-            cname = s["customer_name"]
-            customer_revenue[cname] += s["total_amount"]
-            customer_items[cname] += s["total_quantity"]
+    def _sales_by_customer(self, period, start, end):
+        aggregates = self.sales_manager.get_aggregates_between(start, end, kinds=("customer",))
+        return {
+            "period": period,
+            "customers": [dict(row) for row in aggregates.by_customer.values()],
+        }
 
-        print("Customer | Orders | Items | Revenue")
-        print("-" * 60)
-        counts = defaultdict(int)
-        for s in sales:
-            counts[s["customer_name"]] += 1
+    @metrics.timed("reports.print_sales_by_customer")
+    def print_sales_by_customer(self, period="all", start=None, end=None, out=None):
+        report = self.sales_by_customer(period, start, end)
+        print(f"\n=== Sales by Customer ({report['period']}) ===", file=out)
+        if not report["customers"]:
+            print("No sales for the selected period.", file=out)
+            return
 
-        for cname, rev in customer_revenue.items():
-            print(
-                f"{cname} | {counts[cname]} | {customer_items[cname]} | {rev:.2f}"
-            )
+        write_lines(table_lines(report["customers"], CUSTOMER_COLUMNS, 60), out)
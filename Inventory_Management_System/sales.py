@@ -1,83 +1,436 @@
+import threading
+from contextlib import nullcontext
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 
+import metrics
+from aggregates import SalesAggregates, sale_time
+from ids import Sequence, last_sale_number
+from parallel import aggregate_partitions
+from records import LineItem, Sale
+from storage import StorageError
+
 
 class SalesManager:
     """
     Handles recording of sales orders and storage of sales data.
     Each sale can contain multiple line items and an optional customer.
+
+    Safe to share between threads: open sales are built independently, and
+    finalize_sale() records one sale at a time.
     """
 
-    def __init__(self, inventory, storage, customer_manager):
+    def __init__(
+        self,
+        inventory,
+        storage,
+        customer_manager,
+        aggregate_storage=None,
+        sale_ids=None,
+        processes=1,
+    ):
         """
         inventory: Inventory instance.
         storage: JSONStorage for sales records.
         customer_manager: CustomerManager instance.
+        aggregate_storage: optional JSONStorage for the running sales totals.
+            Without it the totals are rebuilt from the sales on every start.
+        sale_ids: optional Sequence handing out sale numbers (e.g. a
+            FileSequence shared with other processes). By default numbers
+            continue from the highest id in the history.
+        processes: worker processes for adding up the history when it is not
+            loaded and the storage is partitioned (parallel.aggregate_partitions);
+            1 adds it up in this process.
+
+        Nothing is read from storage here: the sales history and the totals
+        load on first use (or call load_in_background()).
         """
         self.inventory = inventory
         self.storage = storage
         self.customer_manager = customer_manager
-        self.sales = self.storage.load()
+        self.aggregate_storage = aggregate_storage
+        self.processes = processes
+        self._sales = None
+        self._aggregates = None
+        self._load_lock = threading.RLock()
+        self.sale_ids = sale_ids or Sequence(self._last_sale_number)
+        # Held while a sale is recorded.
+        self._record_lock = threading.Lock()
+        # Sorted sale times and the matching positions in self.sales, so a
+        # time range is found with a binary search.
+        self._sale_times = []
+        self._sale_positions = []
+        # Bumped after every change to the recorded sales or their totals,
+        # so cached reports (ReportCache) know when they are out of date.
+        self.version = 0
+        self._version_lock = threading.Lock()
+
+    @property
+    def sales(self):
+        """The full sales history, loaded from storage on first access."""
+        if self._sales is None:
+            with self._load_lock:
+                if self._sales is None:
+                    self._load_sales()
+        return self._sales
+
+    @property
+    def aggregates(self):
+        """Running sales totals, loaded on first access."""
+        if self._aggregates is None:
+            with self._load_lock:
+                if self._aggregates is None:
+                    self._aggregates = self._load_aggregates()
+        return self._aggregates
+
+    def load_in_background(self):
+        """
+        Start loading the totals and the sales history on a daemon thread.
+
+        The history is skipped when the storage answers date-range queries
+        itself (SQLite, partitioned files); it then loads only if something
+        needs all of it.
+        """
+        if hasattr(self.storage, "aggregates_between") or hasattr(
+            self.storage, "iter_chunks_between"
+        ):
+            target = lambda: self.aggregates
+        else:
+            target = lambda: (self.aggregates, self.sales)
+        thread = threading.Thread(
+            target=target,
+            name="sales-loader",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _load_sales(self):
+        if hasattr(self.storage, "iter_chunks"):
+            # Build the list a chunk at a time instead of parsing the whole file first.
+            sales = []
+            for chunk in self.storage.iter_chunks():
+                sales.extend(Sale.from_dict(s) for s in chunk)
+        else:
+            sales = [Sale.from_dict(s) for s in self.storage.load()]
+
+        for position, sale in enumerate(sales):
+            self._index_sale_time(sale, position)
+        # Publish the list last, so other threads never see a half-built index.
+        self._sales = sales
+
+        if self._aggregates is not None and self._aggregates.total["orders"] != len(sales):
+            # Saved totals are out of date (e.g. a crash between the two saves).
+            self._aggregates = self._rebuild_aggregates()
+            self._bump_version()
+
+    def _load_aggregates(self):
+        if self.aggregate_storage is None:
+            return self._add_up()
+
+        rows = self.aggregate_storage.load()
+        if not rows:
+            return self._rebuild_aggregates()
+        aggregates = SalesAggregates(rows)
+        if self._sales is not None:
+            recorded = len(self._sales)
+        elif hasattr(self.storage, "count"):
+            # Storages answering range queries may never load the history;
+            # they count it without parsing it.
+            recorded = self.storage.count()
+        else:
+            # Checked against the history once it is loaded.
+            return aggregates
+        if aggregates.total["orders"] != recorded:
+            # Saved totals are out of date (e.g. a crash between the two saves).
+            return self._rebuild_aggregates()
+        return aggregates
+
+    def _rebuild_aggregates(self):
+        aggregates = self._add_up()
+        if self.aggregate_storage is not None:
+            self.aggregate_storage.save(aggregates.rows())
+        return aggregates
+
+    def _add_up(self, start=None, end=None, kinds=("day", "customer", "product")):
+        """
+        SalesAggregates computed from the sales with start <= timestamp < end,
+        in worker processes when the history is not loaded and spans several
+        partitions, otherwise streamed through this process.
+        """
+        if (
+            self.processes > 1
+            and self._sales is None
+            and hasattr(self.storage, "partitions_between")
+            and len(self.storage.partitions_between(start, end)) > 1
+        ):
+            return aggregate_partitions(self.storage, start, end, kinds, self.processes)
+        if start is None and end is None:
+            return SalesAggregates.from_sales(self._each_sale())
+        return SalesAggregates.from_sales(
+            sale for chunk in self.iter_sales_between(start, end) for sale in chunk
+        )
+
+    def _bump_version(self):
+        with self._version_lock:
+            self.version += 1
+
+    def _index_sale_time(self, sale, position):
+        ts = sale_time(sale)
+        if ts is None:
+            return
+        if not self._sale_times or self._sale_times[-1] <= ts:
+            self._sale_times.append(ts)
+            self._sale_positions.append(position)
+        else:
+            # Clock went backwards (or history was merged): keep the index sorted.
+            i = bisect_right(self._sale_times, ts)
+            self._sale_times.insert(i, ts)
+            self._sale_positions.insert(i, position)
+
+    def _last_sale_number(self):
+        # Streams the history when it is not loaded, instead of loading it.
+        return last_sale_number(self.iter_sales())
+
+    def _each_sale(self):
+        for chunk in self.iter_sales():
+            yield from chunk
 
     def _save(self):
         self.storage.save(self.sales)
 
+    def _save_aggregate_rows(self, rows):
+        if self.aggregate_storage is None:
+            return
+        if hasattr(self.aggregate_storage, "upsert"):
+            for row in rows:
+                self.aggregate_storage.upsert(row)
+        else:
+            self.aggregate_storage.save(self.aggregates.rows())
+
+    def _transaction(self):
+        # Storages that can commit several writes atomically (SQLite) provide
+        # transaction(), which raises StorageError when it rolls back; for
+        # file storages the writes simply follow each other.
+        transaction = getattr(self.storage, "transaction", None)
+        return transaction() if transaction else nullcontext()
+
+    def _save_new_sale(self, sale):
+        # Storages with record-level writes only need the new sale.
+        if hasattr(self.storage, "append"):
+            self.storage.append(sale)
+        else:
+            self._save()
+
     def create_sale(self, customer_name=None, phone=None, email=None):
         """
         Start a new sale with a customer (optional).
-        Returns a sale dict that the caller can add items to.
+        Returns a Sale that the caller can add items to.
         """
         customer = None
         if customer_name:
             customer = self.customer_manager.find_or_create_customer(
                 customer_name, phone, email
             )
-        sale = {
-            "id": f"SALE-{len(self.sales)+1}",
-            "customer_id": customer["id"] if customer else None,
-            "customer_name": customer["name"] if customer else "Walk-in",
-            "items": [],
-            "total_quantity": 0,
-            "total_amount": 0.0,
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-        }
+        sale = Sale(
+            id=f"SALE-{self.sale_ids.next()}",
+            customer_id=customer["id"] if customer else None,
+            customer_name=customer["name"] if customer else "Walk-in",
+            items=[],
+            total_quantity=0,
+            total_amount=0.0,
+            timestamp=datetime.now().isoformat(timespec="seconds"),
+        )
         return sale
 
     def add_item_to_sale(self, sale, product_id, quantity):
         """
         Add one line item to a sale (does not save yet).
 
+        The stock is only reserved (in memory); finalize_sale() takes it out
+        of the inventory and cancel_sale() gives it back.
+
         Returns:
             (success: bool, message: str)
         """
-        success, msg = self.inventory.reduce_stock(product_id, quantity)
+        success, msg = self.inventory.reserve_stock(product_id, quantity)
         if not success:
             return False, msg
 
         product = self.inventory.get_product_by_id(product_id)
         line_total = product["selling_price"] * quantity
 
-        item = {
-            "product_id": product_id,
-            "product_name": product["name"],
-            "quantity": quantity,
-            "unit_price": product["selling_price"],
-            "line_total": line_total,
-        }
+        item = LineItem(
+            product_id=product_id,
+            product_name=product["name"],
+            quantity=quantity,
+            unit_price=product["selling_price"],
+            line_total=line_total,
+        )
         sale["items"].append(item)
         sale["total_quantity"] += quantity
         sale["total_amount"] += line_total
         return True, f"Added {quantity} x {product['name']} (line total {line_total:.2f})"
 
+    @metrics.timed("sales.finalize")
     def finalize_sale(self, sale):
         """
         Save a completed sale and return a confirmation message.
+
+        The stock reserved for its items is taken out of the inventory, and
+        it and the sale are written in one round: each changed product once,
+        then the sale. With a storage that supports transactions they are
+        committed together; if that fails, nothing is changed and the sale
+        stays open (its stock still reserved), to be finalized again or
+        cancelled.
         """
         if not sale["items"]:
             return False, "Cannot finalize a sale with no items."
 
-        self.sales.append(sale)
-        self._save()
+        quantities = {}
+        for item in sale["items"]:
+            quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+
+        with self._record_lock:
+            # Load the totals before the history grows, so they are checked
+            # against the history without this sale.
+            aggregates = self.aggregates
+            # Held so a history being loaded meanwhile either includes the
+            # sale from storage or is loaded before it is added here.
+            with self._load_lock:
+                # A history that is not loaded yet picks the sale up from
+                # storage when it is; only a full rewrite needs it now.
+                in_memory = self._sales is not None or not hasattr(self.storage, "append")
+                if in_memory:
+                    self.sales.append(sale)
+                try:
+                    with self._transaction():
+                        self.inventory.commit_stock(quantities)
+                        self._save_new_sale(sale)
+                        self._save_aggregate_rows(aggregates.record(sale))
+                except StorageError as e:
+                    # Nothing reached the disk: undo the changes in memory.
+                    # The totals may include the sale, so they are reloaded.
+                    if in_memory:
+                        self.sales.pop()
+                    self.inventory.restore_stock(quantities)
+                    self._aggregates = None
+                    self._bump_version()
+                    return False, f"Sale {sale['id']} was not recorded: {e}"
+                if in_memory:
+                    self._index_sale_time(sale, len(self.sales) - 1)
+            self._bump_version()
         return True, f"Sale {sale['id']} recorded. Total: {sale['total_amount']:.2f}"
 
+    def cancel_sale(self, sale):
+        """
+        Abandon an open sale, returning its reserved stock to the inventory.
+
+        Returns:
+            (success: bool, message: str)
+        """
+        for item in sale["items"]:
+            self.inventory.release_stock(item["product_id"], item["quantity"])
+        sale["items"] = []
+        sale["total_quantity"] = 0
+        sale["total_amount"] = 0.0
+        return True, f"Sale {sale['id']} cancelled."
+
     def get_all_sales(self):
         return list(self.sales)
+
+    def iter_sales(self, chunk_size=1000):
+        """
+        Yield recorded sales in chunks (lists), oldest first.
+
+        Before the history is loaded this streams the storage, so callers
+        never need the whole history in memory.
+        """
+        if self._sales is None and hasattr(self.storage, "iter_chunks"):
+            yield from self.storage.iter_chunks(chunk_size)
+            return
+        for i in range(0, len(self.sales), chunk_size):
+            yield self.sales[i:i + chunk_size]
+
+    def _time_slice(self, start, end):
+        lo = 0 if start is None else bisect_left(self._sale_times, start)
+        hi = len(self._sale_times) if end is None else bisect_left(self._sale_times, end)
+        return lo, max(lo, hi)
+
+    def get_sales_between(self, start=None, end=None):
+        """
+        Sales with start <= timestamp < end, oldest first.
+
+        start, end: naive datetimes; None leaves that side open. With both
+        open, every sale is returned, including ones with unreadable timestamps.
+        """
+        if start is None and end is None:
+            return self.get_all_sales()
+        sales = self.sales
+        lo, hi = self._time_slice(start, end)
+        return [sales[i] for i in self._sale_positions[lo:hi]]
+
+    def iter_sales_between(self, start=None, end=None, chunk_size=1000):
+        """
+        Yield the sales with start <= timestamp < end in chunks, oldest first.
+
+        Streams storages that read ranges (partitioned files) while the
+        history is not loaded, like iter_sales().
+        """
+        if start is None and end is None:
+            yield from self.iter_sales(chunk_size)
+            return
+        if self._sales is None and hasattr(self.storage, "iter_chunks_between"):
+            yield from self.storage.iter_chunks_between(start, end, chunk_size)
+            return
+        sales = self.sales
+        lo, hi = self._time_slice(start, end)
+        for i in range(lo, hi, chunk_size):
+            yield [sales[j] for j in self._sale_positions[i:min(i + chunk_size, hi)]]
+
+    def get_recent_sales(self, count, start=None, end=None):
+        """The last `count` sales with start <= timestamp < end, oldest first."""
+        if self._sales is None and hasattr(self.storage, "recent_sales"):
+            return [Sale.from_dict(s) for s in self.storage.recent_sales(count, start, end)]
+        sales = self.sales
+        if start is None and end is None:
+            return sales[-count:] if count else []
+        lo, hi = self._time_slice(start, end)
+        return [sales[i] for i in self._sale_positions[max(lo, hi - count):hi]]
+
+    def get_aggregates_between(self, start=None, end=None, kinds=("day", "customer", "product")):
+        """
+        Sales totals for start <= timestamp < end (SalesAggregates).
+
+        Storages that can aggregate (SQLite) compute them in a query, limited
+        to the breakdowns named in `kinds`; otherwise the sales in the range
+        are added up, streamed from storages that read ranges (partitioned
+        files) while the history is not loaded.
+        """
+        if start is None and end is None:
+            return self.aggregates
+        if hasattr(self.storage, "aggregates_between"):
+            return self.storage.aggregates_between(start, end, kinds)
+        return self._add_up(start, end, kinds)
+
+    def get_top_products(self, top_n, rank_by="quantity", start=None, end=None, category=None):
+        """
+        The best-selling product rows for start <= timestamp < end.
+
+        rank_by: "quantity" or "revenue".
+        category: only products currently in this category.
+        """
+        ranged = start is not None or end is not None
+        if ranged and hasattr(self.storage, "top_products"):
+            return self.storage.top_products(top_n, rank_by, start, end, category)
+
+        keep = None
+        if category:
+            category_lower = category.lower()
+
+            def keep(row):
+                product = self.inventory.get_product_by_id(row["product_id"])
+                return product is not None and product["category"].lower() == category_lower
+
+        aggregates = self.get_aggregates_between(start, end, kinds=("product",))
+        return aggregates.top_products(top_n, rank_by, keep)
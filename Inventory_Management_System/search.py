@@ -0,0 +1,287 @@
+import heapq
+from bisect import bisect_left, insort
+
+
+class SearchIndex:
+    """
+    Inverted index over product name, category and id.
+
+    Every field is lowercased once when a product is indexed. Keywords match
+    anywhere in a field. Keywords of three or more characters are looked up
+    through a trigram index. Shorter ones (a cashier's first keystrokes)
+    find the words of names starting with them in a small prefix index, and
+    the trigrams containing them tell whether, and roughly how often, they
+    occur anywhere else.
+
+    Results are ranked by how the keyword matched:
+        0 exact id, 1 start of name, 2 start of a word in the name,
+        3 elsewhere in the name, 4 category, 5 part of the id.
+    Names starting with the keyword come from a sorted name list, so the
+    common "cashier typed the first letters" case never touches the other
+    matches. With a limit, the remaining candidates are visited in name
+    order and the scan stops as soon as the limit is filled from the best
+    kind, so the same search always returns the same products.
+    """
+
+    GRAM = 3
+
+    def __init__(self, products=()):
+        self._grams = {}     # trigram -> set of product ids
+        self._texts = {}     # product id -> (name, category, id), lowercased
+        self._ids = {}       # lowercased id -> product id
+        self._names = []     # sorted (name, product id)
+        # first 1..GRAM-1 characters of a later word of a name -> sorted (name, product id)
+        self._word_starts = {}
+        # category -> sorted (name, product id)
+        self._categories = {}
+        # trigram of a name (or a whole name shorter than that) -> number of names
+        self._name_grams = {}
+        # ids of products with a field too short for a trigram
+        self._short_fields = set()
+        # short keyword -> (trigrams, _name_grams keys) containing it;
+        # dropped whenever keys come or go
+        self._short_keys = {}
+        for product in products:
+            self._add(product)
+        self._names.sort()
+        for entries in self._word_starts.values():
+            entries.sort()
+        for entries in self._categories.values():
+            entries.sort()
+
+    def _fields(self, product):
+        return (
+            product["name"].lower(),
+            product["category"].lower(),
+            product["id"].lower(),
+        )
+
+    def _keys(self, texts):
+        grams = set()
+        for text in texts:
+            for i in range(len(text) - self.GRAM + 1):
+                grams.add(text[i:i + self.GRAM])
+        return grams
+
+    def _name_keys(self, name):
+        if len(name) < self.GRAM:
+            return {name}
+        return self._keys((name,))
+
+    def _word_prefixes(self, name):
+        prefixes = set()
+        start = name.find(" ") + 1
+        while start:
+            for length in range(1, self.GRAM):
+                if start + length <= len(name):
+                    prefixes.add(name[start:start + length])
+            start = name.find(" ", start) + 1
+        return prefixes
+
+    def _add(self, product, keep_sorted=False):
+        texts = self._fields(product)
+        product_id = product["id"]
+        entry = (texts[0], product_id)
+        self._texts[product_id] = texts
+        self._ids[texts[2]] = product_id
+        self._names.append(entry)
+        lists = [self._categories.setdefault(texts[1], [])]
+        for prefix in self._word_prefixes(texts[0]):
+            lists.append(self._word_starts.setdefault(prefix, []))
+        for entries in lists:
+            if keep_sorted:
+                insort(entries, entry)
+            else:
+                entries.append(entry)
+        for key in self._name_keys(texts[0]):
+            count = self._name_grams.get(key, 0)
+            if not count:
+                self._short_keys.clear()
+            self._name_grams[key] = count + 1
+        if min(len(text) for text in texts) < self.GRAM:
+            self._short_fields.add(product_id)
+        for gram in self._keys(texts):
+            ids = self._grams.get(gram)
+            if ids is None:
+                ids = self._grams[gram] = set()
+                self._short_keys.clear()
+            ids.add(product_id)
+
+    def add(self, product):
+        self._add(product, keep_sorted=True)
+        # _add appended the name; move it into sorted position.
+        insort(self._names, self._names.pop())
+
+    def remove(self, product_id):
+        texts = self._texts.pop(product_id, None)
+        if texts is None:
+            return
+        self._ids.pop(texts[2], None)
+        entry = (texts[0], product_id)
+        _discard_sorted(self._names, entry)
+        lists = [(self._categories, texts[1])]
+        lists.extend((self._word_starts, prefix) for prefix in self._word_prefixes(texts[0]))
+        for index, key in lists:
+            entries = index.get(key)
+            if entries is not None:
+                _discard_sorted(entries, entry)
+                if not entries:
+                    del index[key]
+        for key in self._name_keys(texts[0]):
+            count = self._name_grams.get(key, 0) - 1
+            if count > 0:
+                self._name_grams[key] = count
+            else:
+                self._name_grams.pop(key, None)
+                self._short_keys.clear()
+        self._short_fields.discard(product_id)
+        for gram in self._keys(texts):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._grams[gram]
+                    self._short_keys.clear()
+
+    def update(self, product):
+        self.remove(product["id"])
+        self.add(product)
+
+    def _candidates(self, keyword, ordered):
+        """
+        Ids that may match a keyword of GRAM or more characters; _rank()
+        does the final check. With `ordered`, they come in name order (ties
+        by id).
+        """
+        postings = []
+        for i in range(len(keyword) - self.GRAM + 1):
+            ids = self._grams.get(keyword[i:i + self.GRAM])
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        rest = postings[1:]
+        candidates = [
+            product_id for product_id in postings[0] if all(product_id in ids for ids in rest)
+        ]
+        if ordered:
+            candidates.sort(key=lambda product_id: (self._texts[product_id][0], product_id))
+        return candidates
+
+    def _search_short(self, keyword, limit, exact, found, buckets):
+        """
+        Fill the rank buckets for a keyword shorter than GRAM, each in name
+        order, stopping once `found` (results so far) plus the buckets fill
+        the limit.
+        """
+
+        def take(entries, wanted):
+            # True once the limit is filled.
+            for name, product_id in entries:
+                if product_id == exact or name.startswith(keyword):
+                    continue
+                if self._rank(product_id, keyword) == wanted:
+                    buckets[wanted].append((name, product_id))
+                    if limit is not None and found + sum(map(len, buckets.values())) >= limit:
+                        return True
+            return False
+
+        # Rank 2 comes from the word prefixes.
+        if take(self._word_starts.get(keyword, ()), 2):
+            return
+        keys = self._short_keys.get(keyword)
+        if keys is None:
+            keys = self._short_keys[keyword] = (
+                [gram for gram in self._grams if keyword in gram],
+                [key for key in self._name_grams if keyword in key],
+            )
+        postings = [self._grams[gram] for gram in keys[0]]
+        size = len(self._short_fields) + sum(len(ids) for ids in postings)
+        if size <= len(self._names) // 64:
+            # Few products contain it (often none): sort just those.
+            ids = self._short_fields.union(*postings)
+            entries = sorted((self._texts[product_id][0], product_id) for product_id in ids)
+            passes = ((3, entries), (4, entries), (5, entries))
+        else:
+            # Many do: walk the names for each rank until it fills the limit,
+            # skipping the names when none contains the keyword.
+            categories = [
+                entries for category, entries in self._categories.items() if keyword in category
+            ]
+            passes = (
+                (3, self._names if keys[1] else ()),
+                (4, heapq.merge(*categories)),
+                (5, self._names),
+            )
+        for rank, entries in passes:
+            if take(entries, rank):
+                return
+
+    def _rank(self, product_id, keyword):
+        """Rank for matches that are not a name prefix; None if no match."""
+        name, category, pid = self._texts[product_id]
+        if (" " + keyword) in name:
+            return 2
+        if keyword in name:
+            return 3
+        if keyword in category:
+            return 4
+        if keyword in pid:
+            return 5
+        return None
+
+    def search(self, keyword, limit=None):
+        """
+        Return ids of matching products, best match first.
+
+        Matches of the same kind are ordered by name. An empty keyword
+        matches every product, in insertion order.
+        """
+        keyword = keyword.strip().lower()
+        if not keyword:
+            ids = list(self._texts)
+            return ids if limit is None else ids[:limit]
+
+        results = []
+        exact = self._ids.get(keyword)
+        if exact is not None:
+            results.append(exact)
+
+        i = bisect_left(self._names, (keyword,))
+        while i < len(self._names) and self._names[i][0].startswith(keyword):
+            if limit is not None and len(results) >= limit:
+                return results
+            if self._names[i][1] != exact:
+                results.append(self._names[i][1])
+            i += 1
+
+        buckets = {2: [], 3: [], 4: [], 5: []}
+        if len(keyword) < self.GRAM:
+            self._search_short(keyword, limit, exact, len(results), buckets)
+            candidates = ()
+        else:
+            # With a limit the scan may stop early, so visit the candidates in
+            # name order: the matches kept are then the first ones of their kind.
+            candidates = self._candidates(keyword, ordered=limit is not None)
+        for product_id in candidates:
+            if product_id == exact or self._texts[product_id][0].startswith(keyword):
+                continue
+            rank = self._rank(product_id, keyword)
+            if rank is None:
+                continue
+            buckets[rank].append((self._texts[product_id][0], product_id))
+            if limit is not None and len(results) + len(buckets[2]) >= limit:
+                break
+
+        for rank in sorted(buckets):
+            for _, product_id in sorted(buckets[rank]):
+                if limit is not None and len(results) >= limit:
+                    return results
+                results.append(product_id)
+        return results
+
+
+def _discard_sorted(entries, entry):
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
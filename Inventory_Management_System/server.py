@@ -0,0 +1,476 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+from reports import PERIODS
+from storage import to_json_value
+
+MAX_BODY_SIZE = 1 << 20
+# Open sales untouched for this many seconds are cancelled and their stock released.
+OPEN_SALE_TIMEOUT = 30 * 60
+# Seconds between looks for such sales.
+SWEEP_INTERVAL = 60
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """Raised by a handler to answer with an error status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _int_param(value, name, default=None, minimum=0):
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be a whole number") from None
+    if number < minimum:
+        raise HTTPError(400, f"{name} must be at least {minimum}")
+    return number
+
+
+def _float_param(value, name):
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be a number") from None
+    if number < 0:
+        raise HTTPError(400, f"{name} cannot be negative")
+    return number
+
+
+def _text_param(value, name, allow_blank=False):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise HTTPError(400, f"{name} must be a string")
+    value = value.strip()
+    if not value and not allow_blank:
+        raise HTTPError(400, f"{name} cannot be blank")
+    return value or None
+
+
+def _datetime_param(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a date as YYYY-MM-DD[THH:MM]") from None
+
+
+class InventoryAPI:
+    """
+    JSON request handlers over the managers.
+
+    dispatch() takes a parsed request and returns (status, response bytes).
+    It does blocking work (storage writes, loading the sales history), so
+    InventoryServer calls it on a worker thread; the managers are
+    thread-safe.
+
+    Open sales live in memory until they are finalized or cancelled, like
+    the sale being entered at a terminal. Their stock is reserved meanwhile;
+    a sale left without requests for `open_sale_timeout` seconds (e.g. by a
+    client that went away) is cancelled to give its stock back.
+    """
+
+    def __init__(
+        self,
+        inventory,
+        customer_manager,
+        sales_manager,
+        report_manager,
+        open_sale_timeout=OPEN_SALE_TIMEOUT,
+    ):
+        self.inventory = inventory
+        self.customer_manager = customer_manager
+        self.sales_manager = sales_manager
+        self.report_manager = report_manager
+        self.open_sale_timeout = open_sale_timeout
+        # sale id -> (sale, time.monotonic() of its last request)
+        self._open_sales = {}
+        self._open_sales_lock = threading.Lock()
+        self._next_sweep = 0
+        self.routes = [
+            ("GET", r"/products", self.list_products),
+            ("POST", r"/products", self.add_product),
+            ("GET", r"/products/search", self.search_products),
+            ("GET", r"/products/(?P<product_id>[^/]+)", self.get_product),
+            ("PATCH", r"/products/(?P<product_id>[^/]+)", self.update_product),
+            ("DELETE", r"/products/(?P<product_id>[^/]+)", self.delete_product),
+            ("GET", r"/sales", self.recent_sales),
+            ("POST", r"/sales", self.create_sale),
+            ("GET", r"/sales/(?P<sale_id>[^/]+)", self.get_open_sale),
+            ("POST", r"/sales/(?P<sale_id>[^/]+)/items", self.add_item),
+            ("POST", r"/sales/(?P<sale_id>[^/]+)/finalize", self.finalize_sale),
+            ("POST", r"/sales/(?P<sale_id>[^/]+)/cancel", self.cancel_sale),
+            ("GET", r"/reports/inventory", self.inventory_report),
+            ("GET", r"/reports/categories", self.categories_report),
+            ("GET", r"/reports/low-stock", self.low_stock_report),
+            ("GET", r"/reports/summary", self.summary_report),
+            ("GET", r"/reports/top-products", self.top_products_report),
+            ("GET", r"/reports/customers", self.customers_report),
+            ("GET", r"/metrics", self.metrics_report),
+        ]
+        self.routes = [
+            (method, re.compile(pattern + r"/?"), handler)
+            for method, pattern, handler in self.routes
+        ]
+
+    def dispatch(self, method, target, body):
+        """Handle one request. Returns (status, JSON response as bytes)."""
+        try:
+            self._sweep_open_sales()
+            status, payload = self._route(method, target, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception as e:
+            print(f"Error handling {method} {target}: {e!r}")
+            status, payload = 500, {"error": "internal error"}
+        return status, json.dumps(payload, default=to_json_value).encode("utf-8")
+
+    def _route(self, method, target, body):
+        url = urlsplit(target)
+        path = unquote(url.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                return handler(query=query, body=self._parse_body(body), **match.groupdict())
+        if path_matched:
+            raise HTTPError(405, f"{method} is not allowed on {path}")
+        raise HTTPError(404, f"no such resource: {path}")
+
+    def _parse_body(self, body):
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "request body is not valid JSON") from None
+        if not isinstance(data, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        return data
+
+    def _product(self, product_id):
+        product = self.inventory.get_product_by_id(product_id)
+        if product is None:
+            raise HTTPError(404, f"no product with id {product_id}")
+        return product
+
+    def _open_sale(self, sale_id):
+        with self._open_sales_lock:
+            entry = self._open_sales.get(sale_id)
+            if entry is not None:
+                self._open_sales[sale_id] = (entry[0], time.monotonic())
+        if entry is None:
+            raise HTTPError(404, f"no open sale with id {sale_id}")
+        return entry[0]
+
+    def _take_open_sale(self, sale_id):
+        with self._open_sales_lock:
+            entry = self._open_sales.pop(sale_id, None)
+        if entry is None:
+            raise HTTPError(404, f"no open sale with id {sale_id}")
+        return entry[0]
+
+    def _sweep_open_sales(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        self.expire_open_sales(now)
+
+    def expire_open_sales(self, now=None):
+        """
+        Cancel the open sales idle for longer than open_sale_timeout seconds,
+        releasing their reserved stock. Returns the ids of the cancelled sales.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._open_sales_lock:
+            expired = [
+                sale_id
+                for sale_id, (sale, last_used) in self._open_sales.items()
+                if now - last_used > self.open_sale_timeout
+            ]
+            sales = [self._open_sales.pop(sale_id)[0] for sale_id in expired]
+        for sale in sales:
+            self.sales_manager.cancel_sale(sale)
+        if expired:
+            metrics.count("server.open_sales.expired", len(expired))
+        return expired
+
+    def _product_fields(self, body, required):
+        """
+        The product fields of a request body, validated. With required=False
+        (PATCH) missing fields are None; given ones are checked all the same.
+        """
+        fields = {}
+        for field in ("name", "category"):
+            fields[field] = _text_param(body.get(field), field)
+        for field in ("buying_price", "selling_price"):
+            fields[field] = _float_param(body.get(field), field)
+        fields["quantity"] = _int_param(body.get("quantity"), "quantity", 0 if required else None)
+        if required:
+            for field in ("name", "category", "buying_price", "selling_price"):
+                if fields[field] is None:
+                    raise HTTPError(400, f"{field} is required")
+        return fields
+
+    def _period(self, query):
+        period = query.get("period", "all")
+        if period not in PERIODS:
+            raise HTTPError(400, f"period must be one of {', '.join(PERIODS)}")
+        start = _datetime_param(query.get("start"), "start")
+        end = _datetime_param(query.get("end"), "end")
+        return period, start, end
+
+    # Products
+
+    def list_products(self, query, body):
+        products = self.inventory.get_all_products()
+        offset = _int_param(query.get("offset"), "offset", 0)
+        limit = _int_param(query.get("limit"), "limit")
+        end = None if limit is None else offset + limit
+        return 200, {"total": len(products), "products": products[offset:end]}
+
+    def add_product(self, query, body):
+        return 201, self.inventory.add_product(**self._product_fields(body, required=True))
+
+    def search_products(self, query, body):
+        keyword = query.get("q", "").strip()
+        if not keyword:
+            raise HTTPError(400, "q is required")
+        limit = _int_param(query.get("limit"), "limit", 50, minimum=1)
+        return 200, {"products": self.inventory.search_products(keyword, limit)}
+
+    def get_product(self, query, body, product_id):
+        return 200, self._product(product_id)
+
+    def update_product(self, query, body, product_id):
+        fields = self._product_fields(body, required=False)
+        try:
+            updated = self.inventory.update_product(product_id, **fields)
+        except ValueError as e:
+            raise HTTPError(409, str(e)) from None
+        if not updated:
+            raise HTTPError(404, f"no product with id {product_id}")
+        return 200, self._product(product_id)
+
+    def delete_product(self, query, body, product_id):
+        if not self.inventory.delete_product(product_id):
+            raise HTTPError(404, f"no product with id {product_id}")
+        return 200, {"deleted": product_id}
+
+    # Sales
+
+    def recent_sales(self, query, body):
+        count = _int_param(query.get("count"), "count", 10)
+        return 200, {"sales": self.sales_manager.get_recent_sales(count)}
+
+    def create_sale(self, query, body):
+        sale = self.sales_manager.create_sale(
+            _text_param(body.get("customer_name"), "customer_name", allow_blank=True),
+            _text_param(body.get("phone"), "phone", allow_blank=True),
+            _text_param(body.get("email"), "email", allow_blank=True),
+        )
+        with self._open_sales_lock:
+            self._open_sales[sale["id"]] = (sale, time.monotonic())
+        return 201, sale
+
+    def get_open_sale(self, query, body, sale_id):
+        return 200, self._open_sale(sale_id)
+
+    def add_item(self, query, body, sale_id):
+        sale = self._open_sale(sale_id)
+        product_id = body.get("product_id")
+        if not isinstance(product_id, str):
+            raise HTTPError(400, "product_id is required")
+        quantity = _int_param(body.get("quantity"), "quantity", minimum=1)
+        if quantity is None:
+            raise HTTPError(400, "quantity is required")
+        self._product(product_id)
+        success, message = self.sales_manager.add_item_to_sale(sale, product_id, quantity)
+        if not success:
+            raise HTTPError(409, message)
+        return 200, sale
+
+    def finalize_sale(self, query, body, sale_id):
+        sale = self._take_open_sale(sale_id)
+        success, message = self.sales_manager.finalize_sale(sale)
+        if not success:
+            with self._open_sales_lock:
+                self._open_sales[sale_id] = (sale, time.monotonic())
+            raise HTTPError(409, message)
+        return 200, {"message": message, "sale": sale}
+
+    def cancel_sale(self, query, body, sale_id):
+        sale = self._take_open_sale(sale_id)
+        success, message = self.sales_manager.cancel_sale(sale)
+        return 200, {"message": message}
+
+    # Reports
+
+    def inventory_report(self, query, body):
+        return 200, self.report_manager.inventory_value()
+
+    def categories_report(self, query, body):
+        return 200, {"categories": self.report_manager.inventory_value_by_category()}
+
+    def low_stock_report(self, query, body):
+        threshold = _int_param(query.get("threshold"), "threshold", 5)
+        return 200, {"threshold": threshold, "products": self.report_manager.low_stock(threshold)}
+
+    def summary_report(self, query, body):
+        period, start, end = self._period(query)
+        return 200, self.report_manager.sales_summary(period, start, end)
+
+    def top_products_report(self, query, body):
+        period, start, end = self._period(query)
+        rank_by = query.get("rank_by", "quantity")
+        if rank_by not in ("quantity", "revenue"):
+            raise HTTPError(400, "rank_by must be quantity or revenue")
+        top_n = _int_param(query.get("top_n"), "top_n", 5, minimum=1)
+        return 200, self.report_manager.top_selling_products(
+            period, top_n, start, end, rank_by, query.get("category") or None
+        )
+
+    def customers_report(self, query, body):
+        period, start, end = self._period(query)
+        return 200, self.report_manager.sales_by_customer(period, start, end)
+
+    def metrics_report(self, query, body):
+        """
+        Timings and counters of this process (empty unless IMS_METRICS=1),
+        and the report cache statistics.
+        """
+        cache = self.report_manager.cache
+        report_cache = cache.stats() if cache is not None else None
+        return 200, dict(metrics.snapshot(), enabled=metrics.ENABLED, report_cache=report_cache)
+
+
+class InventoryServer:
+    """
+    Minimal HTTP/1.1 JSON server on asyncio.
+
+    The event loop only reads requests and writes responses; every handler
+    runs in a thread pool, so a slow save never holds up other clients.
+    Connections are kept alive between requests.
+    """
+
+    def __init__(self, api, host="127.0.0.1", port=8000, workers=8):
+        self.api = api
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        addresses = ", ".join(
+            f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets
+        )
+        print(f"Serving on {addresses} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """Serve until interrupted, then let running handlers finish."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            print("Stopping.")
+        finally:
+            self.executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                if body is None:
+                    status, payload = 413, json.dumps({"error": "request body too large"})
+                    payload, keep_alive = payload.encode("utf-8"), False
+                else:
+                    status, payload = await loop.run_in_executor(
+                        self.executor, self.api.dispatch, method, target, body
+                    )
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ValueError:
+            self._write_response(writer, 400, b'{"error": "malformed request"}', False)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        Returns (method, target, keep_alive, body), None at the end of the
+        connection, or a body of None when it is larger than MAX_BODY_SIZE.
+        Raises ValueError for a malformed request.
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, target, version = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            return method, target, False, None
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, keep_alive, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + payload)
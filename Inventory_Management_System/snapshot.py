@@ -0,0 +1,549 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from aggregates import SalesAggregates, sale_time
+from columnar import InventoryColumns, np
+from inventory import Inventory
+from reports import ReportManager
+from sales import SalesManager
+from storage import write_atomic
+
+MAGIC = b"IMSSNAP1"
+VERSION = 1
+# magic, version, number of directory entries
+HEADER = struct.Struct("<8sII")
+# table, column, type code, byte offset of the data, item count
+ENTRY = struct.Struct("<16s16s4s4xQQ")
+ITEM_SIZES = {"q": 8, "d": 8, "i": 4, "Q": 8, "B": 1}
+NUMPY_TYPES = {"q": "<i8", "d": "<f8", "i": "<i4", "Q": "<u8"}
+EPOCH = datetime(1970, 1, 1)
+# Sale time of a sale whose timestamp cannot be read.
+NO_TIME = -(2 ** 63)
+
+
+def _micros(ts):
+    # Naive datetime -> microseconds since 1970, exact (unlike float seconds).
+    delta = ts - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class _Strings:
+    """A string column being written: UTF-8 bytes back to back, plus offsets."""
+
+    def __init__(self):
+        self.offsets = array("Q", [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        self.data += ("" if value is None else str(value)).encode("utf-8")
+        self.offsets.append(len(self.data))
+
+
+class StringColumn:
+    """Read-only sequence of the strings of one snapshot column, decoded on access."""
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+    def __iter__(self):
+        offsets, data = self._offsets, self._data
+        start = offsets[0]
+        for i in range(1, len(offsets)):
+            end = offsets[i]
+            yield str(data[start:end], "utf-8")
+            start = end
+
+
+def write_snapshot(filename, products, sales):
+    """
+    Write products and sales to a snapshot file for read-only report processes.
+
+    products: product records or dicts.
+    sales: iterable of chunks (lists) of sale records or dicts, as from
+        SalesManager.iter_sales(), so the history need not be in memory.
+    Returns (product count, sale count).
+
+    The file holds fixed-width columns (one array per field) and string
+    columns (offsets into UTF-8 bytes), so Snapshot can map it and read
+    values in place. It is written aside and renamed into place, so readers
+    that already opened the old file keep a consistent view.
+    """
+    tables = {
+        "products": {},
+        "categories": {},
+        "sales": {},
+        "customers": {},
+        "items": {},
+        "sold_products": {},
+        "sale_times": {},
+    }
+    product_columns = tables["products"]
+    for name in ("id", "name"):
+        product_columns[name] = _Strings()
+    product_columns["category"] = array("i")
+    product_columns["buying_price"] = array("d")
+    product_columns["selling_price"] = array("d")
+    product_columns["quantity"] = array("q")
+    category_codes = {}
+    categories = tables["categories"]["name"] = _Strings()
+    for product in products:
+        product_columns["id"].append(product["id"])
+        product_columns["name"].append(product["name"])
+        code = category_codes.get(product["category"])
+        if code is None:
+            code = category_codes[product["category"]] = len(category_codes)
+            categories.append(product["category"])
+        product_columns["category"].append(code)
+        product_columns["buying_price"].append(product["buying_price"])
+        product_columns["selling_price"].append(product["selling_price"])
+        product_columns["quantity"].append(product["quantity"])
+
+    sale_columns = tables["sales"]
+    for name in ("id", "customer_id", "customer_name", "timestamp"):
+        sale_columns[name] = _Strings()
+    sale_columns["has_customer_id"] = array("i")
+    # Codes into the customers table (distinct names) and, for items, into
+    # sold_products (distinct id and name pairs), for grouping.
+    sale_columns["customer"] = array("i")
+    customer_codes = {}
+    customer_names = tables["customers"]["name"] = _Strings()
+    sale_columns["total_quantity"] = array("q")
+    sale_columns["total_amount"] = array("d")
+    sale_columns["time"] = array("q")
+    # Sale i has items first_item[i] to first_item[i + 1] - 1.
+    sale_columns["first_item"] = array("q", [0])
+    item_columns = tables["items"]
+    for name in ("product_id", "product_name"):
+        item_columns[name] = _Strings()
+    item_columns["product"] = array("i")
+    sold_codes = {}
+    sold_ids = tables["sold_products"]["id"] = _Strings()
+    sold_names = tables["sold_products"]["name"] = _Strings()
+    item_columns["quantity"] = array("q")
+    item_columns["unit_price"] = array("d")
+    item_columns["line_total"] = array("d")
+    for chunk in sales:
+        for sale in chunk:
+            sale_columns["id"].append(sale["id"])
+            sale_columns["customer_id"].append(sale["customer_id"])
+            sale_columns["has_customer_id"].append(sale["customer_id"] is not None)
+            sale_columns["customer_name"].append(sale["customer_name"])
+            code = customer_codes.get(sale["customer_name"])
+            if code is None:
+                code = customer_codes[sale["customer_name"]] = len(customer_codes)
+                customer_names.append(sale["customer_name"])
+            sale_columns["customer"].append(code)
+            sale_columns["timestamp"].append(sale["timestamp"])
+            sale_columns["total_quantity"].append(sale["total_quantity"])
+            sale_columns["total_amount"].append(sale["total_amount"])
+            ts = sale_time(sale)
+            sale_columns["time"].append(NO_TIME if ts is None else _micros(ts))
+            for item in sale["items"]:
+                item_columns["product_id"].append(item["product_id"])
+                item_columns["product_name"].append(item["product_name"])
+                key = (item["product_id"], item["product_name"])
+                code = sold_codes.get(key)
+                if code is None:
+                    code = sold_codes[key] = len(sold_codes)
+                    sold_ids.append(key[0])
+                    sold_names.append(key[1])
+                item_columns["product"].append(code)
+                item_columns["quantity"].append(item["quantity"])
+                item_columns["unit_price"].append(item["unit_price"])
+                item_columns["line_total"].append(item["line_total"])
+            sale_columns["first_item"].append(len(item_columns["quantity"]))
+
+    # Sales ordered by time (unreadable timestamps left out), for range reads.
+    times = sale_columns["time"]
+    order = sorted((n for n in range(len(times)) if times[n] != NO_TIME), key=times.__getitem__)
+    tables["sale_times"]["time"] = array("q", (times[n] for n in order))
+    tables["sale_times"]["sale"] = array("q", order)
+
+    _write_tables(filename, tables)
+    return len(product_columns["quantity"]), len(sale_columns["total_quantity"])
+
+
+def _write_tables(filename, tables):
+    columns = []
+    for table, fields in tables.items():
+        for column, values in fields.items():
+            if isinstance(values, _Strings):
+                columns.append((table, column, "Q", values.offsets))
+                columns.append((table, column, "B", values.data))
+            else:
+                columns.append((table, column, values.typecode, values))
+    offset = HEADER.size + ENTRY.size * len(columns)
+    entries = []
+    for table, column, code, values in columns:
+        offset += -offset % 8
+        entries.append((table, column, code, offset, len(values)))
+        offset += len(values) * ITEM_SIZES[code]
+
+    def write(f):
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for table, column, code, offset, count in entries:
+            f.write(ENTRY.pack(table.encode(), column.encode(), code.encode(), offset, count))
+        for (_, _, _, offset, _), (_, _, _, values) in zip(entries, columns):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(values)
+
+    write_atomic(filename, write, binary=True)
+
+
+class Snapshot:
+    """
+    A snapshot file opened read-only with mmap.
+
+    Values are read straight from the mapped pages: numeric columns are
+    memoryviews (NumPy arrays over the same memory when NumPy is installed)
+    and strings are decoded only when accessed. Many processes can map the
+    same file and share its pages. Raises ValueError for a file that is not
+    a snapshot.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{filename} is not an inventory snapshot")
+        magic, version, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not an inventory snapshot of this version")
+        self._entries = {}
+        for n in range(count):
+            table, column, code, offset, length = ENTRY.unpack_from(
+                self._map, HEADER.size + n * ENTRY.size
+            )
+            key = (table.rstrip(b"\0").decode(), column.rstrip(b"\0").decode(), code.decode()[0])
+            self._entries[key] = (offset, length)
+
+        self._sale_first_item = self._numbers("sales", "first_item")
+        self._time_index = self._numbers("sale_times", "time")
+        self._time_order = self._numbers("sale_times", "sale")
+
+    def _numbers(self, table, column, numpy=False):
+        for code in NUMPY_TYPES:
+            if (table, column, code) in self._entries:
+                break
+        else:
+            raise KeyError(f"{table}.{column}")
+        offset, length = self._entries[(table, column, code)]
+        if numpy:
+            return np.frombuffer(self._map, NUMPY_TYPES[code], length, offset)
+        return self._view[offset:offset + length * ITEM_SIZES[code]].cast(code)
+
+    def _strings(self, table, column):
+        offset, length = self._entries[(table, column, "B")]
+        return StringColumn(self._numbers(table, column), self._view[offset:offset + length])
+
+    @property
+    def product_count(self):
+        return len(self._numbers("products", "quantity"))
+
+    @property
+    def sale_count(self):
+        return len(self._sale_first_item) - 1
+
+    # Products
+
+    def products(self):
+        """Yield every product as a dict."""
+        categories = list(self._strings("categories", "name"))
+        yield from (
+            {
+                "id": product_id,
+                "name": name,
+                "category": categories[code],
+                "buying_price": buying_price,
+                "selling_price": selling_price,
+                "quantity": quantity,
+            }
+            for product_id, name, code, buying_price, selling_price, quantity in zip(
+                self._strings("products", "id"),
+                self._strings("products", "name"),
+                self._numbers("products", "category"),
+                self._numbers("products", "buying_price"),
+                self._numbers("products", "selling_price"),
+                self._numbers("products", "quantity"),
+            )
+        )
+
+    def columns(self):
+        """InventoryColumns over the mapped product arrays (None without NumPy)."""
+        if np is None:
+            return None
+        return InventoryColumns.from_arrays(
+            self._strings("products", "id"),
+            self._numbers("products", "quantity", numpy=True),
+            self._numbers("products", "buying_price", numpy=True),
+            self._numbers("products", "selling_price", numpy=True),
+            self._numbers("products", "category", numpy=True),
+            self._strings("categories", "name"),
+        )
+
+    # Sales
+
+    def sales(self, positions):
+        """Yield the sales at the given positions (history order numbers) as dicts."""
+        ids = self._strings("sales", "id")
+        customer_ids = self._strings("sales", "customer_id")
+        has_customer_id = self._numbers("sales", "has_customer_id")
+        customer_names = self._strings("sales", "customer_name")
+        timestamps = self._strings("sales", "timestamp")
+        total_quantity = self._numbers("sales", "total_quantity")
+        total_amount = self._numbers("sales", "total_amount")
+        first_item = self._sale_first_item
+        item_product_ids = self._strings("items", "product_id")
+        item_product_names = self._strings("items", "product_name")
+        item_quantity = self._numbers("items", "quantity")
+        item_unit_price = self._numbers("items", "unit_price")
+        item_line_total = self._numbers("items", "line_total")
+        for n in positions:
+            yield {
+                "id": ids[n],
+                "customer_id": customer_ids[n] if has_customer_id[n] else None,
+                "customer_name": customer_names[n],
+                "items": [
+                    {
+                        "product_id": item_product_ids[i],
+                        "product_name": item_product_names[i],
+                        "quantity": item_quantity[i],
+                        "unit_price": item_unit_price[i],
+                        "line_total": item_line_total[i],
+                    }
+                    for i in range(first_item[n], first_item[n + 1])
+                ],
+                "total_quantity": total_quantity[n],
+                "total_amount": total_amount[n],
+                "timestamp": timestamps[n],
+            }
+
+    def time_range(self, start=None, end=None):
+        """(lo, hi): the sales with start <= timestamp < end are time order lo to hi - 1."""
+        times = self._time_index
+        lo = 0 if start is None else bisect_left(times, _micros(start))
+        hi = len(times) if end is None else bisect_left(times, _micros(end))
+        return lo, max(lo, hi)
+
+    def positions_between(self, start=None, end=None):
+        """History positions of the sales with start <= timestamp < end, in time order."""
+        lo, hi = self.time_range(start, end)
+        return self._time_order[lo:hi]
+
+    def aggregates(self, start=None, end=None, kinds=("day", "customer", "product")):
+        """
+        SalesAggregates for start <= timestamp < end (every sale when both
+        are None), limited to the breakdowns in `kinds`.
+
+        With NumPy the totals are grouped in whole-array operations over
+        the mapped columns; otherwise the sales are decoded and added up.
+        Either way the rows come out in the order the sales first mention
+        them, as when recording the sales one by one.
+        """
+        if start is None and end is None:
+            positions = range(self.sale_count)
+        else:
+            positions = sorted(self.positions_between(start, end))
+        if np is None:
+            return SalesAggregates.from_sales(self.sales(positions))
+
+        first_item = self._numbers("sales", "first_item", numpy=True)
+        selected = np.zeros(self.sale_count, bool)
+        selected[np.asarray(positions, np.int64)] = True
+        sales = np.flatnonzero(selected)
+        quantity = self._numbers("sales", "total_quantity", numpy=True)[sales]
+        amount = self._numbers("sales", "total_amount", numpy=True)[sales]
+
+        rows = [_row("total", "total", {}, len(sales), quantity.sum(), _sum(amount))]
+        if "day" in kinds:
+            times = self._numbers("sales", "time", numpy=True)[sales]
+            dated = times != NO_TIME
+            days = times[dated] // 86400000000
+            for day, orders, qty, revenue in _grouped(days, quantity[dated], amount[dated]):
+                day = (EPOCH + timedelta(days=int(day))).date().isoformat()
+                rows.append(_row("day", f"day:{day}", {"day": day}, orders, qty, revenue))
+        if "customer" in kinds:
+            names = self._strings("customers", "name")
+            codes = self._numbers("sales", "customer", numpy=True)[sales]
+            for code, orders, qty, revenue in _grouped(codes, quantity, amount):
+                name = names[code]
+                fields = {"customer_name": name}
+                rows.append(_row("customer", f"customer:{name}", fields, orders, qty, revenue))
+        if "product" in kinds:
+            rows.extend(self._product_rows(sales, first_item))
+        return SalesAggregates(rows)
+
+    def _product_rows(self, sales, first_item):
+        counts = first_item[1:] - first_item[:-1]
+        items = np.repeat(np.arange(len(counts)), counts)
+        chosen = np.zeros(len(counts), bool)
+        chosen[sales] = True
+        chosen_items = np.flatnonzero(chosen[items])
+        item_sale = items[chosen_items]
+        codes = self._numbers("items", "product", numpy=True)[chosen_items]
+        quantity = self._numbers("items", "quantity", numpy=True)[chosen_items]
+        line_total = self._numbers("items", "line_total", numpy=True)[chosen_items]
+        ids = self._strings("sold_products", "id")
+        names = self._strings("sold_products", "name")
+        size = len(ids)
+        # A product listed on several lines of one sale still counts as one
+        # order: add up each sale's lines per product first, as record() does.
+        pairs, first, inverse = np.unique(
+            item_sale * size + codes, return_index=True, return_inverse=True
+        )
+        pair_quantity = np.bincount(inverse, quantity, len(pairs))
+        pair_total = np.bincount(inverse, line_total, len(pairs))
+        rows = []
+        grouped = _grouped(pairs % size, pair_quantity, pair_total, first)
+        for code, orders, qty, revenue in grouped:
+            product_id, name = ids[code], names[code]
+            rows.append(
+                _row(
+                    "product",
+                    f"product:{product_id}:{name}",
+                    {"product_id": product_id, "product_name": name},
+                    orders,
+                    qty,
+                    revenue,
+                )
+            )
+        return rows
+
+    def close(self):
+        """Unmap the file. Arrays and columns taken from it must not be used afterwards."""
+        self._sale_first_item = self._time_index = self._time_order = None
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # Views over the map are still alive; it is unmapped with the last one.
+            pass
+
+
+def _sum(values):
+    # Added one after another, in order, so float totals match adding the
+    # sales up one by one (numpy's sum() adds pairwise).
+    return float(np.bincount(np.zeros(len(values), np.intp), values, 1)[0])
+
+
+def _grouped(codes, quantity, amount, position=None):
+    """
+    (code, orders, quantity, amount) per distinct code, in order of first
+    appearance (of the smallest `position` of its entries, when given).
+    """
+    if not len(codes):
+        return []
+    distinct, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    if position is not None:
+        first = position[first]
+    orders = np.bincount(inverse, minlength=len(distinct))
+    quantities = np.bincount(inverse, quantity, len(distinct))
+    amounts = np.bincount(inverse, amount, len(distinct))
+    order = np.argsort(first, kind="stable")
+    return [(distinct[n], orders[n], quantities[n], amounts[n]) for n in order]
+
+
+def _row(kind, row_id, fields, orders, quantity, revenue):
+    row = {"id": row_id, "kind": kind}
+    row.update(fields)
+    row.update({"orders": int(orders), "quantity": int(quantity), "revenue": float(revenue)})
+    return row
+
+
+class SnapshotProductStorage:
+    """
+    Read-only product storage over a Snapshot (load() and columns() only).
+
+    Inventory takes the columns as they are and only calls load(), which
+    builds every product record, once a report needs the records.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def load(self):
+        return list(self.snapshot.products())
+
+    def columns(self):
+        return self.snapshot.columns()
+
+
+class SnapshotSalesStorage:
+    """
+    Read-only sales storage over a Snapshot.
+
+    Offers the streaming and range reads SalesManager uses instead of
+    loading the whole history, so reports only decode the sales they need.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def load(self):
+        return list(self.snapshot.sales(range(self.snapshot.sale_count)))
+
+    def _chunks(self, positions, chunk_size):
+        for start in range(0, len(positions), chunk_size):
+            yield list(self.snapshot.sales(positions[start:start + chunk_size]))
+
+    def iter_chunks(self, chunk_size=1000):
+        """Yield chunks of sales in history order."""
+        yield from self._chunks(range(self.snapshot.sale_count), chunk_size)
+
+    def iter_chunks_between(self, start=None, end=None, chunk_size=1000):
+        """Yield chunks of the sales with start <= timestamp < end, in history order."""
+        positions = sorted(self.snapshot.positions_between(start, end))
+        yield from self._chunks(positions, chunk_size)
+
+    def recent_sales(self, count, start=None, end=None):
+        """The last `count` sales with start <= timestamp < end, oldest first."""
+        if count <= 0:
+            return []
+        positions = self.snapshot.positions_between(start, end)
+        return list(self.snapshot.sales(positions[max(0, len(positions) - count):]))
+
+    def aggregates_between(self, start=None, end=None, kinds=("day", "customer", "product")):
+        return self.snapshot.aggregates(start, end, kinds)
+
+
+class SnapshotAggregateStorage:
+    """The all-time sales totals of a Snapshot, as SalesManager's aggregate storage."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def load(self):
+        return self.snapshot.aggregates().rows()
+
+
+def open_report_manager(filename):
+    """
+    A ReportManager that reads a snapshot file instead of the live data.
+
+    Returns (report_manager, snapshot); the managers behind it are read-only.
+    """
+    snapshot = Snapshot(filename)
+    inventory = Inventory(SnapshotProductStorage(snapshot))
+    sales_manager = SalesManager(
+        inventory,
+        SnapshotSalesStorage(snapshot),
+        customer_manager=None,
+        aggregate_storage=SnapshotAggregateStorage(snapshot),
+    )
+    return ReportManager(inventory, sales_manager), snapshot
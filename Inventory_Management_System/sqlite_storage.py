@@ -0,0 +1,456 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from aggregates import SalesAggregates
+from storage import StorageError, to_json_value
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    category TEXT,
+    buying_price REAL,
+    selling_price REAL,
+    quantity INTEGER
+);
+CREATE INDEX IF NOT EXISTS products_category ON products (category);
+
+CREATE TABLE IF NOT EXISTS customers (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    phone TEXT,
+    email TEXT
+);
+CREATE INDEX IF NOT EXISTS customers_name ON customers (name COLLATE NOCASE, phone);
+
+CREATE TABLE IF NOT EXISTS sales (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    customer_id TEXT,
+    customer_name TEXT,
+    total_quantity INTEGER,
+    total_amount REAL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS sales_timestamp ON sales (timestamp);
+CREATE INDEX IF NOT EXISTS sales_customer_name ON sales (customer_name);
+
+CREATE TABLE IF NOT EXISTS sale_items (
+    sale_seq INTEGER NOT NULL REFERENCES sales (seq) ON DELETE CASCADE,
+    line INTEGER NOT NULL,
+    product_id TEXT,
+    product_name TEXT,
+    quantity INTEGER,
+    unit_price REAL,
+    line_total REAL,
+    PRIMARY KEY (sale_seq, line)
+);
+CREATE INDEX IF NOT EXISTS sale_items_product ON sale_items (product_id, product_name);
+
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS documents_seq ON documents (collection, seq);
+"""
+
+SALE_FIELDS = ("id", "customer_id", "customer_name", "total_quantity", "total_amount", "timestamp")
+ITEM_FIELDS = ("product_id", "product_name", "quantity", "unit_price", "line_total")
+# Orders product groups by where they first appear (sale, then line), which is
+# how SalesAggregates orders them and breaks ranking ties.
+FIRST_SOLD = "MIN(i.sale_seq * 1000000 + i.line)"
+
+
+class SQLiteDatabase:
+    """
+    One SQLite file holding products, customers, sales and sale line items.
+
+    The connection runs in WAL mode and is shared by the storage classes
+    below; a lock serialises access so managers on several threads can use it.
+    Use transaction() to group writes into one atomic commit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.connection.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self, strict=False):
+        """
+        Commit everything written inside the block at once, or nothing.
+
+        Transactions nest: only the outermost block commits. A database error
+        rolls the whole transaction back and is reported, like JSONStorage
+        reports failed saves.
+
+        strict: raise StorageError after the rollback as well, for callers
+            that changed data in memory and must undo it.
+        """
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self.connection
+                if self._depth == 1:
+                    self.connection.commit()
+            except sqlite3.Error as e:
+                if self._depth > 1:
+                    raise
+                self.connection.rollback()
+                print(f"Error saving to {self.path}: {e}")
+                if strict:
+                    raise StorageError(f"Error saving to {self.path}: {e}") from e
+            except BaseException:
+                if self._depth == 1:
+                    self.connection.rollback()
+                raise
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def reading(self):
+        with self._lock:
+            yield self.connection
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class SQLiteTableStorage:
+    """
+    Storage for one flat record type (products or customers) in its own table.
+
+    Same load()/save() contract as JSONStorage, plus row-level append(),
+    upsert() and delete() so a change writes one row.
+    """
+
+    TABLE_FIELDS = {
+        "products": ("id", "name", "category", "buying_price", "selling_price", "quantity"),
+        "customers": ("id", "name", "phone", "email"),
+    }
+
+    def __init__(self, database, table):
+        self.database = database
+        self.table = table
+        self.fields = self.TABLE_FIELDS[table]
+        columns = ", ".join(self.fields)
+        updates = ", ".join(f"{f} = excluded.{f}" for f in self.fields[1:])
+        placeholders = ", ".join("?" for _ in self.fields)
+        self._select_sql = f"SELECT seq, {columns} FROM {table} WHERE seq > ? ORDER BY seq LIMIT ?"
+        self._upsert_sql = (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}"
+        )
+        self._delete_sql = f"DELETE FROM {table} WHERE id = ?"
+
+    def _values(self, record):
+        return tuple(record.get(field) for field in self.fields)
+
+    def load(self):
+        data = []
+        for chunk in self.iter_chunks():
+            data.extend(chunk)
+        return data
+
+    def iter_chunks(self, chunk_size=1000):
+        last_seq = 0
+        while True:
+            with self.database.reading() as connection:
+                rows = connection.execute(self._select_sql, (last_seq, chunk_size)).fetchall()
+            if not rows:
+                return
+            last_seq = rows[-1]["seq"]
+            yield [{field: row[field] for field in self.fields} for row in rows]
+
+    def save(self, data):
+        with self.database.transaction() as connection:
+            connection.execute(f"DELETE FROM {self.table}")
+            connection.executemany(self._upsert_sql, map(self._values, data))
+
+    def extend(self, records):
+        with self.database.transaction() as connection:
+            connection.executemany(self._upsert_sql, map(self._values, records))
+
+    def append(self, record):
+        self.upsert(record)
+
+    def upsert(self, record):
+        with self.database.transaction() as connection:
+            connection.execute(self._upsert_sql, self._values(record))
+
+    def delete(self, record_key):
+        with self.database.transaction() as connection:
+            connection.execute(self._delete_sql, (record_key,))
+
+    def transaction(self):
+        """Group writes (see SQLiteDatabase.transaction); raises StorageError if they fail."""
+        return self.database.transaction(strict=True)
+
+
+class SQLiteDocumentStorage(SQLiteTableStorage):
+    """
+    Storage for free-form dict records with an "id" (e.g. the sales totals),
+    kept as JSON text in a shared table.
+    """
+
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+
+    def iter_chunks(self, chunk_size=1000):
+        last_seq = -1
+        while True:
+            with self.database.reading() as connection:
+                rows = connection.execute(
+                    "SELECT seq, data FROM documents WHERE collection = ? AND seq > ? "
+                    "ORDER BY seq LIMIT ?",
+                    (self.collection, last_seq, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_seq = rows[-1]["seq"]
+            yield [json.loads(row["data"]) for row in rows]
+
+    def _upsert_many(self, connection, records):
+        next_seq = connection.execute(
+            "SELECT COALESCE(MAX(seq), -1) + 1 FROM documents WHERE collection = ?",
+            (self.collection,),
+        ).fetchone()[0]
+        for seq, record in enumerate(records, next_seq):
+            connection.execute(
+                "INSERT INTO documents (collection, seq, id, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data",
+                (self.collection, seq, record["id"], json.dumps(record, default=to_json_value)),
+            )
+
+    def save(self, data):
+        with self.database.transaction() as connection:
+            connection.execute("DELETE FROM documents WHERE collection = ?", (self.collection,))
+            self._upsert_many(connection, data)
+
+    def extend(self, records):
+        with self.database.transaction() as connection:
+            self._upsert_many(connection, records)
+
+    def upsert(self, record):
+        self.extend([record])
+
+    def delete(self, record_key):
+        with self.database.transaction() as connection:
+            connection.execute(
+                "DELETE FROM documents WHERE collection = ? AND id = ?",
+                (self.collection, record_key),
+            )
+
+
+class SQLiteSalesStorage:
+    """
+    Sales in the `sales` table with their line items in `sale_items`.
+
+    Besides the storage contract (load, save, append, iter_chunks) it answers
+    report queries with indexed SQL, so date-range reports never load sales
+    into Python.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        columns = ", ".join(SALE_FIELDS)
+        self._insert_sale_sql = (
+            f"INSERT INTO sales ({columns}) VALUES ({', '.join('?' for _ in SALE_FIELDS)})"
+        )
+        self._insert_item_sql = (
+            f"INSERT INTO sale_items (sale_seq, line, {', '.join(ITEM_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in ITEM_FIELDS)})"
+        )
+
+    def _insert(self, connection, sale):
+        cursor = connection.execute(
+            self._insert_sale_sql, tuple(sale.get(field) for field in SALE_FIELDS)
+        )
+        connection.executemany(
+            self._insert_item_sql,
+            (
+                (cursor.lastrowid, line) + tuple(item.get(field) for field in ITEM_FIELDS)
+                for line, item in enumerate(sale["items"])
+            ),
+        )
+
+    def _sales_from_rows(self, connection, rows):
+        if not rows:
+            return []
+        sales = {}
+        for row in rows:
+            sale = {field: row[field] for field in SALE_FIELDS}
+            sale["items"] = []
+            sales[row["seq"]] = sale
+        items = connection.execute(
+            f"SELECT sale_seq, {', '.join(ITEM_FIELDS)} FROM sale_items "
+            "WHERE sale_seq BETWEEN ? AND ? ORDER BY sale_seq, line",
+            (rows[0]["seq"], rows[-1]["seq"]),
+        )
+        for item in items:
+            sale = sales.get(item["sale_seq"])
+            if sale is not None:
+                sale["items"].append({field: item[field] for field in ITEM_FIELDS})
+        return list(sales.values())
+
+    def load(self):
+        data = []
+        for chunk in self.iter_chunks():
+            data.extend(chunk)
+        return data
+
+    def iter_chunks(self, chunk_size=1000):
+        last_seq = 0
+        columns = ", ".join(SALE_FIELDS)
+        while True:
+            with self.database.reading() as connection:
+                rows = connection.execute(
+                    f"SELECT seq, {columns} FROM sales WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, chunk_size),
+                ).fetchall()
+                chunk = self._sales_from_rows(connection, rows)
+            if not rows:
+                return
+            last_seq = rows[-1]["seq"]
+            yield chunk
+
+    def save(self, data):
+        with self.database.transaction() as connection:
+            connection.execute("DELETE FROM sale_items")
+            connection.execute("DELETE FROM sales")
+            for sale in data:
+                self._insert(connection, sale)
+
+    def extend(self, records):
+        with self.database.transaction() as connection:
+            for sale in records:
+                self._insert(connection, sale)
+
+    def append(self, record):
+        self.extend([record])
+
+    def count(self):
+        """Number of sales."""
+        with self.database.reading() as connection:
+            return connection.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+
+    def transaction(self):
+        """Group writes (see SQLiteDatabase.transaction); raises StorageError if they fail."""
+        return self.database.transaction(strict=True)
+
+    def _range(self, start, end):
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append("s.timestamp >= ?")
+            params.append(start.isoformat(timespec="seconds"))
+        if end is not None:
+            conditions.append("s.timestamp < ?")
+            params.append(end.isoformat(timespec="seconds"))
+        return " AND ".join(conditions) or "1", params
+
+    def recent_sales(self, count, start=None, end=None):
+        """The last `count` sales with start <= timestamp < end, oldest first."""
+        where, params = self._range(start, end)
+        with self.database.reading() as connection:
+            rows = connection.execute(
+                f"SELECT s.seq, {', '.join('s.' + f for f in SALE_FIELDS)} FROM sales s "
+                f"WHERE {where} ORDER BY s.timestamp DESC, s.seq DESC LIMIT ?",
+                params + [count],
+            ).fetchall()
+            return self._sales_from_rows(connection, sorted(rows, key=lambda r: r["seq"]))
+
+    def aggregates_between(self, start=None, end=None, kinds=("day", "customer", "product")):
+        """
+        SalesAggregates for start <= timestamp < end, computed with GROUP BY queries.
+
+        kinds: which breakdowns to compute besides the overall total.
+        """
+        where, params = self._range(start, end)
+        rows = []
+        with self.database.reading() as connection:
+            total = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_quantity), 0), "
+                f"COALESCE(SUM(total_amount), 0.0) FROM sales s WHERE {where}",
+                params,
+            ).fetchone()
+            rows.append({"id": "total", "kind": "total", "orders": total[0],
+                         "quantity": total[1], "revenue": total[2]})
+
+            day_rows = customer_rows = product_rows = ()
+            if "day" in kinds:
+                day_rows = connection.execute(
+                    "SELECT substr(timestamp, 1, 10) AS day, COUNT(*), SUM(total_quantity), "
+                    f"SUM(total_amount) FROM sales s WHERE {where} GROUP BY day ORDER BY day",
+                    params,
+                )
+            for day, orders, quantity, revenue in day_rows:
+                rows.append({"id": f"day:{day}", "kind": "day", "day": day,
+                             "orders": orders, "quantity": quantity, "revenue": revenue})
+
+            if "customer" in kinds:
+                customer_rows = connection.execute(
+                    "SELECT customer_name, COUNT(*), SUM(total_quantity), SUM(total_amount) "
+                    f"FROM sales s WHERE {where} GROUP BY customer_name ORDER BY MIN(seq)",
+                    params,
+                )
+            for name, orders, quantity, revenue in customer_rows:
+                rows.append({"id": f"customer:{name}", "kind": "customer",
+                             "customer_name": name, "orders": orders,
+                             "quantity": quantity, "revenue": revenue})
+
+            if "product" in kinds:
+                product_rows = connection.execute(
+                    "SELECT i.product_id, i.product_name, COUNT(DISTINCT i.sale_seq), "
+                    "SUM(i.quantity), SUM(i.line_total) FROM sale_items i "
+                    f"JOIN sales s ON s.seq = i.sale_seq WHERE {where} "
+                    f"GROUP BY i.product_id, i.product_name ORDER BY {FIRST_SOLD}",
+                    params,
+                )
+            for pid, pname, orders, quantity, revenue in product_rows:
+                rows.append({"id": f"product:{pid}:{pname}", "kind": "product",
+                             "product_id": pid, "product_name": pname, "orders": orders,
+                             "quantity": quantity, "revenue": revenue})
+        return SalesAggregates(rows)
+
+    def top_products(self, top_n, rank_by="quantity", start=None, end=None, category=None):
+        """
+        Top product rows for start <= timestamp < end, ranked and limited in SQL.
+
+        category: only products currently in this category (case-insensitive).
+        """
+        if rank_by not in ("quantity", "revenue"):
+            raise ValueError(f"Cannot rank products by {rank_by!r}.")
+        where, params = self._range(start, end)
+        join = ""
+        if category:
+            join = "JOIN products p ON p.id = i.product_id AND p.category = ? COLLATE NOCASE "
+            params = [category] + params
+        with self.database.reading() as connection:
+            return [
+                dict(row)
+                for row in connection.execute(
+                    "SELECT i.product_id, i.product_name, COUNT(DISTINCT i.sale_seq) AS orders, "
+                    "SUM(i.quantity) AS quantity, SUM(i.line_total) AS revenue "
+                    f"FROM sale_items i JOIN sales s ON s.seq = i.sale_seq {join}"
+                    f"WHERE {where} GROUP BY i.product_id, i.product_name "
+                    f"ORDER BY {rank_by} DESC, {FIRST_SOLD} LIMIT ?",
+                    params + [top_n],
+                )
+            ]
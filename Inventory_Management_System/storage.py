@@ -1,5 +1,224 @@
 import json
+import marshal
 import os
+import re
+import threading
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # optional: the standard json module is used instead
+    orjson = None
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Start of a MarshalCodec snapshot; JSON text can never start with it.
+MARSHAL_MAGIC = b"IMS-MARSHAL-1\n"
+
+
+class StorageError(Exception):
+    """A group of writes failed and was rolled back (see SQLiteDatabase.transaction)."""
+
+
+def to_json_value(obj):
+    """json `default` hook: encode objects that provide to_dict(), such as records."""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def to_plain(obj):
+    """Recursively turn records into dicts and tuples into lists."""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        obj = to_dict()
+    if isinstance(obj, dict):
+        return {key: to_plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(value) for value in obj]
+    return obj
+
+
+class JSONCodec:
+    """Standard-library JSON: compact, or pretty-printed with `indent`."""
+
+    name = "json"
+
+    def __init__(self, indent=None):
+        self.indent = indent
+
+    def encode(self, data):
+        if self.indent is None:
+            text = json.dumps(data, separators=(",", ":"), default=to_json_value)
+        else:
+            text = json.dumps(data, indent=self.indent, default=to_json_value)
+        return text.encode("utf-8")
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+class OrjsonCodec:
+    """JSON through orjson (compact); several times faster than the json module."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ValueError("orjson is not installed (pip install orjson)")
+
+    def encode(self, data):
+        return orjson.dumps(data, default=to_json_value)
+
+    def decode(self, raw):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # e.g. NaN, which the json module writes but orjson rejects.
+            return json.loads(raw)
+
+
+class MarshalCodec:
+    """
+    Binary snapshot with the marshal module: the fastest to reload, but
+    not human-readable and only guaranteed to load on the same Python
+    version. Keep a JSON export (export-products) if the files must outlive
+    an upgrade.
+    """
+
+    name = "marshal"
+
+    def encode(self, data):
+        records = [r.to_dict() if hasattr(r, "to_dict") else r for r in data]
+        try:
+            body = marshal.dumps(records)
+        except ValueError:
+            # Nested records (e.g. sale line items): convert all the way down.
+            body = marshal.dumps(to_plain(records))
+        return MARSHAL_MAGIC + body
+
+    def decode(self, raw):
+        return marshal.loads(memoryview(raw)[len(MARSHAL_MAGIC):])
+
+
+CODECS = {"json": JSONCodec, "orjson": OrjsonCodec, "marshal": MarshalCodec}
+
+
+def get_codec(name=None):
+    """
+    A codec by name: "json", "orjson" or "marshal". None (or "auto") picks
+    orjson when it is installed and compact json otherwise.
+    """
+    if name in (None, "auto"):
+        return OrjsonCodec() if orjson is not None else JSONCodec()
+    if name not in CODECS:
+        raise ValueError(f"unknown codec {name!r}")
+    return CODECS[name]()
+
+
+def decode_snapshot(raw):
+    """Decode a file written by any codec (JSON, pretty or compact, or marshal)."""
+    if raw.startswith(MARSHAL_MAGIC):
+        return MarshalCodec().decode(raw)
+    return (OrjsonCodec() if orjson is not None else JSONCodec()).decode(raw)
+
+
+def write_atomic(filename, write, binary=False):
+    """
+    Replace `filename` with what write(f) writes, without ever exposing a
+    partly written file.
+
+    The data goes to a temporary file next to the target, named after this
+    process and thread so concurrent writers never share one, and is then
+    renamed over the target. Readers see either the old or the new file.
+    binary: open the file in binary mode, for write(f) functions that write
+    bytes. Raises OSError on failure (the temporary file is removed).
+    """
+    tmp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_filename, "wb") if binary else open(tmp_filename, "w", encoding="utf-8") as f:
+            write(f)
+            metrics.count("storage.bytes_written", f.tell())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def iter_json_array(filename, chunk_size=1000, read_size=1 << 16):
+    """
+    Yield lists of up to `chunk_size` items from a file holding one JSON array.
+
+    The file is read `read_size` characters at a time, so only the current
+    chunk is held in memory. Raises ValueError if the file is not valid JSON;
+    yields nothing if it holds something other than an array.
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def skip_whitespace():
+            nonlocal buf, pos, eof
+            while True:
+                pos = _WHITESPACE.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    return
+                more = f.read(read_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+
+        skip_whitespace()
+        if buf[pos:pos + 1] != "[":
+            return
+        pos += 1
+
+        chunk = []
+        first = True
+        expect_item = True
+        while True:
+            skip_whitespace()
+            if pos >= len(buf):
+                raise ValueError(f"Unexpected end of file in {filename}")
+            if not expect_item:
+                if buf[pos] == "]":
+                    break
+                if buf[pos] != ",":
+                    raise ValueError(f"Expected ',' or ']' in {filename}")
+                pos += 1
+                expect_item = True
+                continue
+            if first and buf[pos] == "]":
+                break
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The item runs past the buffer: read more and try again.
+                more = f.read(read_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            pos = end
+            first = False
+            expect_item = False
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
 
 class JSONStorage:
@@ -7,30 +226,348 @@ class JSONStorage:
     Simple JSON file storage helper.
 
     Stores and loads a Python list (e.g., list of products, customers, or sales).
+
+    codec: how save() encodes the list (a JSONCodec, OrjsonCodec or
+    MarshalCodec; by default compact JSON, through orjson when installed).
+    load() reads files written with any codec, so switching codecs needs no
+    conversion step.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, codec=None):
         self.filename = filename
+        self.codec = codec or get_codec()
+        # Serializes writers within this process; write_atomic() keeps other
+        # processes from ever reading (or truncating) a half-written file.
+        self._write_lock = threading.Lock()
 
+    @metrics.timed("storage.json.load")
     def load(self):
         """Load data from JSON file. Returns a list."""
         if not os.path.exists(self.filename):
             return []
 
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(self.filename, "rb") as f:
+                data = decode_snapshot(f.read())
                 if isinstance(data, list):
                     return data
                 return []
-        except (json.JSONDecodeError, OSError):
+        except (ValueError, EOFError, TypeError, OSError):
             print(f"Warning: Could not read {self.filename}. Starting with empty data.")
             return []
 
+    @metrics.timed("storage.json.save")
     def save(self, data):
-        """Save a list to JSON file."""
+        """Save a list to JSON file (atomically: the old file stays intact until the new one is complete)."""
+        with self._write_lock:
+            try:
+                write_atomic(self.filename, lambda f: f.write(self.codec.encode(data)), binary=True)
+            except OSError as e:
+                print(f"Error saving to {self.filename}: {e}")
+
+    def iter_chunks(self, chunk_size=1000):
+        """Yield the stored list in chunks without loading the whole file."""
+        if not os.path.exists(self.filename):
+            return
+        if self._is_binary():
+            data = self.load()
+            for i in range(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+            return
         try:
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            yield from iter_json_array(self.filename, chunk_size)
+        except (ValueError, OSError):
+            print(f"Warning: Could not read {self.filename}. Stopping early.")
+
+    def _is_binary(self):
+        try:
+            with open(self.filename, "rb") as f:
+                return f.read(len(MARSHAL_MAGIC)) == MARSHAL_MAGIC
+        except OSError:
+            return False
+
+
+class JournalStorage(JSONStorage):
+    """
+    JSON snapshot plus an append-only journal of record changes.
+
+    The snapshot file has the same format as JSONStorage (and the same `codec`
+    option), so existing data files can be used as-is. append(), upsert() and delete() write a single journal
+    line instead of rewriting the whole list. Once the journal has grown past
+    `compact_every` entries it is folded into a new snapshot on a background
+    thread. load() replays the journal on top of the snapshot.
+
+    Records are identified by their `key` field ("id" by default).
+    """
+
+    def __init__(self, filename, key="id", compact_every=1000, codec=None):
+        super().__init__(filename, codec)
+        self.key = key
+        self.compact_every = compact_every
+        self.journal_filename = filename + ".journal"
+        self.compacting_filename = filename + ".journal.compacting"
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._entries = 0
+        # Whether the journal has been checked for a torn last line.
+        self._tail_checked = False
+
+    @metrics.timed("storage.journal.load")
+    def load(self):
+        """Load the snapshot and replay any journal entries on top of it."""
+        with self._lock:
+            self._wait_for_compaction()
+            records = self._records_by_key(super().load())
+            leftover = os.path.exists(self.compacting_filename)
+            if leftover:
+                # A previous compaction did not finish: replay what it was folding.
+                self._replay(records, self.compacting_filename)
+            self._repair_tail()
+            self._entries = self._replay(records, self.journal_filename)
+            data = list(records.values())
+            if leftover:
+                self._write_snapshot(data)
+                self._remove(self.compacting_filename)
+                self._remove(self.journal_filename)
+                self._entries = 0
+            return data
+
+    @metrics.timed("storage.journal.save")
+    def save(self, data):
+        """Write a full snapshot and discard the journal."""
+        with self._lock:
+            self._wait_for_compaction()
+            if self._write_snapshot(data):
+                self._remove(self.journal_filename)
+                self._entries = 0
+
+    def append(self, record):
+        """Record a new item."""
+        self._write_entry({"op": "append", "record": record})
+
+    def upsert(self, record):
+        """Record a new or changed item."""
+        self._write_entry({"op": "upsert", "record": record})
+
+    def delete(self, record_key):
+        """Record the removal of the item with the given key."""
+        self._write_entry({"op": "delete", "key": record_key})
+
+    def iter_chunks(self, chunk_size=1000):
+        """Yield the stored list in chunks; streamed when there is no journal to replay."""
+        self.wait()
+        if os.path.exists(self.journal_filename) or os.path.exists(self.compacting_filename):
+            data = self.load()
+            for i in range(0, len(data), chunk_size):
+                yield data[i:i + chunk_size]
+            return
+        yield from super().iter_chunks(chunk_size)
+
+    def wait(self):
+        """Block until a running background compaction has finished."""
+        with self._lock:
+            self._wait_for_compaction()
+
+    def _records_by_key(self, data):
+        records = {}
+        for record in data:
+            # Records without a key cannot be changed later; keep them in order.
+            records[record.get(self.key, object())] = record
+        return records
+
+    def _replay(self, records, filename):
+        """Apply a journal file to `records`. Returns the number of entries applied."""
+        if not os.path.exists(filename):
+            return 0
+
+        applied = 0
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Typically a torn final write after a crash.
+                        print(f"Warning: Skipping unreadable entry in {filename}.")
+                        continue
+                    if entry.get("op") == "delete":
+                        records.pop(entry.get("key"), None)
+                    else:
+                        record = entry.get("record")
+                        records[record.get(self.key, object())] = record
+                    applied += 1
+        except OSError as e:
+            print(f"Warning: Could not read {filename}: {e}")
+        return applied
+
+    def _repair_tail(self):
+        """
+        Cut a torn last line (a write interrupted by a crash) off the journal,
+        so the next entry starts on a line of its own instead of being glued
+        to it and lost as well.
+        """
+        self._tail_checked = True
+        try:
+            with open(self.journal_filename, "rb+") as f:
+                end = f.seek(0, os.SEEK_END)
+                if end == 0:
+                    return
+                position = end
+                while position > 0:
+                    start = max(0, position - 4096)
+                    f.seek(start)
+                    block = f.read(position - start)
+                    if position == end and block.endswith(b"\n"):
+                        return
+                    newline = block.rfind(b"\n")
+                    if newline >= 0:
+                        position = start + newline + 1
+                        break
+                    position = start
+                print(f"Warning: Dropping an incomplete last entry in {self.journal_filename}.")
+                f.truncate(position)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Could not check {self.journal_filename}: {e}")
+
+    @metrics.timed("storage.journal.write")
+    def _write_entry(self, entry):
+        line = json.dumps(entry, default=to_json_value) + "\n"
+        with self._lock:
+            if not self._tail_checked:
+                self._repair_tail()
+            try:
+                with open(self.journal_filename, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error writing to {self.journal_filename}: {e}")
+                return
+            if metrics.ENABLED:
+                metrics.count("storage.bytes_written", len(line.encode("utf-8")))
+            self._entries += 1
+            if self._entries >= self.compact_every and not self._compaction_running():
+                self._start_compaction()
+
+    def _start_compaction(self):
+        if os.path.exists(self.compacting_filename):
+            # An earlier compaction failed; load() will fold both journals.
+            return
+        # Move the journal aside so new entries go to a fresh file while the
+        # old one is folded into the snapshot.
+        try:
+            os.replace(self.journal_filename, self.compacting_filename)
+        except OSError as e:
+            print(f"Error rotating {self.journal_filename}: {e}")
+            return
+        self._entries = 0
+        self._compactor = threading.Thread(target=self._compact, name="journal-compactor")
+        self._compactor.start()
+
+    def _compact(self):
+        records = self._records_by_key(JSONStorage.load(self))
+        self._replay(records, self.compacting_filename)
+        if self._write_snapshot(list(records.values())):
+            self._remove(self.compacting_filename)
+
+    def _compaction_running(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def _wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _write_snapshot(self, data):
+        """Atomically replace the snapshot file. Returns True on success."""
+        try:
+            write_atomic(self.filename, lambda f: f.write(self.codec.encode(data)), binary=True)
+            return True
         except OSError as e:
             print(f"Error saving to {self.filename}: {e}")
+            return False
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+class JSONLinesStorage:
+    """
+    JSON Lines file storage: one JSON record per line.
+
+    Suited to append-only data such as sales: append() writes a single line,
+    and iter_chunks() reads the file a chunk at a time, so history can be
+    processed without holding all of it in memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._write_lock = threading.Lock()
+
+    @metrics.timed("storage.jsonl.load")
+    def load(self):
+        """Load all records. Returns a list."""
+        data = []
+        for chunk in self.iter_chunks():
+            data.extend(chunk)
+        return data
+
+    def iter_chunks(self, chunk_size=1000):
+        """Yield lists of up to `chunk_size` records, in file order."""
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                chunk = []
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        print(
+                            f"Warning: Skipping unreadable line {line_number} "
+                            f"in {self.filename}."
+                        )
+                        continue
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+        except OSError as e:
+            print(f"Warning: Could not read {self.filename}: {e}")
+
+    @metrics.timed("storage.jsonl.save")
+    def save(self, data):
+        """Replace the file with the given records."""
+
+        def write(f):
+            for record in data:
+                f.write(json.dumps(record, default=to_json_value) + "\n")
+
+        with self._write_lock:
+            try:
+                write_atomic(self.filename, write)
+            except OSError as e:
+                print(f"Error saving to {self.filename}: {e}")
+
+    @metrics.timed("storage.jsonl.append")
+    def append(self, record):
+        """Add one record at the end of the file."""
+        line = json.dumps(record, default=to_json_value) + "\n"
+        with self._write_lock:
+            try:
+                with open(self.filename, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error saving to {self.filename}: {e}")
+                return
+        if metrics.ENABLED:
+            metrics.count("storage.bytes_written", len(line.encode("utf-8")))
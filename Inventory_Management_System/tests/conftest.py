@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The modules import each other by plain name, as when run from their folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def product():
+    """The product most tests sell: p1, a lamp with 10 in stock."""
+    return {
+        "id": "p1",
+        "name": "Lamp",
+        "category": "lights",
+        "buying_price": 5.0,
+        "selling_price": 9.0,
+        "quantity": 10,
+    }
+
+
+@pytest.fixture
+def products_file(tmp_path, product):
+    """products.json in tmp_path, holding `product`."""
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps([product]))
+    return path
+
+
+def _sale(n, timestamp):
+    item = {
+        "product_id": "p1",
+        "product_name": "Lamp",
+        "quantity": 1,
+        "unit_price": 9.0,
+        "line_total": 9.0,
+    }
+    return {
+        "id": f"SALE-{n}",
+        "customer_id": None,
+        "customer_name": "Walk-in",
+        "items": [item],
+        "total_quantity": 1,
+        "total_amount": 9.0,
+        "timestamp": timestamp,
+    }
+
+
+@pytest.fixture
+def make_sale():
+    """make_sale(n, timestamp): a finalized sale SALE-<n> of one lamp."""
+    return _sale
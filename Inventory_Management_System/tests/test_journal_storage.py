@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+
+from storage import JournalStorage
+
+
+def product(product_id, quantity=1):
+    return {"id": product_id, "name": f"Product {product_id}", "quantity": quantity}
+
+
+def test_load_replays_journal_left_by_a_crash(tmp_path):
+    filename = str(tmp_path / "products.json")
+    storage = JournalStorage(filename)
+    storage.save([product("a"), product("b")])
+    storage.upsert(product("b", 5))
+    storage.append(product("c"))
+    storage.delete("a")
+    # The process dies here: the snapshot was never rewritten.
+
+    assert [p["id"] for p in JournalStorage(filename).load()] == ["b", "c"]
+    assert JournalStorage(filename).load()[0]["quantity"] == 5
+
+
+def test_load_finishes_an_interrupted_compaction(tmp_path):
+    filename = str(tmp_path / "products.json")
+    storage = JournalStorage(filename)
+    storage.save([product("a")])
+    # A compaction moved the journal aside and crashed before writing the
+    # snapshot; newer entries went to a fresh journal.
+    with open(filename + ".journal.compacting", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "upsert", "record": product("a", 2)}) + "\n")
+        f.write(json.dumps({"op": "append", "record": product("b")}) + "\n")
+    with open(filename + ".journal", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "upsert", "record": product("a", 3)}) + "\n")
+
+    data = JournalStorage(filename).load()
+
+    assert data == [product("a", 3), product("b")]
+    assert not os.path.exists(filename + ".journal.compacting")
+    assert not os.path.exists(filename + ".journal")
+    assert JournalStorage(filename).load() == data
+
+
+def test_writes_racing_with_compaction_are_kept(tmp_path):
+    filename = str(tmp_path / "products.json")
+    storage = JournalStorage(filename, compact_every=7)
+    storage.save([])
+
+    def write(thread):
+        for n in range(150):
+            storage.upsert(product(f"{thread}-{n % 40}", n))
+
+    threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.wait()
+
+    data = {p["id"]: p["quantity"] for p in JournalStorage(filename).load()}
+    assert len(data) == 160
+    # The last write of each record wins: n = k + 120, or k + 80 for k >= 30.
+    for thread in range(4):
+        for k in range(40):
+            assert data[f"{thread}-{k}"] == (k + 120 if k < 30 else k + 80)
+
+
+def test_torn_last_entry_is_dropped_and_later_writes_survive(tmp_path, capsys):
+    filename = str(tmp_path / "products.json")
+    storage = JournalStorage(filename)
+    storage.save([product("a")])
+    storage.append(product("b"))
+    with open(filename + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "append", "record": {"id": "c", "na')
+
+    # The next process writes before it ever loads.
+    JournalStorage(filename).append(product("d"))
+
+    assert [p["id"] for p in JournalStorage(filename).load()] == ["a", "b", "d"]
+    assert "incomplete last entry" in capsys.readouterr().out
+
+
+def test_corrupt_entry_is_skipped(tmp_path, capsys):
+    filename = str(tmp_path / "products.json")
+    storage = JournalStorage(filename)
+    storage.save([])
+    storage.append(product("a"))
+    with open(filename + ".journal", "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    storage.append(product("b"))
+
+    assert [p["id"] for p in JournalStorage(filename).load()] == ["a", "b"]
+    assert "Skipping unreadable entry" in capsys.readouterr().out
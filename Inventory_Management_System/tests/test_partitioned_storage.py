@@ -0,0 +1,107 @@
+import json
+import os
+from datetime import datetime
+
+import main
+from inventory import Inventory
+from partitioned_storage import PartitionedSalesStorage
+from sales import SalesManager
+from storage import JournalStorage
+
+
+def history(make_sale):
+    now = datetime.now().isoformat(timespec="seconds")
+    return [
+        make_sale(1, "2024-01-05T10:00:00"),
+        make_sale(2, "2024-02-05T10:00:00"),
+        make_sale(3, "2024-02-06T10:00:00"),
+        make_sale(4, now),
+    ]
+
+
+def ids(storage):
+    return [sale["id"] for sale in storage.load()]
+
+
+def test_past_months_are_closed(tmp_path, make_sale):
+    storage = PartitionedSalesStorage(str(tmp_path / "sales"))
+    storage.extend(history(make_sale))
+    storage.wait()
+
+    this_month = datetime.now().strftime("%Y-%m")
+    assert sorted(os.listdir(tmp_path / "sales")) == [
+        "2024-01.jsonl.gz",
+        "2024-02.jsonl.gz",
+        f"{this_month}.jsonl",
+    ]
+    assert ids(storage) == ["SALE-1", "SALE-2", "SALE-3", "SALE-4"]
+
+    # A late sale for a closed month is folded into its file when closed again.
+    storage.append(make_sale(5, "2024-01-09T10:00:00"))
+    assert storage.close_partitions(this_month) == ["2024-01"]
+    assert [s["id"] for s in storage.iter_partition("2024-01")] == ["SALE-1", "SALE-5"]
+
+
+def test_archive_moves_only_closed_past_months(tmp_path, make_sale):
+    storage = PartitionedSalesStorage(str(tmp_path / "sales"))
+    storage.extend(history(make_sale))
+
+    # A month after the current one archives up to the current one only.
+    assert storage.archive("2999-01") == ["2024-01", "2024-02"]
+    this_month = datetime.now().strftime("%Y-%m")
+    assert sorted(os.listdir(tmp_path / "sales" / "archive")) == [
+        "2024-01.jsonl.gz",
+        "2024-02.jsonl.gz",
+    ]
+    assert os.path.exists(tmp_path / "sales" / f"{this_month}.jsonl")
+    assert ids(storage) == ["SALE-1", "SALE-2", "SALE-3", "SALE-4"]
+
+    plain = PartitionedSalesStorage(str(tmp_path / "plain"), compression=None)
+    plain.extend(history(make_sale))
+    assert plain.archive("2024-03") == []
+
+
+def test_interrupted_split_starts_over(tmp_path, monkeypatch, make_sale):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sales.json").write_text(json.dumps(history(make_sale)))
+    # Left behind by a split that stopped half way.
+    os.makedirs("sales.tmp")
+    partial = json.dumps(make_sale(1, "2024-01-05T10:00:00")) + "\n"
+    (tmp_path / "sales.tmp" / "2024-01.jsonl").write_text(partial)
+
+    sales_storage = main.create_json_storages()[2]
+
+    assert not os.path.exists("sales.tmp")
+    assert ids(sales_storage) == ["SALE-1", "SALE-2", "SALE-3", "SALE-4"]
+    # The next start uses the finished split.
+    assert ids(main.create_json_storages()[2]) == ["SALE-1", "SALE-2", "SALE-3", "SALE-4"]
+
+
+def test_finalize_does_not_load_the_history(tmp_path, products_file, make_sale):
+    storage = PartitionedSalesStorage(str(tmp_path / "sales"))
+    storage.extend(history(make_sale))
+    sales = SalesManager(Inventory(JournalStorage(str(products_file))), storage, None)
+
+    sale = sales.create_sale()
+    sales.add_item_to_sale(sale, "p1", 2)
+    assert sales.finalize_sale(sale)[0]
+
+    assert sales._sales is None
+    assert sales.aggregates.total["orders"] == 5
+    assert [s["id"] for s in sales.sales][-2:] == ["SALE-4", "SALE-5"]
+
+
+def test_totals_missing_a_sale_are_rebuilt(tmp_path, products_file, make_sale):
+    storage = PartitionedSalesStorage(str(tmp_path / "sales"))
+    storage.extend(history(make_sale))
+    totals = str(tmp_path / "totals.json")
+    sales = SalesManager(Inventory(JournalStorage(str(products_file))), storage, None, JournalStorage(totals))
+    assert sales.aggregates.total["orders"] == 4
+
+    # The process stops after saving a sale but before saving the totals.
+    storage.append(make_sale(5, datetime.now().isoformat(timespec="seconds")))
+    assert storage.count() == 5
+
+    restarted = SalesManager(sales.inventory, storage, None, JournalStorage(totals))
+    assert restarted.aggregates.total["orders"] == 5
+    assert restarted._sales is None
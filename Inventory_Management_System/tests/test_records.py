@@ -0,0 +1,60 @@
+import json
+
+from inventory import Inventory
+from records import Product, Sale
+from storage import JournalStorage
+
+PRODUCT = {
+    "id": "p1",
+    "name": "Lamp",
+    "category": "lights",
+    "buying_price": 5.0,
+    "selling_price": 9.0,
+    "quantity": 3,
+}
+
+
+def test_unknown_keys_survive_a_round_trip():
+    product = Product.from_dict(dict(PRODUCT, barcode="4006381333931"))
+
+    assert product["barcode"] == "4006381333931"
+    assert product.get("barcode") == "4006381333931"
+    assert "barcode" in product
+    assert product.to_dict() == dict(PRODUCT, barcode="4006381333931")
+    assert Product.from_dict(PRODUCT).to_dict() == PRODUCT
+
+
+def test_unknown_keys_of_line_items_are_kept():
+    sale = {
+        "id": "SALE-1",
+        "customer_id": None,
+        "customer_name": "Walk-in",
+        "items": [
+            {
+                "product_id": "p1",
+                "product_name": "Lamp",
+                "quantity": 1,
+                "unit_price": 9.0,
+                "line_total": 9.0,
+                "discount": 0.0,
+            }
+        ],
+        "total_quantity": 1,
+        "total_amount": 9.0,
+        "timestamp": "2026-10-01T10:00:00",
+        "till": 2,
+    }
+    assert Sale.from_dict(sale).to_dict() == sale
+
+
+def test_saving_keeps_fields_written_by_other_tools(tmp_path):
+    filename = str(tmp_path / "products.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump([dict(PRODUCT, barcode="4006381333931")], f)
+
+    inventory = Inventory(JournalStorage(filename))
+    inventory.update_product("p1", quantity=7)
+    inventory.save_all()
+
+    with open(filename, encoding="utf-8") as f:
+        assert json.load(f) == [dict(PRODUCT, quantity=7, barcode="4006381333931")]
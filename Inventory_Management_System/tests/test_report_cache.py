@@ -0,0 +1,31 @@
+from inventory import Inventory
+from reports import ReportManager
+from sales import SalesManager
+from storage import JournalStorage
+
+
+def sell(sales, customer, quantity):
+    sale = sales.create_sale()
+    sale["customer_name"] = customer
+    sales.add_item_to_sale(sale, "p1", quantity)
+    sales.finalize_sale(sale)
+
+
+def test_cached_results_do_not_change(tmp_path, products_file):
+    inventory = Inventory(JournalStorage(str(products_file)))
+    sales = SalesManager(inventory, JournalStorage(str(tmp_path / "sales.json")), None)
+    reports = ReportManager(inventory, sales)
+    sell(sales, "Ann", 2)
+
+    top = reports.top_selling_products()
+    customers = reports.sales_by_customer()
+    low = reports.low_stock(8)
+    assert reports.top_selling_products() is top
+
+    sell(sales, "Ann", 3)
+
+    assert top["products"][0]["quantity"] == 2
+    assert customers["customers"][0]["orders"] == 1
+    assert low[0]["quantity"] == 8
+    assert reports.top_selling_products()["products"][0]["quantity"] == 5
+    assert reports.sales_by_customer()["customers"][0]["orders"] == 2
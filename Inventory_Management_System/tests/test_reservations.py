@@ -0,0 +1,78 @@
+import pytest
+
+import bulk
+from inventory import Inventory
+from sales import SalesManager
+from storage import JournalStorage
+
+
+def open_shop(products_file):
+    inventory = Inventory(JournalStorage(str(products_file)))
+    sales = SalesManager(inventory, JournalStorage(str(products_file.parent / "sales.json")), None)
+    return inventory, sales
+
+
+def test_only_committed_stock_is_saved(products_file):
+    inventory, sales = open_shop(products_file)
+    a, b = sales.create_sale(), sales.create_sale()
+    assert sales.add_item_to_sale(a, "p1", 1)[0]
+    assert sales.add_item_to_sale(b, "p1", 5)[0]
+    assert inventory.available("p1") == 4
+
+    assert sales.finalize_sale(a)[0]
+    sales.cancel_sale(b)
+
+    assert inventory.get_product_by_id("p1")["quantity"] == 9
+    assert inventory.available("p1") == 9
+    restarted, _ = open_shop(products_file)
+    assert restarted.get_product_by_id("p1")["quantity"] == 9
+
+
+def test_open_sales_are_not_saved(products_file):
+    inventory, sales = open_shop(products_file)
+    sale = sales.create_sale()
+    sales.add_item_to_sale(sale, "p1", 3)
+    # A later sale saves the product while the first one is still open.
+    other = sales.create_sale()
+    sales.add_item_to_sale(other, "p1", 2)
+    sales.finalize_sale(other)
+
+    # The process stops here: the open sale never happened.
+    restarted, _ = open_shop(products_file)
+    assert restarted.get_product_by_id("p1")["quantity"] == 8
+    assert restarted.available("p1") == 8
+
+
+def test_reservations_cannot_exceed_stock(products_file):
+    inventory, sales = open_shop(products_file)
+    a, b = sales.create_sale(), sales.create_sale()
+    assert sales.add_item_to_sale(a, "p1", 7)[0]
+    assert not sales.add_item_to_sale(b, "p1", 4)[0]
+    sales.cancel_sale(a)
+    assert sales.add_item_to_sale(b, "p1", 10)[0]
+    assert not inventory.reduce_stock("p1", 1)[0]
+
+
+def test_stock_edits_keep_reservations_covered(tmp_path, products_file):
+    inventory, sales = open_shop(products_file)
+    sale = sales.create_sale()
+    sales.add_item_to_sale(sale, "p1", 6)
+
+    with pytest.raises(ValueError):
+        inventory.update_product("p1", name="Desk lamp", quantity=5)
+    assert inventory.get_product_by_id("p1")["name"] == "Lamp"
+    assert inventory.update_product("p1", quantity=6)
+
+    stock = tmp_path / "stock.csv"
+    stock.write_text("id,delta\np1,-1\np1,2\n")
+    applied, errors = bulk.import_stock(inventory, str(stock))
+    assert applied == 1
+    assert errors == ["line 2: stock of p1 would drop below the 6 units reserved by open sales"]
+    products = tmp_path / "products.csv"
+    products.write_text("id,quantity\np1,3\n")
+    assert bulk.import_products(inventory, str(products))[0] == 0
+    assert inventory.adjust_stock([("p1", -3)]) == [0]
+    assert inventory.upsert_products([{"id": "p1", "quantity": 1}]) == [0]
+
+    assert sales.finalize_sale(sale)[0]
+    assert inventory.get_product_by_id("p1")["quantity"] == 2
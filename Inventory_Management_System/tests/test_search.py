@@ -0,0 +1,71 @@
+import random
+
+from search import SearchIndex
+
+
+def product(product_id, name, category="misc"):
+    return {"id": product_id, "name": name, "category": category}
+
+
+def catalogue():
+    names = ["Desk Lamp", "Laptop Stand", "Lamp Shade", "Gaming Laptop", "Flap Jack",
+             "Clamp", "Wireless Mouse", "Mouse Pad", "Lapel Pin", "Lap Tray"]
+    return [product(f"p{i:03d}", f"{name} {i}") for i, name in enumerate(names * 30)]
+
+
+def test_limited_search_is_the_start_of_the_full_ranking():
+    products = catalogue()
+    for seed in range(5):
+        shuffled = products[:]
+        random.Random(seed).shuffle(shuffled)
+        index = SearchIndex(shuffled)
+        for keyword in ("lap", "amp", "mouse", "ap", "a"):
+            full = index.search(keyword)
+            for limit in (1, 5, 40):
+                assert index.search(keyword, limit) == full[:limit]
+
+
+def test_same_results_whatever_the_insertion_order():
+    products = catalogue()
+    first = SearchIndex(products).search("amp", 10)
+    assert SearchIndex(list(reversed(products))).search("amp", 10) == first
+
+
+def test_short_keywords_match_anywhere():
+    index = SearchIndex([
+        product("a", "Laptop"),
+        product("b", "Desk Lamp"),
+        product("c", "Chair", "seating"),
+        product("d", "Atlas"),
+    ])
+    # Name prefix first, then word start, then inside a name.
+    assert index.search("la") == ["a", "b", "d"]
+    assert index.search("ea") == ["c"]
+    assert index.search("t", 2) == ["d", "a"]
+
+
+def test_short_keywords_follow_changes():
+    products = catalogue() + [product("kq1", "Kettle", "kitchen"), product("z9", "Zebra")]
+    index = SearchIndex(products)
+    assert index.search("zq") == []
+    assert index.search("it", 3) == ["kq1"]
+    assert index.search("q", 1) == ["kq1"]
+
+    index.add(product("n1", "Quiz Book", "toys"))
+    index.update(product("z9", "Zebra Quilt", "kitchen"))
+    index.remove("kq1")
+    assert index.search("q") == ["n1", "z9"]
+    assert index.search("it") == ["z9"]
+    assert index.search("ze", 5) == ["z9"]
+
+
+def test_ranking_of_match_kinds():
+    index = SearchIndex([
+        product("x1", "Other thing", "cable"),
+        product("cab", "Something"),
+        product("x2", "Usb Cable"),
+        product("x3", "Cabinet"),
+        product("x4", "Vocabulary"),
+        product("zzcab", "Nothing"),
+    ])
+    assert index.search("cab") == ["cab", "x3", "x2", "x4", "x1", "zzcab"]
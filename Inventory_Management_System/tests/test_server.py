@@ -0,0 +1,61 @@
+import json
+import time
+
+from customers import CustomerManager
+from inventory import Inventory
+from sales import SalesManager
+from server import InventoryAPI
+from storage import JournalStorage
+
+
+def make_api(tmp_path, products_file):
+    inventory = Inventory(JournalStorage(str(products_file)))
+    customers = CustomerManager(JournalStorage(str(tmp_path / "customers.json")))
+    sales = SalesManager(inventory, JournalStorage(str(tmp_path / "sales.json")), customers)
+    return InventoryAPI(inventory, customers, sales, None, open_sale_timeout=60)
+
+
+def request(api, method, target, body=None):
+    status, payload = api.dispatch(method, target, json.dumps(body).encode() if body else b"")
+    return status, json.loads(payload)
+
+
+def test_patch_validates_like_post(tmp_path, products_file):
+    api = make_api(tmp_path, products_file)
+
+    assert request(api, "PATCH", "/products/p1", {"name": "  "})[0] == 400
+    assert request(api, "PATCH", "/products/p1", {"category": 7})[0] == 400
+    assert request(api, "PATCH", "/products/p1", {"selling_price": -1})[0] == 400
+    assert request(api, "POST", "/products", {"name": "", "category": "c"})[0] == 400
+    assert api.inventory.get_product_by_id("p1")["name"] == "Lamp"
+
+    status, product = request(api, "PATCH", "/products/p1", {"name": " Desk lamp "})
+    assert status == 200
+    assert product["name"] == "Desk lamp"
+    assert product["quantity"] == 10
+
+
+def test_contact_details_must_be_strings(tmp_path, products_file):
+    api = make_api(tmp_path, products_file)
+
+    assert request(api, "POST", "/sales", {"customer_name": "Ann", "phone": 5550100})[0] == 400
+    assert request(api, "POST", "/sales", {"customer_name": "Ann", "email": ["a@b"]})[0] == 400
+    status, sale = request(api, "POST", "/sales", {"customer_name": "Ann", "phone": "555-0100"})
+    assert status == 201
+    assert api.customer_manager.get_customer_by_id(sale["customer_id"])["phone"] == "555-0100"
+
+
+def test_idle_open_sales_are_cancelled(tmp_path, products_file):
+    api = make_api(tmp_path, products_file)
+    _, idle = request(api, "POST", "/sales", {})
+    _, busy = request(api, "POST", "/sales", {})
+    request(api, "POST", f"/sales/{idle['id']}/items", {"product_id": "p1", "quantity": 4})
+    assert api.inventory.available("p1") == 6
+
+    later = time.monotonic() + 61
+    api._open_sales[busy["id"]] = (api._open_sales[busy["id"]][0], later)
+    assert api.expire_open_sales(later) == [idle["id"]]
+
+    assert api.inventory.available("p1") == 10
+    assert request(api, "GET", f"/sales/{idle['id']}")[0] == 404
+    assert request(api, "GET", f"/sales/{busy['id']}")[0] == 200
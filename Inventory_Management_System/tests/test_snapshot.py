@@ -0,0 +1,56 @@
+import inventory as inventory_module
+from inventory import Inventory
+from reports import ReportManager
+from snapshot import open_report_manager, write_snapshot
+
+PRODUCTS = [
+    {
+        "id": f"p{i}",
+        "name": f"Product {i}",
+        "category": ["lights", "desks", "chairs"][i % 3],
+        "buying_price": 2.0 + i,
+        "selling_price": 5.0 + i,
+        "quantity": i,
+    }
+    for i in range(12)
+]
+
+
+class ListStorage:
+    def load(self):
+        return [dict(p) for p in PRODUCTS]
+
+    def save(self, data):
+        pass
+
+
+def test_column_reports_do_not_build_products(tmp_path):
+    path = str(tmp_path / "inventory.snap")
+    write_snapshot(path, PRODUCTS, [])
+    report_manager, snapshot = open_report_manager(path)
+    live = ReportManager(Inventory(ListStorage()), None)
+
+    assert report_manager.inventory_value() == live.inventory_value()
+    assert report_manager.inventory_value_by_category() == live.inventory_value_by_category()
+    assert report_manager.inventory._products is None
+
+    # Reports that list products build them, once.
+    assert report_manager.low_stock(3) == live.low_stock(3)
+    assert len(report_manager.inventory.products) == len(PRODUCTS)
+    snapshot.close()
+
+
+def test_stock_change_while_columns_are_built(monkeypatch):
+    inventory = Inventory(ListStorage())
+    build = inventory_module.InventoryColumns
+
+    def build_during_a_sale(products):
+        columns = build(products)
+        # A sale lands after the products were read.
+        inventory.adjust_stock([("p5", -5)])
+        return columns
+
+    monkeypatch.setattr(inventory_module, "InventoryColumns", build_during_a_sale)
+    inventory.columns()
+    monkeypatch.setattr(inventory_module, "InventoryColumns", build)
+    assert inventory.columns().totals()["quantity"] == sum(range(12)) - 5
@@ -0,0 +1,62 @@
+from inventory import Inventory
+from sales import SalesManager
+from sqlite_storage import (
+    SQLiteDatabase,
+    SQLiteDocumentStorage,
+    SQLiteSalesStorage,
+    SQLiteTableStorage,
+)
+from storage import JournalStorage
+
+
+def test_finalize_does_not_load_the_history(tmp_path, products_file, make_sale):
+    database = SQLiteDatabase(str(tmp_path / "inventory.db"))
+    storage = SQLiteSalesStorage(database)
+    storage.extend([make_sale(n, f"2024-01-{n:02d}T10:00:00") for n in range(1, 21)])
+    inventory = Inventory(JournalStorage(str(products_file)))
+    sales = SalesManager(inventory, storage, None)
+
+    sale = sales.create_sale()
+    sales.add_item_to_sale(sale, "p1", 2)
+    assert sales.finalize_sale(sale)[0]
+
+    assert sales._sales is None
+    assert sales.aggregates.total["orders"] == 21
+    # The history loaded later includes the sale, once.
+    assert [s["id"] for s in sales.sales][-2:] == ["SALE-20", "SALE-21"]
+    assert len(storage.load()) == 21
+
+
+def test_failed_finalize_changes_nothing(tmp_path, product):
+    database = SQLiteDatabase(str(tmp_path / "inventory.db"))
+    products = SQLiteTableStorage(database, "products")
+    products.upsert(product)
+    inventory = Inventory(products)
+    sales = SalesManager(
+        inventory,
+        SQLiteSalesStorage(database),
+        None,
+        aggregate_storage=SQLiteDocumentStorage(database, "sales_aggregates"),
+    )
+    sale = sales.create_sale()
+    sales.add_item_to_sale(sale, "p1", 2)
+    with database.transaction() as connection:
+        connection.execute(
+            "CREATE TRIGGER full BEFORE INSERT ON sales BEGIN SELECT RAISE(ABORT, 'disk full'); END"
+        )
+
+    success, message = sales.finalize_sale(sale)
+
+    assert not success
+    assert "disk full" in message
+    assert inventory.get_product_by_id("p1")["quantity"] == 10
+    assert inventory.available("p1") == 8
+    assert sales.aggregates.total["orders"] == 0
+    assert products.load()[0]["quantity"] == 10
+
+    with database.transaction() as connection:
+        connection.execute("DROP TRIGGER full")
+    assert sales.finalize_sale(sale)[0]
+    assert products.load()[0]["quantity"] == 8
+    assert sales.aggregates.total["orders"] == 1
+    assert len(sales.sales) == 1
@@ -0,0 +1,80 @@
+import os
+import pickle
+import subprocess
+import sys
+
+from parallel import aggregate_partitions
+from partitioned_storage import PartitionedSalesStorage
+from storage import JournalStorage
+from write_behind import WriteBehindStorage
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.calls = []
+
+    def load(self):
+        return []
+
+    def save(self, data):
+        self.calls.append(("save", data))
+
+    def upsert(self, record):
+        self.calls.append(("upsert", dict(record)))
+
+    def delete(self, key):
+        self.calls.append(("delete", key))
+
+
+def test_only_the_last_change_of_a_record_is_written():
+    target = RecordingStorage()
+    storage = WriteBehindStorage(target, interval=60)
+    storage.upsert({"id": "a", "quantity": 1})
+    storage.upsert({"id": "b", "quantity": 1})
+    storage.upsert({"id": "a", "quantity": 2})
+    storage.delete("b")
+    assert target.calls == []
+
+    storage.flush()
+    assert target.calls == [("upsert", {"id": "a", "quantity": 2}), ("delete", "b")]
+
+    storage.upsert({"id": "c"})
+    storage.save([{"id": "a"}])
+    storage.close()
+    assert target.calls[2:] == [("save", [{"id": "a"}])]
+    # After close() writes go straight through.
+    storage.delete("a")
+    assert target.calls[-1] == ("delete", "a")
+
+
+def test_queued_changes_are_written_on_exit(tmp_path):
+    path = str(tmp_path / "products.json")
+    script = (
+        "from storage import JournalStorage\n"
+        "from write_behind import WriteBehindStorage\n"
+        f"storage = WriteBehindStorage(JournalStorage({path!r}), interval=3600)\n"
+        "storage.upsert({'id': 'p1', 'quantity': 3})\n"
+    )
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script], cwd=here, check=True)
+
+    assert JournalStorage(path).load() == [{"id": "p1", "quantity": 3}]
+
+
+def test_partition_reads_see_queued_sales(tmp_path, make_sale):
+    partitions = PartitionedSalesStorage(str(tmp_path / "sales"))
+    storage = WriteBehindStorage(partitions, interval=60)
+    storage.append(make_sale(1, "2024-01-05T10:00:00"))
+    storage.append(make_sale(2, "2024-02-05T10:00:00"))
+
+    assert storage.partitions_between() == ["2024-01", "2024-02"]
+    assert [s["id"] for s in storage.iter_partition("2024-02")] == ["SALE-2"]
+    storage.append(make_sale(3, "2024-02-06T10:00:00"))
+    # Worker processes get the wrapped storage, with the queue written.
+    assert isinstance(pickle.loads(pickle.dumps(storage)), PartitionedSalesStorage)
+    assert [s["id"] for s in partitions.iter_partition("2024-02")] == ["SALE-2", "SALE-3"]
+
+    storage.append(make_sale(4, "2024-03-01T10:00:00"))
+    totals = aggregate_partitions(storage, processes=2)
+    assert totals.total["orders"] == 4
+    storage.close()
@@ -0,0 +1,169 @@
+import atexit
+import threading
+import time
+
+import metrics
+
+# Record-level writes that are queued (when the wrapped storage has them).
+WRITES = ("append", "upsert", "delete")
+# Reads that are passed through once the queue has been written, so a
+# reader always sees its own changes.
+READS = (
+    "iter_chunks",
+    "iter_chunks_between",
+    "recent_sales",
+    "aggregates_between",
+    "top_products",
+    "partitions_between",
+    "iter_partition",
+    "wait",
+)
+
+
+def _unwrapped(storage):
+    return storage
+
+
+class WriteBehindStorage:
+    """
+    Wraps a storage so writes return at once and reach disk in batches.
+
+    save(), append(), upsert() and delete() only queue the change. A
+    background thread writes the queue once the oldest queued change is
+    `interval` seconds old, or as soon as `max_pending` changes are queued,
+    whichever comes first. Within a batch a full save() replaces everything
+    queued before it, and only the last upsert()/delete() of each record is
+    written.
+
+    Durability: a change is on disk at most `interval` seconds (plus the time
+    of the write itself) after the call returns. flush() writes the queue
+    now; close() (also run when the process exits normally) stops the thread
+    and flushes. Only a crash or kill inside the window loses changes.
+
+    Reads flush first, so they always include the caller's own changes.
+    Pickling (for worker processes that read, see parallel.py) also flushes
+    and gives the wrapped storage.
+
+    Storage transactions are not offered: queued changes are written one by
+    one, after the caller's transaction would have ended. Do not wrap
+    storages whose writers rely on them (SQLite); create_managers() refuses.
+    """
+
+    def __init__(self, storage, interval=0.2, max_pending=500):
+        """
+        storage: the storage to write to (JournalStorage, PartitionedSalesStorage, ...).
+        interval: the durability window in seconds.
+        max_pending: queued changes that trigger a write before the window ends.
+        """
+        self.storage = storage
+        self.interval = interval
+        self.max_pending = max_pending
+        self.key = getattr(storage, "key", "id")
+        self._pending = []
+        self._changed = threading.Condition()
+        # Held for a whole write, so batches reach the storage in order.
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined here: offer the wrapped
+        # storage's record-level writes (queued) and reads (after a flush),
+        # so hasattr() capability checks answer as for the storage itself.
+        if name not in WRITES and name not in READS:
+            raise AttributeError(name)
+        method = getattr(self.storage, name)
+        if name in WRITES:
+            return lambda arg: self._queue(name, arg)
+
+        def read(*args, **kwargs):
+            self.flush()
+            return method(*args, **kwargs)
+
+        return read
+
+    def __reduce__(self):
+        self.flush()
+        return _unwrapped, (self.storage,)
+
+    def load(self):
+        self.flush()
+        return self.storage.load()
+
+    def save(self, data):
+        self._queue("save", data)
+
+    def _queue(self, name, arg):
+        with self._changed:
+            if not self._closed:
+                if name == "save":
+                    # A full save makes everything queued before it moot.
+                    self._pending = [(name, arg)]
+                else:
+                    self._pending.append((name, arg))
+                if self._flusher is None:
+                    self._flusher = threading.Thread(
+                        target=self._run, name="write-behind-flusher", daemon=True
+                    )
+                    self._flusher.start()
+                self._changed.notify()
+                return
+        # After close(): write through.
+        getattr(self.storage, name)(arg)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if self._closed:
+                    return
+                # Let more changes join the batch until the window ends.
+                deadline = time.monotonic() + self.interval
+                while len(self._pending) < self.max_pending and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+            self.flush()
+
+    @metrics.timed("storage.write_behind.flush")
+    def flush(self):
+        """Write every queued change now. Returns once the storage has them."""
+        with self._flush_lock:
+            with self._changed:
+                batch, self._pending = self._pending, []
+            for name, arg in self._coalesce(batch):
+                try:
+                    getattr(self.storage, name)(arg)
+                except Exception as e:
+                    # The storages report their own I/O errors; this is anything else.
+                    print(f"Error writing queued {name}: {e!r}")
+
+    def _coalesce(self, batch):
+        # Keep only the last upsert/delete of each record.
+        keys = [self._record_key(name, arg) for name, arg in batch]
+        last = {key: index for index, key in enumerate(keys) if key is not None}
+        return [
+            op
+            for index, (op, key) in enumerate(zip(batch, keys))
+            if key is None or last[key] == index
+        ]
+
+    def _record_key(self, name, arg):
+        if name == "upsert":
+            return arg.get(self.key)
+        if name == "delete":
+            return arg
+        return None
+
+    def close(self):
+        """Stop the background thread and write what is queued; later writes go straight through."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+            flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+        self.flush()